@@ -0,0 +1,96 @@
+"""
+Import-time budget of HEADAT
+
+Importing headat.main must only load the core dependencies (numpy, pandas, wfdb): the optional
+backends are imported by the methods using them and the out/ folder is created by the first view.
+Each measure runs in a fresh interpreter (python -X importtime) from an empty working directory.
+
+Usage: python -m benchmarks.import_time [--budget SECONDS] [--repeat N]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Package root (the imports are measured from a temporary working directory)
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Maximum median duration of "import headat.main" (in seconds), on top of the core dependencies
+DEFAULT_BUDGET = 0.25
+# Core dependencies whose import time is measured separately (baseline)
+CORE_MODULES = ["numpy", "pandas", "wfdb"]
+# Backends which must not be loaded by "import headat.main"
+LAZY_MODULES = ["pyspark", "scipy.io", "scipy.signal", "requests", "tqdm", "bs4", "validators", "wfdb.io.convert",
+                "pyarrow", "openpyxl", "tables", "sqlalchemy", "h5py", "aiohttp"]
+
+
+def measure_import(statement: str, folder: str) -> tuple:
+    """
+    Function measuring the duration of an import statement in a fresh interpreter
+    :param statement: Python statement (e.g. "import headat.main")
+    :param folder: Working directory of the interpreter
+    :return: Tuple (duration in seconds, list of the loaded modules)
+    """
+    code = f"import sys; sys.path.insert(0, {ROOT_FOLDER!r}); {statement}; print('\\n'.join(sys.modules))"
+    p = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=folder, capture_output=True,
+                       text=True, check=True)
+    # -X importtime reports the cumulated duration (in microseconds) of every top-level import
+    total = sum(int(k.group(1)) for k in re.finditer(r"^import time:\s+\d+ \|\s+(\d+) \| \S", p.stderr, re.M))
+    return total / 1e6, p.stdout.split()
+
+
+def check_import_time(budget: float = DEFAULT_BUDGET, repeat: int = 5) -> dict:
+    """
+    Function checking the import-time budget of headat.main
+    :param budget: Maximum median duration (in seconds) of the import of headat.main beyond the core dependencies
+    :param repeat: Number of measures
+    :return: Dictionary {core, headat, overhead, budget, loaded_backends, side_effects, success}
+    """
+    with tempfile.TemporaryDirectory(prefix="headat-import-") as folder:
+        core_measures = [measure_import(f"import {', '.join(CORE_MODULES)}", folder) for _ in range(repeat)]
+        measures = [measure_import("import headat.main", folder) for _ in range(repeat)]
+        side_effects = os.listdir(folder)
+    core = statistics.median(k[0] for k in core_measures)
+    duration = statistics.median(k[0] for k in measures)
+    # The backends already imported by the core dependencies themselves (e.g. pyarrow by pandas) are ignored
+    loaded = [k for k in LAZY_MODULES if k in measures[-1][1] and k not in core_measures[-1][1]]
+    return {
+        "core": core,
+        "headat": duration,
+        "overhead": duration - core,
+        "budget": budget,
+        "loaded_backends": loaded,
+        "side_effects": side_effects,
+        "success": duration - core <= budget and not loaded and not side_effects
+    }
+
+
+def main(argv: list = None) -> int:
+    """
+    Command-line entry point: python -m benchmarks.import_time [options]
+    :param argv: List of command-line arguments (sys.argv if None)
+    :return: Exit code (1 if the budget is exceeded, a backend is eagerly loaded or a file is created)
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.import_time",
+                                     description="HEADAT - Import-time budget of headat.main")
+    parser.add_argument("-b", "--budget", type=float, default=DEFAULT_BUDGET, help="Budget (in seconds)")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="Number of measures")
+    args = parser.parse_args(argv)
+
+    result = check_import_time(args.budget, args.repeat)
+    print(f"Core dependencies ({', '.join(CORE_MODULES)}): {result['core'] * 1000:.1f} ms")
+    print(f"import headat.main: {result['headat'] * 1000:.1f} ms "
+          f"(overhead {result['overhead'] * 1000:.1f} ms, budget {result['budget'] * 1000:.1f} ms)")
+    if result["loaded_backends"]:
+        print(f"Eagerly loaded backends: {', '.join(result['loaded_backends'])}")
+    if result["side_effects"]:
+        print(f"Files created at import: {', '.join(result['side_effects'])}")
+    print("OK" if result["success"] else "FAILED")
+    return 0 if result["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Benchmark suite of HEADAT (loading, DataFrame conversion and exporters on synthetic WFDB records)
+
+Usage: python -m benchmarks.run [-n LENGTHS] [-s SIGNALS] [--fmts FMTS] [-f FORMATS] [-o REPORT] [--compare BASELINE]
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import wfdb as wf
+
+from .synthetic import generate_record
+
+# Package root (the benchmarks are run from a temporary working directory)
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_FOLDER)
+
+from headat.lib.constants import formats, DEFAULT_CHUNK_SIZE  # noqa: E402
+
+DEFAULT_LENGTHS = [100000, 1000000]
+DEFAULT_SIGNALS = [2, 12]
+DEFAULT_FMTS = ["16", "212"]
+DEFAULT_FORMATS = ["csv", "json", "parquet", "pickle", "feather", "hdf5", "matlab", "store"]
+# Ratio of the median durations above which an operation is reported as a regression
+DEFAULT_THRESHOLD = 1.25
+
+
+def get_environment() -> dict:
+    """
+    Function describing the benchmarked version and the machine
+    :return: Dictionary
+    """
+    def git(*args) -> str:
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT_FOLDER, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "wfdb": wf.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def measure(function, repeat: int = 3, memory: bool = True) -> dict:
+    """
+    Function timing an operation (and measuring its peak of allocated memory on an additional run)
+    :param function: Callable without arguments
+    :param repeat: Number of timed runs
+    :param memory: If set to True, the peak of memory allocated by the operation is measured with tracemalloc
+    :return: Dictionary containing the durations (in seconds), their minimum and median, the peak of
+    allocated memory (in bytes) and the value returned by the last run
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        value = function()
+        times.append(time.perf_counter() - start)
+    peak_memory = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            value = function()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"times": times, "min": min(times), "median": statistics.median(times), "peak_memory": peak_memory,
+            "value": value}
+
+
+def get_case_id(case: dict) -> str:
+    """
+    Function returning the identifier of a benchmarked record (used to compare results)
+    """
+    case_id = f"{case['nb_observations']}x{case['nb_signals']}-fmt{case['fmt']}"
+    return case_id + (f"-seg{case['segments']}" if case.get("segments", 1) > 1 else "")
+
+
+def benchmark_record(record: str, formats_list: list, repeat: int = 3, memory: bool = True,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+    """
+    Function benchmarking the loading of a record, the DataFrame conversion and the exporters
+    The exporters are timed once the DataFrame has been built (the "frame" operation measures it) and
+    the streaming formats are also timed when written block by block from the lazily loaded record
+    :param record: Record path
+    :param formats_list: List of export formats
+    :param repeat: Number of timed runs per operation
+    :param memory: If set to True, the peak of allocated memory is measured
+    :param chunk_size: Number of samples per block of the streaming exports
+    :return: List of results {operation, times, min, median, peak_memory, size, success, error}
+    """
+    from headat.main import HDView
+
+    results = []
+
+    def run(operation: str, function, size=None) -> None:
+        result = {"operation": operation, "success": True, "error": None}
+        try:
+            result.update(measure(function, repeat, memory))
+            if result.pop("value") is False:
+                result["success"] = False
+        except Exception as e:
+            result.update(success=False, error=f"{type(e).__name__}: {e}")
+        result["size"] = size() if size is not None and result["success"] else None
+        results.append(result)
+
+    record_files = lambda: sum(os.path.getsize(os.path.join(os.path.dirname(record), k))
+                               for k in HDView(record, lazy=True).get_record_files())
+    run("load", lambda: HDView(record), record_files)
+    run("load_lazy", lambda: HDView(record, lazy=True), record_files)
+
+    view = HDView(record)
+    run("frame", lambda: (view.clear_frame_cache(), view.t_frame())[1])
+    view.t_frame()
+    lazy_view = HDView(record, lazy=True)
+    for format in formats_list:
+        method = formats[format]["callback"]
+        filename = lambda v=view, f=format: v.get_export_filename(f)
+        size = lambda v=view, f=format: os.path.getsize(filename(v, f)) if os.path.isfile(filename(v, f)) else None
+        run(f"export:{format}", lambda m=method: getattr(view, m)(), size)
+        if formats[format].get("chunked", False):
+            run(f"stream:{format}", lambda m=method: getattr(lazy_view, m)(chunk_size=chunk_size),
+                lambda f=format: size(lazy_view, f))
+        # The exported files are removed to keep the disk usage low
+        for folder in [view.folder_name, lazy_view.folder_name]:
+            for k in os.listdir(folder):
+                if os.path.isfile(os.path.join(folder, k)):
+                    os.remove(os.path.join(folder, k))
+    return results
+
+
+def run_benchmarks(lengths: list = None, signals: list = None, fmts: list = None, formats_list: list = None,
+                   segments: int = 1, repeat: int = 3, memory: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   seed: int = 0) -> dict:
+    """
+    Function generating the synthetic records and benchmarking each of them
+    :param lengths: List of record lengths (number of samples)
+    :param signals: List of numbers of signals
+    :param fmts: List of WFDB storage formats
+    :param formats_list: List of export formats ("all" for every export format)
+    :param segments: Number of segments of the records
+    :param repeat: Number of timed runs per operation
+    :param memory: If set to True, the peak of allocated memory is measured
+    :param chunk_size: Number of samples per block of the streaming exports
+    :param seed: Seed of the random generator
+    :return: Dictionary {environment, parameters, results}
+    """
+    lengths = lengths or DEFAULT_LENGTHS
+    signals = signals or DEFAULT_SIGNALS
+    fmts = fmts or DEFAULT_FMTS
+    formats_list = formats_list or DEFAULT_FORMATS
+    if formats_list == ["all"]:
+        formats_list = list(formats)
+    unknown = [k for k in formats_list if k not in formats]
+    if unknown:
+        raise ValueError(f"Unsupported export format(s): {', '.join(unknown)}")
+
+    report = {
+        "environment": get_environment(),
+        "parameters": {"lengths": lengths, "signals": signals, "fmts": fmts, "formats": formats_list,
+                       "segments": segments, "repeat": repeat, "memory": memory, "chunk_size": chunk_size,
+                       "seed": seed},
+        "results": []
+    }
+    # The records and the exports are written in a temporary working directory
+    working_folder = tempfile.mkdtemp(prefix="headat-benchmark-")
+    current_folder = os.getcwd()
+    try:
+        os.chdir(working_folder)
+        for nb_observations in lengths:
+            for nb_signals in signals:
+                for fmt in fmts:
+                    case = {"nb_observations": nb_observations, "nb_signals": nb_signals, "fmt": fmt,
+                            "segments": segments}
+                    case_id = get_case_id(case)
+                    print(f"Benchmarking {case_id}")
+                    record = generate_record("records", case_id, nb_observations, nb_signals, fmt,
+                                             segments=segments, seed=seed)
+                    for result in benchmark_record(record, formats_list, repeat, memory, chunk_size):
+                        report["results"].append({"case": case_id, **case, **result})
+                        print(format_result(report["results"][-1]))
+    finally:
+        os.chdir(current_folder)
+        shutil.rmtree(working_folder, ignore_errors=True)
+    return report
+
+
+def format_result(result: dict) -> str:
+    """
+    Function formatting a result as a line of text
+    """
+    if not result["success"]:
+        return f"    {result['operation']:<20} FAILED {result['error'] or ''}"
+    memory = f"{result['peak_memory'] / 1024 ** 2:10.1f} MiB" if result["peak_memory"] is not None else ""
+    size = f"{result['size'] / 1024 ** 2:10.1f} MiB written" if result["size"] is not None else ""
+    return f"    {result['operation']:<20} {result['median'] * 1000:10.1f} ms {memory} {size}"
+
+
+def compare_reports(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Function comparing the median durations and memory peaks of 2 benchmark reports
+    :param baseline: Reference report (see run_benchmarks())
+    :param current: New report
+    :param threshold: Ratio (current / baseline) above which an operation is reported as a regression
+    :return: List of comparisons {case, operation, baseline, current, ratio, memory_ratio, regression}
+    """
+    reference = {(k["case"], k["operation"]): k for k in baseline["results"] if k["success"]}
+    comparisons = []
+    for result in current["results"]:
+        old = reference.get((result["case"], result["operation"]))
+        if old is None or not result["success"]:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else None
+        memory_ratio = None
+        if result["peak_memory"] and old["peak_memory"]:
+            memory_ratio = result["peak_memory"] / old["peak_memory"]
+        comparisons.append({
+            "case": result["case"],
+            "operation": result["operation"],
+            "baseline": old["median"],
+            "current": result["median"],
+            "ratio": ratio,
+            "memory_ratio": memory_ratio,
+            "regression": (ratio is not None and ratio > threshold)
+                          or (memory_ratio is not None and memory_ratio > threshold)
+        })
+    return comparisons
+
+
+def main(argv: list = None) -> int:
+    """
+    Command-line entry point: python -m benchmarks.run [options]
+    :param argv: List of command-line arguments (sys.argv if None)
+    :return: Exit code (1 if a regression has been found against the compared report)
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run",
+                                     description="HEADAT - Benchmark suite on synthetic WFDB records")
+    parser.add_argument("-n", "--lengths", nargs="+", type=int, default=DEFAULT_LENGTHS, help="Record lengths (samples)")
+    parser.add_argument("-s", "--signals", nargs="+", type=int, default=DEFAULT_SIGNALS, help="Numbers of signals")
+    parser.add_argument("--fmts", nargs="+", default=DEFAULT_FMTS, help="WFDB storage formats")
+    parser.add_argument("-f", "--formats", nargs="+", default=DEFAULT_FORMATS, help="Export formats (or 'all')")
+    parser.add_argument("--segments", type=int, default=1, help="Number of segments of the records")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed runs per operation")
+    parser.add_argument("-c", "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Block size of the streaming exports")
+    parser.add_argument("--no-memory", action="store_true", help="Do not measure the memory peaks")
+    parser.add_argument("-o", "--output", default=None, help="Path of the JSON report (benchmark_<commit>.json by default)")
+    parser.add_argument("--compare", default=None, help="Path of a previous JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Regression threshold (ratio)")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output or f"benchmark_{get_environment()['commit'] or 'unknown'}.json")
+    report = run_benchmarks(args.lengths, args.signals, args.fmts, args.formats, args.segments, args.repeat,
+                            not args.no_memory, args.chunk_size)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved to {output}")
+
+    if args.compare is None:
+        return 0
+    with open(args.compare, "r") as f:
+        baseline = json.load(f)
+    comparisons = compare_reports(baseline, report, args.threshold)
+    print(f"Comparison with {baseline['environment'].get('commit')} ({args.compare})")
+    for k in comparisons:
+        status = "REGRESSION" if k["regression"] else "ok"
+        memory = f"memory x{k['memory_ratio']:.2f}" if k["memory_ratio"] is not None else ""
+        print(f"    [{status:>10}] {k['case']:<28} {k['operation']:<20} x{k['ratio']:.2f} {memory}")
+    nb_regressions = sum(k["regression"] for k in comparisons)
+    print(f"{nb_regressions} regression(s) out of {len(comparisons)} compared operation(s)")
+    return 1 if nb_regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Synthetic WFDB records used by the benchmark suite (generated offline)
+"""
+import os
+
+import numpy as np
+import wfdb as wf
+
+# WFDB formats which can be written by wfdb.wrsamp (508 and 516 are FLAC-compressed)
+WRITABLE_FORMATS = ["16", "24", "32", "80", "212", "508", "516"]
+
+
+def generate_signals(nb_observations: int, nb_signals: int, fs: float = 360, seed: int = 0) -> np.ndarray:
+    """
+    Function generating ECG-like physical signals (periodic spikes, baseline wander and noise)
+    :param nb_observations: Number of samples
+    :param nb_signals: Number of signals
+    :param fs: Sampling frequency (in Hz)
+    :param seed: Seed of the random generator
+    :return: Numpy ndarray of shape (nb_observations, nb_signals) in mV
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(nb_observations) / fs
+    signals = np.empty((nb_observations, nb_signals))
+    for k in range(nb_signals):
+        rate = rng.uniform(0.9, 1.6)
+        phase = (t * rate + rng.uniform()) % 1
+        beats = np.exp(-((phase - 0.5) / 0.015) ** 2) * rng.uniform(0.8, 1.5)
+        waves = 0.2 * np.exp(-((phase - 0.75) / 0.05) ** 2)
+        wander = 0.1 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, 2 * np.pi))
+        signals[:, k] = beats + waves + wander + rng.normal(0, 0.02, nb_observations)
+    return signals
+
+
+def generate_record(folder: str, name: str, nb_observations: int, nb_signals: int, fmt: str = "16",
+                    fs: float = 360, segments: int = 1, seed: int = 0) -> str:
+    """
+    Function writing a synthetic WFDB record (.hea and .dat files)
+    :param folder: Destination folder
+    :param name: Record name
+    :param nb_observations: Number of samples
+    :param nb_signals: Number of signals
+    :param fmt: WFDB storage format of the signals (see WRITABLE_FORMATS)
+    :param fs: Sampling frequency (in Hz)
+    :param segments: Number of segments (multi-segment record with a fixed layout if > 1)
+    :param seed: Seed of the random generator
+    :return: Record path (without the .hea extension)
+    """
+    if fmt not in WRITABLE_FORMATS:
+        raise ValueError(f"Unsupported WFDB format: {fmt} (available: {', '.join(WRITABLE_FORMATS)})")
+    if segments < 1 or segments > nb_observations:
+        raise ValueError("The number of segments must be between 1 and the number of samples.")
+    os.makedirs(folder, exist_ok=True)
+    signals = generate_signals(nb_observations, nb_signals, fs, seed)
+    sig_name = [f"sig_{k}" for k in range(nb_signals)]
+    units = ["mV"] * nb_signals
+
+    if segments == 1:
+        wf.wrsamp(name, fs=fs, units=units, sig_name=sig_name, p_signal=signals, fmt=[fmt] * nb_signals,
+                  write_dir=folder)
+        return os.path.join(folder, name)
+
+    # Multi-segment record: 1 single-segment record per segment and a master header
+    bounds = np.linspace(0, nb_observations, segments + 1).astype(int)
+    lines = [f"{name}/{segments} {nb_signals} {fs} {nb_observations}"]
+    for k in range(segments):
+        segment = f"{name}_{k + 1:04d}"
+        wf.wrsamp(segment, fs=fs, units=units, sig_name=sig_name, p_signal=signals[bounds[k]: bounds[k + 1]],
+                  fmt=[fmt] * nb_signals, write_dir=folder)
+        lines.append(f"{segment} {bounds[k + 1] - bounds[k]}")
+    with open(os.path.join(folder, f"{name}.hea"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return os.path.join(folder, name)
@@ -0,0 +1,319 @@
+"""
+
+          _   _ _____    _    ____    _  _____
+         | | | | ____|  / \  |  _ \  / \|_   _|
+         | |_| |  _|   / _ \ | | | |/ _ \ | |
+         |  _  | |___ / ___ \| |_| / ___ \| |
+         |_| |_|_____/_/   \_\____/_/   \_\_|
+
+            Developer           :   Lucas RODRIGUEZ
+            Maintainer          :   Lucas RODRIGUEZ
+            Development date    :   June 2022 - ...
+            File description    :   Asyncio API of the views
+            Official Git repo   :   https://github.com/lcsrodriguez/headat-signals
+
+"""
+import asyncio
+import copy
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .main import *
+from .lib.download import make_async_session, async_list_remote_files, async_get_remote_checksums, \
+    async_download_files
+
+# Methods of HDView run by the executor (the t_* exporters are run by the executor as well)
+ASYNC_METHODS = ["export", "stream_export", "text_export", "get_pyramid", "get_overview"]
+# Methods of HDView returning a new view (wrapped into an AsyncHDView)
+DERIVING_METHODS = ["select", "process", "derive_view"]
+
+
+class ExportCancelled(Exception):
+    """
+    Exception raised inside a running exporter when its task has been cancelled
+    """
+
+
+class AsyncExecutor:
+    """
+    Executor running the blocking work of the views (sample decoding, frame build, exports) off the event loop
+    with bounded concurrency:
+        - max_jobs: maximum number of decoding and export jobs running at once (the next ones wait their turn)
+        - max_downloads: maximum number of files downloaded at once by all the views
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_ASYNC_WORKERS, max_jobs: int = None,
+                 max_downloads: int = DEFAULT_ASYNC_DOWNLOADS, executor=None) -> None:
+        """
+        Constructor function initializing the executor
+        :param max_workers: Number of threads of the pool (if no executor is specified)
+        :param max_jobs: Maximum number of jobs running at once (max_workers if None)
+        :param max_downloads: Maximum number of simultaneous downloads
+        :param executor: concurrent.futures executor running the jobs (a ThreadPoolExecutor is created if None)
+        """
+        if max_workers is None or max_workers < 1:
+            raise ValueError("The number of workers must be a strictly positive integer.")
+        if max_downloads is None or max_downloads < 1:
+            raise ValueError("The number of simultaneous downloads must be a strictly positive integer.")
+        self.max_jobs = max_jobs or max_workers
+        self.max_downloads = max_downloads
+        self.owned = executor is None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="headat-aio") \
+            if executor is None else executor
+        # The semaphores are created in the event loop using them
+        self.semaphores = {}
+
+    def __repr__(self) -> str:
+        return f"AsyncExecutor(max_jobs={self.max_jobs}, max_downloads={self.max_downloads})"
+
+    def get_semaphore(self, kind: str) -> asyncio.Semaphore:
+        """
+        Function returning the semaphore limiting the jobs ("jobs") or the downloads ("downloads") of the running loop
+        :param kind: "jobs" or "downloads"
+        :return: asyncio.Semaphore
+        """
+        key = (kind, id(asyncio.get_running_loop()))
+        if key not in self.semaphores:
+            self.semaphores[key] = asyncio.Semaphore(self.max_jobs if kind == "jobs" else self.max_downloads)
+        return self.semaphores[key]
+
+    async def run(self, function, *args, cancel_event: threading.Event = None, **kwargs):
+        """
+        Function running a blocking function in the executor once a job slot is available
+        If the calling task is cancelled, cancel_event is set and the slot is only released once the function
+        has returned (the function has to check the event to stop early)
+        :param function: Callable
+        :param args: Positional arguments of the function
+        :param cancel_event: threading.Event set when the calling task is cancelled
+        :param kwargs: Keyword arguments of the function
+        :return: Value returned by the function
+        """
+        async with self.get_semaphore("jobs"):
+            future = self.executor.submit(functools.partial(function, *args, **kwargs))
+            wrapped = asyncio.wrap_future(future)
+            try:
+                return await asyncio.shield(wrapped)
+            except asyncio.CancelledError:
+                if cancel_event is not None:
+                    cancel_event.set()
+                if not future.cancel():
+                    # Already running: waiting for the function to stop
+                    await asyncio.gather(wrapped, return_exceptions=True)
+                raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Function stopping the pool of threads (if it has been created by this executor)
+        :param wait: If set to True, the running jobs are waited for
+        """
+        if self.owned:
+            self.executor.shutdown(wait=wait)
+
+
+_DEFAULT_EXECUTOR = None
+_DEFAULT_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_default_executor() -> AsyncExecutor:
+    """
+    Function returning the AsyncExecutor shared by the asynchronous views (created on the first call)
+    :return: AsyncExecutor
+    """
+    global _DEFAULT_EXECUTOR
+    with _DEFAULT_EXECUTOR_LOCK:
+        if _DEFAULT_EXECUTOR is None:
+            _DEFAULT_EXECUTOR = AsyncExecutor()
+        return _DEFAULT_EXECUTOR
+
+
+def set_default_executor(executor: AsyncExecutor) -> None:
+    """
+    Function replacing the AsyncExecutor shared by the asynchronous views
+    :param executor: AsyncExecutor (a new default one is created on the next use if None)
+    """
+    global _DEFAULT_EXECUTOR
+    with _DEFAULT_EXECUTOR_LOCK:
+        _DEFAULT_EXECUTOR = executor
+
+
+def _cancellable(iter_chunks, event: threading.Event):
+    """
+    Function wrapping the iter_chunks() method of a view so that the iteration stops once the event is set
+    """
+    @functools.wraps(iter_chunks)
+    def wrapper(*args, **kwargs):
+        for chunk in iter_chunks(*args, **kwargs):
+            if event.is_set():
+                raise ExportCancelled("The export has been cancelled.")
+            yield chunk
+    return wrapper
+
+
+class AsyncHDView:
+    """
+    Asynchronous counterpart of HDView
+    The network fetches are performed natively with asyncio (aiohttp) and the decoding and export work is sent
+    to an AsyncExecutor, so that the event loop is never blocked:
+        view = await AsyncHDView.open("https://physionet.org/files/mitdb/1.0.0/100", lazy=True)
+        await view.t_csv(chunk_size=100000)
+        results = await view.export(["parquet", "store"])
+    Every t_* exporter (and export(), stream_export(), text_export(), get_pyramid(), get_overview()) is available
+    as a coroutine taking the same arguments as the HDView method. Cancelling the task of a block by block
+    exporter stops it at the next block (the partially written file is left as is); the other exporters run
+    to completion in the executor but their result is discarded
+    The other attributes and methods are the ones of the wrapped HDView (select() and process() return AsyncHDView)
+    """
+
+    def __init__(self, view: HDView = None, executor: AsyncExecutor = None) -> None:
+        """
+        Constructor function wrapping a view
+        :param view: HDView (a new empty view is created if None)
+        :param executor: AsyncExecutor (shared default executor if None, see get_default_executor())
+        """
+        self.view = HDView() if view is None else view
+        self.executor = executor or get_default_executor()
+
+    @classmethod
+    async def open(cls, record: str = "", title: str = "", lazy: bool = False, physical: bool = True, dtype=None,
+                   executor: AsyncExecutor = None, **kwargs):
+        """
+        Function creating an asynchronous view and adding a record to it (see HDView())
+        :param record: Record name or URL
+        :param title: Title of the view
+        :param lazy: If set to True, the record is memory-mapped (see HDView.add_record())
+        :param physical: If set to False, the digital (ADC) values are kept
+        :param dtype: dtype of the signals
+        :param executor: AsyncExecutor (shared default executor if None)
+        :param kwargs: Additional keyword arguments of HDView (cache_frame, trace_memory)
+        :return: AsyncHDView
+        """
+        executor = executor or get_default_executor()
+        view = cls(await executor.run(HDView, title=title, **kwargs), executor)
+        if record:
+            await view.add_record(record, lazy, physical, dtype)
+        return view
+
+    def __repr__(self) -> str:
+        return f"Async{self.view!r}"
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.view, name)
+        if name.startswith("t_") or name in ASYNC_METHODS:
+            @functools.wraps(attribute)
+            async def method(*args, **kwargs):
+                return await self.run(name, *args, **kwargs)
+            return method
+        if name in DERIVING_METHODS:
+            @functools.wraps(attribute)
+            def method(*args, **kwargs):
+                return AsyncHDView(attribute(*args, **kwargs), self.executor)
+            return method
+        return attribute
+
+    async def run(self, name: str, *args, **kwargs):
+        """
+        Function running a method of the view in the executor
+        The method runs on a shallow copy of the view whose blocks iteration (iter_chunks()) stops
+        when the calling task is cancelled
+        :param name: Name of the HDView method
+        :param args: Positional arguments of the method
+        :param kwargs: Keyword arguments of the method
+        :return: Value returned by the method
+        """
+        event = threading.Event()
+        clone = copy.copy(self.view)
+        clone.iter_chunks = _cancellable(self.view.iter_chunks, event)
+
+        def call():
+            try:
+                return getattr(clone, name)(*args, **kwargs)
+            finally:
+                # The DataFrame built by the copy is kept by the view
+                if self.view.cache_frame and self.view.cached_frame is None and clone.cached_frame is not None:
+                    self.view.cached_frame = clone.cached_frame
+                if self.view.pyramid is None and clone.pyramid is not None:
+                    self.view.pyramid = clone.pyramid
+
+        return await self.executor.run(call, cancel_event=event)
+
+    async def add_record(self, record: str = None, lazy: bool = False, physical: bool = True, dtype=None) -> bool:
+        """
+        Function adding a record to the view (see HDView.add_record())
+        The files of a remote record are downloaded asynchronously (see download_sources()), then the record
+        is read in the executor
+        :param record: Record name or URL
+        :param lazy: If set to True, the record is memory-mapped
+        :param physical: If set to False, the digital (ADC) values are kept
+        :param dtype: dtype of the signals
+        :rtype: bool
+        :return: Boolean representing the success of the operation
+        """
+        if record is None:
+            raise ValueError("record cannot be NoneType")
+        if is_url(record):
+            url = urlparse(record).geturl()
+            await self.download_sources("/".join(url.split("/")[: -1]) + "/")
+            # The record is read from the downloaded files
+            name = url.split("/")[-1]
+            if len(url.split(".hea")) > 1 or len(url.split(".dat")) > 1:
+                name = name.split(".")[0]
+            record = self.view.samples_foldername + name
+        return await self.executor.run(self.view.add_record, record, lazy, physical, dtype)
+
+    async def download_sources(self, url_parent_folder: str = "", workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                               verify: bool = True, cache=True) -> bool:
+        """
+        Function downloading the files of a remote record folder from https://physionet.org/files/
+        (asynchronous version of HDView.download_sources(): the files are downloaded concurrently over
+        pooled aiohttp connections, interrupted downloads are resumed and the number of simultaneous downloads
+        of all the views is bounded by the executor)
+        :param url_parent_folder: URL of the folder
+        :param workers: Number of simultaneous downloads of this call
+        :param verify: If set to True, the files are checked against the published SHA256SUMS.txt (if any)
+        :param cache: DownloadCache serving the already downloaded files (True for the shared default cache,
+        False to disable it)
+        :rtype: bool
+        :return: Boolean showing if the full download has been performed with complete success
+        """
+        if not is_url(url_parent_folder):
+            raise ValueError("The argument specified is not a valid URL.")
+        url = urlparse(url_parent_folder)
+        if url.scheme != "https":
+            raise ValueError("Headat only covers HTTPS protocol for web resources.")
+        if url.netloc != "physionet.org":
+            raise ValueError("Headat only covers the 'physionet.org' web resources.")
+        if url.path.split("/")[1] != "files":
+            raise ValueError("You have to specify a files/ subfolder")
+
+        self.view.samples_foldername = f"{self.view.folder_name}samples/"
+        os.makedirs(self.view.samples_foldername, exist_ok=True)
+        if cache is True:
+            cache = await asyncio.to_thread(get_default_cache)
+        async with make_async_session(workers) as session:
+            links = await async_list_remote_files(url.geturl(), ["hea", "dat"], session)
+            checksums = await async_get_remote_checksums(url.geturl(), session) if verify else {}
+            with self.view.metrics.phase("download", url=url.geturl()) as phase:
+                reports = await async_download_files(links, self.view.samples_foldername, workers, checksums,
+                                                     session, cache or None, self.executor.get_semaphore("downloads"))
+                # Bytes transferred over the network (and written to the samples folder)
+                phase["bytes_read"] = phase["bytes_written"] = sum(k["bytes"] for k in reports.values())
+                phase["details"]["files"] = len(reports)
+                phase["details"]["skipped"] = sum(bool(k.get("skipped")) for k in reports.values())
+        return True
+
+
+async def convert_record_async(record: str, formats_list: list, lazy: bool = True, chunk_size: int = None,
+                               executor: AsyncExecutor = None) -> dict:
+    """
+    Function converting a single record to the requested formats without blocking the event loop
+    (asynchronous counterpart of headat.batch.convert_record())
+    :param record: Record name or URL
+    :param formats_list: List of format names (see get_export_types())
+    :param lazy: If set to True, the record is memory-mapped
+    :param chunk_size: If specified, the chunked formats are written block by block
+    :param executor: AsyncExecutor (shared default executor if None)
+    :return: Dictionary format --> result dictionary (see HDView.export())
+    """
+    view = await AsyncHDView.open(record, lazy=lazy, executor=executor)
+    return await view.export(formats_list, chunk_size=chunk_size)
@@ -0,0 +1,203 @@
+"""
+
+          _   _ _____    _    ____    _  _____
+         | | | | ____|  / \  |  _ \  / \|_   _|
+         | |_| |  _|   / _ \ | | | |/ _ \ | |
+         |  _  | |___ / ___ \| |_| / ___ \| |
+         |_| |_|_____/_/   \_\____/_/   \_\_|
+
+            Developer           :   Lucas RODRIGUEZ
+            Maintainer          :   Lucas RODRIGUEZ
+            Development date    :   June 2022 - ...
+            File description    :   Parallel batch conversion of records
+            Official Git repo   :   https://github.com/lcsrodriguez/headat-signals
+
+"""
+import argparse
+import glob
+import importlib
+import os
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import tqdm
+
+from .main import *
+
+# Optional backends imported once per worker process (depending on the requested formats)
+FORMAT_BACKENDS = {
+    "xlsx": ["openpyxl"],
+    "parquet": ["pyarrow.parquet"],
+    "feather": ["pyarrow.feather"],
+    "hdf5": ["tables"],
+    "markdown": ["tabulate"],
+    "xml": ["lxml.etree"],
+    "matlab": ["scipy.io"],
+    "wav": ["wfdb.io.convert"],
+    "edf": ["wfdb.io.convert"],
+}
+
+
+def find_records(sources: list) -> list:
+    """
+    Function gathering the record names from a list of records and/or directories
+    :param sources: List of record names (with or without the .hea extension) and directories
+    (searched recursively for .hea files)
+    :return: List of unique record names (paths without the .hea extension)
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    records = []
+    for source in sources:
+        if os.path.isdir(source):
+            headers = sorted(glob.glob(os.path.join(source, "**", "*.hea"), recursive=True))
+            records.extend(k[: -len(".hea")] for k in headers)
+        elif source.endswith(".hea"):
+            records.append(source[: -len(".hea")])
+        else:
+            records.append(source)
+    return list(dict.fromkeys(records))
+
+
+def check_formats(formats_list: list) -> list:
+    """
+    Function checking the list of the requested export formats
+    :param formats_list: List of format names (see get_export_types())
+    :return: List of lower-cased format names
+    """
+    if isinstance(formats_list, str):
+        formats_list = [formats_list]
+    if not formats_list:
+        raise ValueError("At least one export format has to be specified.")
+    formats_list = [k.lower() for k in formats_list]
+    unknown = [k for k in formats_list if k not in get_export_types()]
+    if unknown:
+        raise ValueError(f"Unsupported export format(s): {', '.join(unknown)}")
+    return formats_list
+
+
+def init_worker(formats_list: list) -> None:
+    """
+    Function initializing a worker process of the pool
+    The optional backends of the requested formats are imported once per worker (and not for each record)
+    :param formats_list: List of format names
+    """
+    for format in formats_list:
+        for module in FORMAT_BACKENDS.get(format, []):
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+
+def convert_record(record: str, formats_list: list, lazy: bool = True, chunk_size: int = None) -> dict:
+    """
+    Function converting a single record to the requested formats (executed inside a worker)
+    :param record: Record name
+    :param formats_list: List of format names
+    :param lazy: If set to True, the record is memory-mapped (see HDView.add_record())
+    :param chunk_size: If specified, chunked formats are written block by block
+    :return: Dictionary reporting the success, the duration and the output folder of the conversion
+    """
+    result = {
+        "record": record,
+        "success": False,
+        "formats": {},
+        "folder": None,
+        "duration": None,
+        "error": None
+    }
+    start = time.perf_counter()
+    try:
+        view = HDView(record, lazy=lazy)
+        result["folder"] = view.folder_name
+        for format in formats_list:
+            method = getattr(view, formats[format]["callback"])
+            format_start = time.perf_counter()
+            if chunk_size is not None and formats[format].get("chunked", False):
+                success = method(chunk_size=chunk_size)
+            else:
+                success = method()
+            result["formats"][format] = {
+                "success": bool(success),
+                "duration": time.perf_counter() - format_start
+            }
+        result["success"] = all(k["success"] for k in result["formats"].values())
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["duration"] = time.perf_counter() - start
+    return result
+
+
+def convert_records(sources: list, formats_list: list, workers: int = None, lazy: bool = True,
+                    chunk_size: int = None, progress: bool = True) -> list:
+    """
+    Function converting many records in parallel over a pool of processes
+    :param sources: List of record names and/or directories (see find_records())
+    :param formats_list: List of format names (see get_export_types())
+    :param workers: Number of worker processes (number of CPUs if None, 0 to run in the current process)
+    :param lazy: If set to True, the records are memory-mapped (see HDView.add_record())
+    :param chunk_size: If specified, chunked formats are written block by block
+    :param progress: If set to True, a progress bar is displayed
+    :return: List of per-record results (same order as the records), see convert_record()
+    """
+    records = find_records(sources)
+    formats_list = check_formats(formats_list)
+    if workers is not None and workers < 0:
+        raise ValueError("The number of workers must be a positive integer.")
+
+    # Sequential conversion (debugging or tiny batches)
+    if workers == 0:
+        init_worker(formats_list)
+        return [convert_record(k, formats_list, lazy, chunk_size) for k in tqdm.tqdm(records, disable=not progress)]
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(formats_list,)) as executor:
+        futures = {executor.submit(convert_record, k, formats_list, lazy, chunk_size): k for k in records}
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures), disable=not progress, colour="blue"):
+            record = futures[future]
+            try:
+                results[record] = future.result()
+            except Exception as e:
+                # The worker process itself has failed (e.g. killed)
+                results[record] = {"record": record, "success": False, "formats": {}, "folder": None,
+                                   "duration": None, "error": f"{type(e).__name__}: {e}"}
+    return [results[k] for k in records]
+
+
+def main(argv: list = None) -> int:
+    """
+    Command-line entry point: python -m headat.batch <records or directories> -f <formats>
+    :param argv: List of command-line arguments (sys.argv if None)
+    :return: Exit code (0 if every record has been successfully converted)
+    """
+    parser = argparse.ArgumentParser(prog="python -m headat.batch",
+                                     description="HEADAT - Parallel batch conversion of WFDB records")
+    parser.add_argument("sources", nargs="+", help="Record names (with or without .hea) and/or directories")
+    parser.add_argument("-f", "--formats", nargs="+", required=True, help=f"Export formats: {', '.join(get_export_types())}")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("-c", "--chunk-size", type=int, default=None, help="Write the chunked formats block by block")
+    parser.add_argument("--eager", action="store_true", help="Fully load the records instead of memory-mapping them")
+    parser.add_argument("-r", "--report", default=None, help="Path of the JSON report file")
+    args = parser.parse_args(argv)
+
+    results = convert_records(args.sources, args.formats, workers=args.workers, lazy=not args.eager,
+                              chunk_size=args.chunk_size)
+
+    for result in results:
+        status = "OK" if result["success"] else "FAILED"
+        duration = f"{result['duration']:.3f}s" if result["duration"] is not None else "-"
+        print(f"[{status}] {result['record']} ({duration}){' : ' + result['error'] if result['error'] else ''}")
+    nb_failures = sum(not k["success"] for k in results)
+    print(f"{len(results) - nb_failures}/{len(results)} record(s) successfully converted")
+
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=4)
+    return 1 if nb_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+from .constants import *
+from .download import download_file, compute_sha256
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the index is only protected against concurrent threads
+    fcntl = None
+
+
+class DownloadCache:
+    """
+    Persistent, content-addressed cache of the downloaded files shared across the HDViews
+    (and across the processes using the same cache folder)
+        - objects/<2 first chars>/<sha256> : cached files (read-only), stored once per content
+        - index.json : URL --> {sha256, size, last access} (used for the LRU eviction)
+    Cached files are served by hard-linking them (or by a symbolic link if the destination
+    is on another filesystem) instead of copying them
+    """
+
+    def __init__(self, folder: str = DEFAULT_CACHE_FOLDER, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """
+        Constructor function initializing (or re-opening) a cache folder
+        :param folder: Path of the cache folder
+        :param max_size: Maximum total size of the cached files (in bytes)
+        """
+        if max_size is None or max_size < 0:
+            raise ValueError("The maximum size of the cache must be a positive integer.")
+        self.folder = folder
+        self.max_size = int(max_size)
+        self.objects_folder = os.path.join(folder, "objects")
+        self.tmp_folder = os.path.join(folder, "tmp")
+        self.index_filename = os.path.join(folder, "index.json")
+        self.lock = threading.RLock()
+        os.makedirs(self.objects_folder, exist_ok=True)
+        os.makedirs(self.tmp_folder, exist_ok=True)
+
+        # The maximum size may have been lowered since the last use of the folder
+        self.evict()
+
+    def __repr__(self) -> str:
+        return f"DownloadCache({self.folder}, max_size={self.max_size})"
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Context manager locking the index against concurrent threads and processes
+        """
+        with self.lock:
+            with open(os.path.join(self.folder, ".lock"), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_filename, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self, index: dict) -> None:
+        tmp_filename = self.index_filename + f".{os.getpid()}.tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_filename, self.index_filename)
+
+    def get_object_path(self, sha256: str) -> str:
+        """
+        Function returning the path of a cached file from its content hash
+        :param sha256: SHA-256 hexadecimal digest
+        :return: Path of the cached file
+        """
+        return os.path.join(self.objects_folder, sha256[:2], sha256)
+
+    def get_tmp_path(self, url: str) -> str:
+        """
+        Function returning the path where a URL is downloaded (and resumed) before being cached
+        :param url: URL of the file
+        :return: Path of the partial download
+        """
+        path = os.path.join(self.tmp_folder, hashlib.sha256(url.encode()).hexdigest())
+        if fcntl is None:
+            # Downloads cannot be locked: each thread of each process uses its own partial file
+            path += f".{os.getpid()}.{threading.get_ident()}"
+        return path
+
+    def acquire_url(self, url: str):
+        """
+        Function locking the download of a URL against concurrent threads and processes (blocking)
+        The lock files (tmp/<hash>.lock) are kept: removing them would let two processes lock different files
+        :param url: URL of the file
+        :return: Lock file (to be released by release_url())
+        """
+        lock_file = open(os.path.join(self.tmp_folder, hashlib.sha256(url.encode()).hexdigest() + ".lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except BaseException:
+                lock_file.close()
+                raise
+        return lock_file
+
+    @staticmethod
+    def release_url(lock_file) -> None:
+        """
+        Function releasing the lock taken by acquire_url()
+        :param lock_file: Lock file returned by acquire_url()
+        """
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
+
+    @contextlib.contextmanager
+    def _url_locked(self, url: str):
+        """
+        Context manager locking the download of a URL (see acquire_url())
+        """
+        lock_file = self.acquire_url(url)
+        try:
+            yield
+        finally:
+            self.release_url(lock_file)
+
+    def lookup(self, url: str, sha256: str = None) -> str:
+        """
+        Function returning the cached copy of a URL (and marking it as recently used)
+        :param url: URL of the file
+        :param sha256: Expected SHA-256 digest (the cached copy is ignored if it differs)
+        :return: Path of the cached file or None if the URL is not cached
+        """
+        with self._locked():
+            index = self._read_index()
+            entry = index.get(url)
+            if entry is None or (sha256 is not None and entry["sha256"] != sha256):
+                return None
+            path = self.get_object_path(entry["sha256"])
+            if not os.path.isfile(path):
+                del index[url]
+                self._write_index(index)
+                return None
+            entry["last_access"] = time.time()
+            self._write_index(index)
+            return path
+
+    def store(self, url: str, path: str, sha256: str = None) -> str:
+        """
+        Function moving a downloaded file into the cache
+        :param url: URL of the file
+        :param path: Path of the downloaded file (moved into the cache)
+        :param sha256: SHA-256 digest of the file (computed if None)
+        :return: Path of the cached file
+        """
+        if sha256 is None:
+            sha256 = compute_sha256(path)
+        object_path = self.get_object_path(sha256)
+        with self._locked():
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            if os.path.isfile(object_path):
+                # Same content already cached (e.g. from another URL)
+                os.remove(path)
+            else:
+                os.replace(path, object_path)
+                os.chmod(object_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            index = self._read_index()
+            index[url] = {"sha256": sha256, "size": os.path.getsize(object_path), "last_access": time.time()}
+            self._write_index(index)
+            self._evict(index, keep=sha256)
+        return object_path
+
+    @staticmethod
+    def link(source: str, destination: str) -> str:
+        """
+        Function exposing a cached file at a given path without copying it
+        (hard link, symbolic link if hard links are not possible, copy as a last resort)
+        :param source: Path of the cached file
+        :param destination: Destination path
+        :return: Method used ("hardlink", "symlink" or "copy")
+        """
+        if os.path.lexists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+            return "hardlink"
+        except OSError:
+            pass
+        try:
+            os.symlink(os.path.abspath(source), destination)
+            return "symlink"
+        except OSError:
+            shutil.copyfile(source, destination)
+            return "copy"
+
+    def lookup_report(self, url: str, path: str, sha256: str = None) -> dict:
+        """
+        Function returning the report of a cache hit (see fetch())
+        :param url: URL of the file
+        :param path: Local path where the file has to be available
+        :param sha256: Expected SHA-256 digest (not verified if None)
+        :return: Dictionary reporting the download or None if the URL is not cached
+        """
+        cached_path = self.lookup(url, sha256)
+        if cached_path is None:
+            return None
+        return {"url": url, "path": path, "bytes": 0, "resumed": False, "verified": sha256 is not None,
+                "skipped": True, "sha256": os.path.basename(cached_path), "cached": True}
+
+    def fetch(self, url: str, path: str, sha256: str = None, session=None) -> dict:
+        """
+        Function serving a remote file from the cache (the file is downloaded and cached on a miss)
+        Same signature and report as download_file()
+        :param url: URL of the file
+        :param path: Local path where the file has to be available
+        :param sha256: Expected SHA-256 digest (not verified if None)
+        :param session: HTTP session used on a cache miss
+        :return: Dictionary reporting the download (with the "cached" and "link" additional fields)
+        """
+        result = self.lookup_report(url, path, sha256)
+        if result is None:
+            # Only one thread or process downloads a given URL: the others wait for it and are served by the cache
+            with self._url_locked(url):
+                result = self.lookup_report(url, path, sha256)
+                if result is None:
+                    # Partial downloads are kept (and resumed) inside the cache folder
+                    tmp_path = self.get_tmp_path(url)
+                    result = download_file(url, tmp_path, sha256, session)
+                    cached_path = self.store(url, tmp_path, result["sha256"])
+                    result.update(sha256=os.path.basename(cached_path), cached=False)
+        result["link"] = self.link(self.get_object_path(result["sha256"]), path)
+        return result
+
+    def evict(self) -> None:
+        """
+        Function removing the least recently used files until the cache fits in its maximum size
+        """
+        with self._locked():
+            self._evict(self._read_index())
+
+    def _evict(self, index: dict, keep: str = None) -> None:
+        """
+        Function removing the least recently used files until the cache fits in its maximum size
+        (the caller must hold the lock)
+        :param index: Current index
+        :param keep: SHA-256 digest of a file which must not be evicted
+        """
+        # Last access and size per content (several URLs may share the same content)
+        objects = {}
+        for url, entry in index.items():
+            last_access, _ = objects.get(entry["sha256"], (0, 0))
+            objects[entry["sha256"]] = (max(last_access, entry["last_access"]), entry["size"])
+        total_size = sum(size for _, size in objects.values())
+        evicted = set()
+        for sha256, (_, size) in sorted(objects.items(), key=lambda k: k[1][0]):
+            if total_size <= self.max_size:
+                break
+            if sha256 == keep:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.get_object_path(sha256))
+            evicted.add(sha256)
+            total_size -= size
+        if evicted:
+            for url in [k for k, v in index.items() if v["sha256"] in evicted]:
+                del index[url]
+            self._write_index(index)
+
+    def get_size(self) -> int:
+        """
+        Function returning the total size of the cached files
+        :return: Size in bytes
+        """
+        index = self._read_index()
+        return sum(dict((v["sha256"], v["size"]) for v in index.values()).values())
+
+    def get_info(self) -> dict:
+        """
+        Function returning information about the cache
+        :return: Dictionary
+        """
+        index = self._read_index()
+        return {
+            "folder": self.folder,
+            "max_size": self.max_size,
+            "size": self.get_size(),
+            "nb_urls": len(index),
+            "nb_files": len(set(v["sha256"] for v in index.values()))
+        }
+
+    def clear(self) -> None:
+        """
+        Function removing every cached file
+        """
+        with self._locked():
+            shutil.rmtree(self.objects_folder, ignore_errors=True)
+            os.makedirs(self.objects_folder, exist_ok=True)
+            self._write_index({})
+
+
+# Cache shared by every HDView of the process (see get_default_cache() and set_default_cache())
+_default_cache = {"cache": None, "enabled": True}
+
+
+def get_default_cache() -> DownloadCache:
+    """
+    Function returning the download cache shared by the HDViews
+    (located in HEADAT_CACHE_DIR, ~/.cache/headat by default)
+    :return: DownloadCache or None if the cache has been disabled
+    """
+    if _default_cache["enabled"] and _default_cache["cache"] is None:
+        _default_cache["cache"] = DownloadCache()
+    return _default_cache["cache"]
+
+
+def set_default_cache(cache) -> None:
+    """
+    Function replacing (or disabling with None) the download cache shared by the HDViews
+    :param cache: DownloadCache or None
+    """
+    _default_cache["cache"] = cache
+    _default_cache["enabled"] = cache is not None
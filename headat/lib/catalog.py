@@ -0,0 +1,397 @@
+"""
+Header-only catalog of local record collections
+
+The .hea headers found in directory trees are parsed in parallel (without reading any sample) and
+indexed in a SQLite file, so that the records can be searched by signal name, sampling frequency or
+duration and opened directly:
+    catalog = RecordCatalog("records.db")
+    catalog.update(["physionet/mitdb", "physionet/ptbdb"])     # only the new or modified headers are parsed
+    catalog.find(sig_name="MLII", min_duration=1800)           # list of entries
+    view = catalog.open(catalog.find(fs=360)[0], lazy=True)    # HDView
+"""
+from .constants import *
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import wfdb as wf
+
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    record TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    mtime INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    fs REAL,
+    sig_len INTEGER,
+    n_sig INTEGER,
+    duration REAL,
+    base_date TEXT,
+    base_time TEXT,
+    sig_name TEXT,
+    units TEXT,
+    fmt TEXT,
+    comments TEXT,
+    n_segments INTEGER,
+    files TEXT,
+    error TEXT,
+    indexed_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signals (
+    record TEXT NOT NULL REFERENCES records(record) ON DELETE CASCADE,
+    channel INTEGER NOT NULL,
+    sig_name TEXT,
+    units TEXT,
+    PRIMARY KEY (record, channel)
+);
+CREATE TABLE IF NOT EXISTS segments (
+    record TEXT NOT NULL REFERENCES records(record) ON DELETE CASCADE,
+    segment TEXT NOT NULL,
+    PRIMARY KEY (record, segment)
+);
+CREATE INDEX IF NOT EXISTS segments_segment ON segments(segment);
+CREATE INDEX IF NOT EXISTS records_fs ON records(fs);
+CREATE INDEX IF NOT EXISTS records_duration ON records(duration);
+CREATE INDEX IF NOT EXISTS records_folder ON records(folder);
+CREATE INDEX IF NOT EXISTS signals_sig_name ON signals(sig_name COLLATE NOCASE);
+"""
+
+# Columns of the records table returned by RecordCatalog.find() (the JSON columns are decoded)
+_CATALOG_COLUMNS = ["record", "name", "folder", "fs", "sig_len", "n_sig", "duration", "base_date", "base_time",
+                    "sig_name", "units", "fmt", "comments", "n_segments", "files"]
+_JSON_COLUMNS = ["sig_name", "units", "fmt", "comments", "files", "headers"]
+
+
+def scan_headers(sources: list) -> dict:
+    """
+    Function gathering the headers of a list of records and/or directories (searched recursively)
+    :param sources: List of record names (with or without the .hea extension) and directories
+    :return: Dictionary absolute record name (path without the .hea extension) --> (mtime in ns, size) of the header
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    headers = {}
+    for source in sources:
+        if os.path.isdir(source):
+            folders = [os.path.abspath(source)]
+            while folders:
+                with os.scandir(folders.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            folders.append(entry.path)
+                        elif entry.name.endswith(".hea") and entry.is_file():
+                            stat = entry.stat()
+                            headers[entry.path[: -len(".hea")]] = (stat.st_mtime_ns, stat.st_size)
+        else:
+            record = os.path.abspath(source[: -len(".hea")] if source.endswith(".hea") else source)
+            stat = os.stat(record + ".hea")
+            headers[record] = (stat.st_mtime_ns, stat.st_size)
+    return headers
+
+
+def _get_signature(record: str, headers: list, stats: dict) -> tuple:
+    """
+    Function returning the modification signature (latest mtime, total size) of the headers of a record
+    (the main header and the segment headers of the multi-segment records)
+    :param record: Absolute record name
+    :param headers: Header files of the record, relative to its folder
+    :param stats: Dictionary record name --> (mtime, size) of the scanned headers (see scan_headers())
+    """
+    mtime, size = 0, 0
+    for header in headers:
+        name = os.path.join(os.path.dirname(record), header)[: -len(".hea")]
+        if name not in stats:
+            try:
+                stat = os.stat(name + ".hea")
+                stats[name] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stats[name] = (-1, -1)
+        mtime, size = max(mtime, stats[name][0]), size + stats[name][1]
+    return mtime, size
+
+
+def read_header_entry(record: str) -> dict:
+    """
+    Function parsing the header of a record into a catalog entry (no sample is read)
+    The signal files and the information are gathered as HDView.list_record_files() and HDView.get_info() do
+    :param record: Absolute record name (path without the .hea extension)
+    :return: Dictionary of the columns of the records table (the error column is set if the parse fails)
+    """
+    from ..main import HDView
+    from .signals import MultiSegmentSignals
+
+    entry = {"record": record, "name": os.path.basename(record), "folder": os.path.dirname(record),
+             "headers": [os.path.basename(record) + ".hea"], "error": None}
+    try:
+        header = wf.rdheader(record)
+        files = HDView.list_record_files(record, header)
+        if isinstance(header, wf.MultiRecord):
+            infos = MultiSegmentSignals(record, header).get_infos()
+            fmts = None
+            entry["n_segments"] = sum(1 for k in header.seg_name if k != "~") - (header.layout == "variable")
+            entry["headers"] += [k for k in files if k.endswith(".hea")]
+        else:
+            infos = {field: getattr(header, field) for field in RECORD_INFO_FIELDS}
+            fmts = [str(k) for k in header.fmt or []]
+            entry["n_segments"] = 1
+        entry.update(
+            fs=float(infos["fs"]),
+            sig_len=int(infos["sig_len"] or 0),
+            n_sig=int(infos["n_sig"] or 0),
+            duration=(infos["sig_len"] or 0) / infos["fs"] if infos["fs"] else None,
+            base_date=infos["base_date"].isoformat() if infos.get("base_date") is not None else None,
+            base_time=infos["base_time"].isoformat() if infos.get("base_time") is not None else None,
+            sig_name=list(infos.get("sig_name") or []),
+            units=list(infos.get("units") or []),
+            fmt=fmts,
+            comments=list(infos.get("comments") or []),
+            files=files
+        )
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    return entry
+
+
+def read_header_entries(records: list) -> list:
+    """
+    Function parsing a batch of headers (executed inside a worker)
+    :param records: List of absolute record names
+    :return: List of catalog entries (see read_header_entry())
+    """
+    return [read_header_entry(k) for k in records]
+
+
+class RecordCatalog:
+    """
+    SQLite index of the headers of local record collections
+        - records: 1 row per record (name, folder, fs, sig_len, n_sig, duration in seconds, base_date,
+        base_time, signal names, units, formats, comments, number of segments, files, parse error)
+        - signals: 1 row per signal of each record (indexed by name for the lookups)
+        - segments: 1 row per segment of each multi-segment record (the segments are records as well)
+    The index is updated incrementally: only the records whose headers (including the segment headers)
+    have been added or modified since the last update are parsed again
+    """
+
+    def __init__(self, filename: str) -> None:
+        """
+        Constructor function opening (or creating) a catalog file
+        :param filename: Path of the SQLite index file
+        """
+        self.filename = filename
+        folder = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(folder, exist_ok=True)
+        self.lock = threading.RLock()
+        with self._connect() as connection:
+            connection.executescript(_CATALOG_SCHEMA)
+
+    def __repr__(self) -> str:
+        return f"RecordCatalog({self.filename}, records={len(self)})"
+
+    def __len__(self) -> int:
+        with self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM records WHERE error IS NULL AND sig_len > 0 AND "
+                                      "record NOT IN (SELECT segment FROM segments)").fetchone()[0]
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Context manager opening a connection to the index (committed if no exception is raised)
+        """
+        with self.lock:
+            connection = sqlite3.connect(self.filename, timeout=60)
+            try:
+                connection.execute("PRAGMA foreign_keys = ON")
+                with connection:
+                    yield connection
+            finally:
+                connection.close()
+
+    def update(self, sources: list, workers: int = None, remove_missing: bool = True,
+               batch_size: int = DEFAULT_CATALOG_BATCH_SIZE, progress: bool = False) -> dict:
+        """
+        Function adding the new and modified records of directories to the catalog
+        :param sources: List of record names and/or directories (searched recursively for .hea files)
+        :param workers: Number of worker processes parsing the headers (number of CPUs if None, 0 to parse
+        them in the current process)
+        :param remove_missing: If set to True, the catalogued records of the scanned directories whose header
+        has been deleted are removed from the catalog
+        :param batch_size: Number of headers parsed per task
+        :param progress: If set to True, a progress bar is displayed
+        :return: Dictionary containing the numbers of scanned, added, updated, unchanged, removed and failed records
+        """
+        if workers is not None and workers < 0:
+            raise ValueError("The number of workers must be a positive integer.")
+        if isinstance(sources, str):
+            sources = [sources]
+        stats = scan_headers(sources)
+        with self._connect() as connection:
+            known = {record: (mtime, size, json.loads(headers)) for record, mtime, size, headers in
+                     connection.execute("SELECT record, mtime, size, headers FROM records")}
+
+        report = {"scanned": len(stats), "added": 0, "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        pending = []
+        for record in stats:
+            if record in known and known[record][:2] == _get_signature(record, known[record][2], stats):
+                report["unchanged"] += 1
+            else:
+                pending.append(record)
+
+        # Records of the scanned directories which do not exist anymore
+        missing = []
+        if remove_missing:
+            roots = [os.path.join(os.path.abspath(k), "") for k in sources if os.path.isdir(k)]
+            missing = [k for k in known if k not in stats and any(k.startswith(root) for root in roots)]
+
+        batches = [pending[k: k + batch_size] for k in range(0, len(pending), batch_size)]
+        if workers == 0 or len(batches) <= 1:
+            results = map(read_header_entries, batches)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(read_header_entries, batches)
+        try:
+            if progress:
+                import tqdm
+                results = tqdm.tqdm(results, total=len(batches), unit="batch", colour="blue")
+            for entries in results:
+                for entry in entries:
+                    entry["mtime"], entry["size"] = _get_signature(entry["record"], entry["headers"], stats)
+                    report["failed" if entry["error"] else ("updated" if entry["record"] in known else "added")] += 1
+                self._write_entries(entries)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        if missing:
+            with self._connect() as connection:
+                connection.executemany("DELETE FROM records WHERE record = ?", [(k,) for k in missing])
+            report["removed"] = len(missing)
+        return report
+
+    def _write_entries(self, entries: list) -> None:
+        """
+        Function inserting (or replacing) catalog entries in a single transaction
+        :param entries: List of catalog entries (see read_header_entry())
+        """
+        indexed_at = datetime.datetime.now().isoformat()
+        columns = ["record", "name", "folder", "mtime", "size", "headers", "fs", "sig_len", "n_sig", "duration",
+                   "base_date", "base_time", "sig_name", "units", "fmt", "comments", "n_segments", "files", "error"]
+        rows = [[json.dumps(entry.get(k)) if k in _JSON_COLUMNS else entry.get(k) for k in columns] + [indexed_at]
+                for entry in entries]
+        signals = []
+        for entry in entries:
+            units = entry.get("units") or []
+            signals += [(entry["record"], k, name, units[k] if k < len(units) else None)
+                        for k, name in enumerate(entry.get("sig_name") or [])]
+        with self._connect() as connection:
+            connection.executemany("DELETE FROM records WHERE record = ?", [(entry["record"],) for entry in entries])
+            connection.executemany(f"INSERT INTO records ({', '.join(columns)}, indexed_at) "
+                                   f"VALUES ({', '.join(['?'] * (len(columns) + 1))})", rows)
+            connection.executemany("INSERT INTO signals (record, channel, sig_name, units) VALUES (?, ?, ?, ?)",
+                                   signals)
+            connection.executemany("INSERT INTO segments (record, segment) VALUES (?, ?)",
+                                   [(entry["record"], os.path.join(entry["folder"], k[: -len(".hea")]))
+                                    for entry in entries for k in entry["headers"][1:]])
+
+    def find(self, sig_name=None, fs: float = None, min_fs: float = None, max_fs: float = None,
+             min_duration: float = None, max_duration: float = None, folder: str = None, name: str = None,
+             segments: bool = False, limit: int = None) -> list:
+        """
+        Function searching the catalog (the criteria are combined)
+        The records without samples (layout headers of the variable-layout records) are never returned
+        :param sig_name: Signal name (or list of signal names which all have to be recorded), case-insensitive
+        :param fs: Sampling frequency (in Hz)
+        :param min_fs: Minimum sampling frequency (in Hz)
+        :param max_fs: Maximum sampling frequency (in Hz)
+        :param min_duration: Minimum duration (in seconds)
+        :param max_duration: Maximum duration (in seconds)
+        :param folder: Directory containing the records (searched recursively)
+        :param name: Record name (SQL LIKE pattern, e.g. "1%")
+        :param segments: If set to True, the segments of the catalogued multi-segment records are returned as well
+        :param limit: Maximum number of returned entries
+        :return: List of entries (dictionaries of the records table columns, sorted by record name), the record
+        field being ready to be opened by HDView (see open())
+        """
+        conditions, parameters = ["error IS NULL", "sig_len > 0"], []
+        if not segments:
+            conditions.append("record NOT IN (SELECT segment FROM segments)")
+        for value in ([sig_name] if isinstance(sig_name, str) else sig_name or []):
+            conditions.append("record IN (SELECT record FROM signals WHERE sig_name = ? COLLATE NOCASE)")
+            parameters.append(value)
+        for condition, value in [("fs = ?", fs), ("fs >= ?", min_fs), ("fs <= ?", max_fs),
+                                 ("duration >= ?", min_duration), ("duration <= ?", max_duration),
+                                 ("name LIKE ?", name)]:
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        if folder is not None:
+            folder = os.path.abspath(folder)
+            conditions.append("(folder = ? OR substr(folder, 1, ?) = ?)")
+            parameters += [folder, len(folder) + 1, os.path.join(folder, "")]
+        query = f"SELECT {', '.join(_CATALOG_COLUMNS)} FROM records WHERE {' AND '.join(conditions)} ORDER BY record"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self._connect() as connection:
+            rows = connection.execute(query, parameters).fetchall()
+        return [{k: json.loads(v) if k in _JSON_COLUMNS and v is not None else v
+                 for k, v in zip(_CATALOG_COLUMNS, row)} for row in rows]
+
+    def get(self, record: str):
+        """
+        Function returning the entry of a record
+        :param record: Record name (path with or without the .hea extension)
+        :return: Dictionary (None if the record is not catalogued)
+        """
+        record = os.path.abspath(record[: -len(".hea")] if record.endswith(".hea") else record)
+        with self._connect() as connection:
+            row = connection.execute(f"SELECT {', '.join(_CATALOG_COLUMNS)} FROM records "
+                                     "WHERE record = ? AND error IS NULL", (record,)).fetchone()
+        if row is None:
+            return None
+        return {k: json.loads(v) if k in _JSON_COLUMNS and v is not None else v for k, v in zip(_CATALOG_COLUMNS, row)}
+
+    def get_errors(self) -> dict:
+        """
+        Function returning the records whose header could not be parsed
+        :return: Dictionary record name --> error message
+        """
+        with self._connect() as connection:
+            return dict(connection.execute("SELECT record, error FROM records WHERE error IS NOT NULL"))
+
+    def get_signal_names(self) -> dict:
+        """
+        Function returning the signal names of the catalogued records
+        :return: Dictionary signal name --> number of records
+        """
+        with self._connect() as connection:
+            return dict(connection.execute("SELECT sig_name, COUNT(DISTINCT record) FROM signals "
+                                           "GROUP BY sig_name ORDER BY sig_name"))
+
+    def open(self, entry, lazy: bool = True, **kwargs):
+        """
+        Function opening a catalogued record
+        :param entry: Entry returned by find() or record name
+        :param lazy: If set to True, the record is memory-mapped (see HDView.add_record())
+        :param kwargs: Additional keyword arguments of HDView
+        :return: HDView
+        """
+        from ..main import HDView
+
+        return HDView(entry["record"] if isinstance(entry, dict) else entry, lazy=lazy, **kwargs)
+
+    def open_all(self, lazy: bool = True, view_options: dict = None, **criteria):
+        """
+        Function opening the records matching search criteria one after the other
+        :param lazy: If set to True, the records are memory-mapped
+        :param view_options: Dictionary of additional keyword arguments of HDView
+        :param criteria: Search criteria (see find())
+        :return: Generator of HDView
+        """
+        for entry in self.find(**criteria):
+            yield self.open(entry, lazy, **(view_options or {}))
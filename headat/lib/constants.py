@@ -1,77 +1,260 @@
+import os
+
 formats = {
     "text": {
         "extension": "",
         "method": "custom",
-        "callback": "t_text"
+        "callback": "t_txt",
+        "streaming": True,
+        "chunked": True
     },
     "xlsx": {
         "extension": "xlsx",
         "method": "to_excel",
-        "callback": "t_xlsx"
+        "callback": "t_xlsx",
+        "chunked": True
     },
     "csv": {
         "extension": "csv",
         "method": "to_csv",
-        "callback": "t_csv"
+        "callback": "t_csv",
+        "streaming": True,
+        "chunked": True
     },
     "json": {
         "extension": "json",
         "method": "to_json",
+        "callback": "t_json",
+        "streaming": True,
+        "chunked": True
+    },
+    "ndjson": {
+        "extension": "ndjson",
+        "method": "custom",
+        "callback": "t_ndjson",
+        "streaming": True,
+        "chunked": True
     },
     "xml": {
         "extension": "xml",
-        "method": "to_xml"
+        "method": "to_xml",
+        "callback": "t_xml",
+        "streaming": True,
+        "chunked": True
     },
     "markdown": {
         "extension": "md",
-        "method": "to_markdown"
+        "method": "to_markdown",
+        "callback": "t_md"
     },
     "latex": {
         "extension": "tex",
-        "method": "to_latex"
+        "method": "to_latex",
+        "callback": "t_tex"
     },
     "parquet": {
         "extension": "parquet",
-        "method": "to_parquet"
+        "method": "to_parquet",
+        "callback": "t_parquet",
+        "streaming": True,
+        "chunked": True,
+        "parallel": True
     },
     "pickle": {
         "extension": "pickle",
-        "method": "to_pickle"
+        "method": "to_pickle",
+        "callback": "t_pickle",
+        "parallel": True
     },
     "sql": {
         "extension": "db",
-        "method": "to_sql"
+        "method": "to_sql",
+        "callback": "t_sql",
+        "chunked": True
     },
     "matlab": {
         "extension": "mat",
-        "method": "custom"
+        "method": "custom",
+        "callback": "t_matlab",
+        "parallel": True
     },
     "wav": {
         "extension": "wav",
-        "method": "custom"
+        "method": "custom",
+        "callback": "t_wav",
+        "parallel": True
     },
     "edf": {
         "extension": "edf",
-        "method": "custom"
+        "method": "custom",
+        "callback": "t_edf",
+        "parallel": True
     },
     "feather": {
         "extension": "fea",
         "method": "to_feather",
+        "callback": "t_feather",
+        "streaming": True,
+        "chunked": True,
+        "parallel": True
     },
     "stata": {
         "extension": "dta",
         "method": "to_stata",
+        "callback": "t_stata"
     },
     "html": {
         "extension": "html",
         "method": "to_html",
+        "callback": "t_html"
     },
     "hdf5": {
         "extension": "h5",
         "method": "to_hdf",
+        "callback": "t_hdf5",
+        "streaming": True,
+        "chunked": True,
+        "parallel": True
+    },
+    "store": {
+        "extension": "hds",
+        "method": "custom",
+        "callback": "t_store",
+        "chunked": True,
+        "parallel": True
+    },
+    "pyramid": {
+        "extension": "pyr.npz",
+        "method": "custom",
+        "callback": "t_pyramid",
+        "chunked": True,
+        "parallel": True
     }
 
 }
 
 EXPORT_FOLDERS = "out"
-EXCEL_ROW_LIMIT = 1048576 - 2
\ No newline at end of file
+EXCEL_ROW_LIMIT = 1048576 - 2
+# Deflate compression level of the parts of the streamed workbooks (see write_xlsx())
+EXCEL_COMPRESS_LEVEL = 1
+
+# WFDB signal formats which can be memory-mapped and decoded on demand (lazy mode)
+# See https://www.physionet.org/physiotools/wag/signal-5.htm
+LAZY_DAT_FORMATS = {
+    # format: (Numpy load type, bytes per sample)
+    "16": ("<i2", 2),
+    "24": ("<u1", 3),
+    "32": ("<i4", 4),
+    "61": (">i2", 2),
+    "80": ("<u1", 1),
+    "160": ("<u2", 2),
+    "212": ("<u1", 1.5),
+}
+
+# Digital value used by WFDB to represent a missing/invalid sample
+DAT_INVALID_SAMPLE_VALUE = {
+    "16": -(2 ** 15),
+    "24": -(2 ** 23),
+    "32": -(2 ** 31),
+    "61": -(2 ** 15),
+    "80": -(2 ** 7),
+    "160": -(2 ** 15),
+    "212": -(2 ** 11),
+}
+
+
+# Default number of samples per block for the streaming (chunked) exporters
+DEFAULT_CHUNK_SIZE = 100000
+
+# Vectorized text engine (see write_text())
+DEFAULT_TEXT_WORKERS = min(4, os.cpu_count() or 1)
+TEXT_MAX_PRECISION = 15
+
+# Header-only catalog of the local records (see RecordCatalog)
+DEFAULT_CATALOG_BATCH_SIZE = 256
+
+# Remote downloads (see download_sources())
+DEFAULT_DOWNLOAD_WORKERS = 4
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+CHECKSUMS_FILENAME = "SHA256SUMS.txt"
+
+# Asyncio API of the views (see headat.aio.AsyncExecutor)
+DEFAULT_ASYNC_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+DEFAULT_ASYNC_DOWNLOADS = 8
+
+# Shared download cache (see DownloadCache)
+DEFAULT_CACHE_FOLDER = os.environ.get("HEADAT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "headat"))
+DEFAULT_CACHE_SIZE = int(os.environ.get("HEADAT_CACHE_SIZE", 50 * 1024 ** 3))
+
+# Signal buffers shared between processes (see SharedSignals)
+SHARED_SIGNALS_PREFIX = "headat_"
+# Attributes of a view which are not carried by the handle of its shared signals (see HDView.share_signals())
+SHARED_VIEW_EXCLUDED = ["signals", "cached_frame", "pyramid", "spark_context", "metrics", "shared"]
+
+# Conversion server (see headat.server) and its cache of the converted files (see ResultCache)
+DEFAULT_SERVER_HOST = "127.0.0.1"
+DEFAULT_SERVER_PORT = 8642
+DEFAULT_SERVER_MAX_PENDING = 64
+DEFAULT_SERVER_VIEWS = 4
+DEFAULT_SERVER_JOB_HISTORY = 1024
+DEFAULT_RESULT_CACHE_FOLDER = os.environ.get("HEADAT_RESULT_CACHE_DIR", os.path.join(DEFAULT_CACHE_FOLDER, "results"))
+DEFAULT_RESULT_CACHE_SIZE = int(os.environ.get("HEADAT_RESULT_CACHE_SIZE", 20 * 1024 ** 3))
+# Maximum number of files whose digest is kept in memory (see get_content_digest())
+RESULT_DIGEST_MEMO_SIZE = 4096
+
+# Spark integration (see get_spark_session())
+SPARK_APP_NAME = "HEADAT RDD Converter"
+DEFAULT_SPARK_MASTER = os.environ.get("HEADAT_SPARK_MASTER", "local[*]")
+SPARK_DEFAULT_CONFIG = {
+    "spark.sql.execution.arrow.pyspark.enabled": "true",
+    "spark.sql.execution.arrow.pyspark.fallback.enabled": "true",
+}
+
+# Native (smallest) Numpy integer dtype holding the digital samples of each WFDB format
+DAT_DIGITAL_DTYPE = {
+    "8": "int32",
+    "16": "int16",
+    "24": "int32",
+    "32": "int32",
+    "61": "int16",
+    "80": "int8",
+    "160": "int16",
+    "212": "int16",
+    "310": "int16",
+    "311": "int16",
+    "508": "int8",
+    "516": "int16",
+    "524": "int32",
+}
+
+# Fields of the record information dictionary (as returned by wfdb.rdsamp)
+RECORD_INFO_FIELDS = ["fs", "sig_len", "n_sig", "base_date", "base_time", "units", "sig_name", "comments"]
+# Additional fields kept when the digital (ADC) values are loaded
+DIGITAL_INFO_FIELDS = ["fmt", "adc_gain", "baseline"]
+# Fields of the record information holding 1 value per signal
+SIGNAL_INFO_FIELDS = ["units", "sig_name", "fmt", "adc_gain", "baseline"]
+
+# Maximum number of segments of a multi-segment record kept open (see MultiSegmentSignals)
+MULTI_SEGMENT_CACHE = 4
+
+# HEADAT-native store (see write_store() and StoreSignals)
+STORE_MAGIC = b"HEADATS\x01"
+STORE_VERSION = 1
+DEFAULT_STORE_CHUNK_SIZE = 65536
+STORE_CACHE_CHUNKS = 64
+
+# Min/max/mean overview pyramid (see SignalPyramid)
+PYRAMID_BASE_BIN = 64
+PYRAMID_FACTOR = 4
+DEFAULT_OVERVIEW_PIXELS = 1000
+
+# Maximum size of the samples written to a MAT v5 file (2 GB limit of the format, minus room for the headers):
+# larger records are written to MAT v7.3 (HDF5-based) files
+MATLAB_V5_MAX_BYTES = 2 ** 31 - 2 ** 20
+
+# SQL bulk loader (see write_record_sql())
+DEFAULT_SQL_PREFIX = "headat_"
+DEFAULT_SQL_BATCH_SIZE = 10000
+# Maximum number of parameters of a multi-row INSERT (SQLite >= 3.32)
+SQL_MAX_PARAMETERS = 32766
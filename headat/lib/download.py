@@ -0,0 +1,445 @@
+from .constants import *
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
+
+# requests, aiohttp, tqdm and bs4 are only imported when a download is performed (fast import of headat.main)
+
+# HTTP status codes of the failed requests which are retried
+RETRY_STATUSES = [500, 502, 503, 504]
+
+
+def make_session(pool_size: int = DEFAULT_DOWNLOAD_WORKERS) -> "requests.Session":
+    """
+    Function creating an HTTP session whose connections are pooled (and reused) across the downloads
+    :param pool_size: Maximum number of simultaneous connections per host
+    :return: requests.Session
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size,
+                          max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=RETRY_STATUSES))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def list_remote_files(url: str, extensions: list = None, session: "requests.Session" = None) -> dict:
+    """
+    Function listing the files of a remote directory (HTML listing page)
+    :param url: URL of the directory (ending with a /)
+    :param extensions: List of the extensions to keep (all files if None)
+    :param session: HTTP session (a new one is created if None)
+    :return: Dictionary filename --> URL
+    """
+    session = session or make_session()
+    r = session.get(url, timeout=DOWNLOAD_TIMEOUT)
+    r.raise_for_status()
+    return parse_remote_files(r.text, url, extensions)
+
+
+def parse_remote_files(text: str, url: str, extensions: list = None) -> dict:
+    """
+    Function extracting the files of a remote directory from its HTML listing page
+    :param text: HTML listing page
+    :param url: URL of the directory (ending with a /)
+    :param extensions: List of the extensions to keep (all files if None)
+    :return: Dictionary filename --> URL
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(text, "html.parser")
+    links = {}
+    for k in soup.find_all("a"):
+        href = k.get("href")
+        if not href or href.startswith(("?", "#", "/", "../")) or href.endswith("/"):
+            continue
+        if extensions is None or href.split(".")[-1] in extensions:
+            links[href] = urljoin(url, href)
+    return links
+
+
+def get_remote_checksums(url: str, session: "requests.Session" = None) -> dict:
+    """
+    Function gathering the SHA-256 checksums published along the files of a remote directory
+    The SHA256SUMS.txt file is searched in the directory and then in its parent directories
+    (PhysioNet publishes it at the root of each database version)
+    :param url: URL of the directory (ending with a /)
+    :param session: HTTP session (a new one is created if None)
+    :return: Dictionary URL of the file --> SHA-256 hexadecimal digest (empty if no checksums file is available)
+    """
+    import requests
+
+    session = session or make_session()
+    for base in get_checksums_folders(url):
+        try:
+            r = session.get(base + CHECKSUMS_FILENAME, timeout=DOWNLOAD_TIMEOUT)
+        except requests.RequestException:
+            continue
+        if r.status_code != 200:
+            continue
+        return parse_checksums(r.text, base)
+    return {}
+
+
+def get_checksums_folders(url: str) -> list:
+    """
+    Function returning the URLs of a remote directory and of its parent directories (deepest first)
+    :param url: URL of the directory
+    :return: List of URLs (ending with a /)
+    """
+    parsed = urlparse(url)
+    folders = [k for k in parsed.path.split("/") if k]
+    return [parsed._replace(path="/" + "".join(f"{k}/" for k in folders[:depth]), query="", fragment="").geturl()
+            for depth in range(len(folders), -1, -1)]
+
+
+def parse_checksums(text: str, base: str) -> dict:
+    """
+    Function reading a SHA256SUMS.txt file
+    :param text: Content of the file
+    :param base: URL of the directory of the file
+    :return: Dictionary URL of the file --> SHA-256 hexadecimal digest
+    """
+    checksums = {}
+    for line in text.splitlines():
+        parts = line.strip().split(maxsplit=1)
+        if len(parts) == 2:
+            checksums[urljoin(base, parts[1].lstrip("*"))] = parts[0].lower()
+    return checksums
+
+
+def compute_sha256(path: str, hasher=None) -> str:
+    """
+    Function computing the SHA-256 digest of a local file
+    :param path: Path of the file
+    :param hasher: Existing hashlib object to update (a new one is created if None)
+    :return: Hexadecimal digest
+    """
+    hasher = hasher or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DOWNLOAD_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def download_file(url: str, path: str, sha256: str = None, session: "requests.Session" = None) -> dict:
+    """
+    Function downloading a single file, resuming a previous partial download (.part file) if any
+    :param url: URL of the file
+    :param path: Local path of the downloaded file
+    :param sha256: Expected SHA-256 digest (not verified if None)
+    :param session: HTTP session (a new one is created if None)
+    :return: Dictionary reporting the download (path, downloaded bytes, resumed, verified, SHA-256 digest)
+    """
+    session = session or make_session(1)
+    result = {"url": url, "path": path, "bytes": 0, "resumed": False, "verified": False, "skipped": False,
+              "sha256": None}
+
+    # The file has already been completely downloaded
+    if os.path.isfile(path) and (sha256 is None or compute_sha256(path) == sha256):
+        result.update(skipped=True, verified=sha256 is not None, sha256=sha256)
+        return result
+
+    part_path = path + ".part"
+    for attempt in range(2):
+        hasher = hashlib.sha256()
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            if r.status_code == 416:
+                # Range not satisfiable: the partial file is already complete
+                pass
+            else:
+                r.raise_for_status()
+                if r.status_code == 206:
+                    result["resumed"] = True
+                    compute_sha256(part_path, hasher)
+                    mode = "ab"
+                else:
+                    # The server ignored the Range header: starting over
+                    mode = "wb"
+                with open(part_path, mode) as f:
+                    for block in r.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+                        f.write(block)
+                        hasher.update(block)
+                        result["bytes"] += len(block)
+        if r.status_code == 416:
+            hasher = hashlib.sha256()
+            compute_sha256(part_path, hasher)
+
+        if sha256 is None or hasher.hexdigest() == sha256:
+            os.replace(part_path, path)
+            result.update(verified=sha256 is not None, sha256=hasher.hexdigest())
+            return result
+
+        # Corrupted file: the download is restarted from scratch once
+        os.remove(part_path)
+        result["resumed"] = False
+    raise ValueError(f"Checksum mismatch for {url}")
+
+
+def download_files(links: dict, folder: str, workers: int = DEFAULT_DOWNLOAD_WORKERS, checksums: dict = None,
+                   session: "requests.Session" = None, progress: bool = True, cache=None) -> dict:
+    """
+    Function downloading several files in parallel over pooled HTTP connections
+    :param links: Dictionary filename --> URL
+    :param folder: Local destination folder
+    :param workers: Number of simultaneous downloads
+    :param checksums: Dictionary URL --> expected SHA-256 digest (see get_remote_checksums())
+    :param session: HTTP session (a new one is created if None)
+    :param progress: If set to True, a progress bar is displayed
+    :param cache: DownloadCache serving (and storing) the files (no cache if None)
+    :return: Dictionary filename --> download report (see download_file())
+    """
+    import tqdm
+
+    if workers is None or workers < 1:
+        raise ValueError("The number of workers must be a strictly positive integer.")
+    checksums = checksums or {}
+    session = session or make_session(workers)
+    os.makedirs(folder, exist_ok=True)
+
+    fetch = download_file if cache is None else cache.fetch
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch, url, os.path.join(folder, file), checksums.get(url), session): file
+            for file, url in links.items()
+        }
+        for future in tqdm.tqdm(as_completed(futures), total=len(futures), colour="blue", disable=not progress):
+            results[futures[future]] = future.result()
+    return results
+
+
+# ----------------------------------------------------------------
+#                    ASYNCHRONOUS DOWNLOADS (aiohttp)
+
+
+def make_async_session(pool_size: int = DEFAULT_DOWNLOAD_WORKERS) -> "aiohttp.ClientSession":
+    """
+    Function creating an asynchronous HTTP session whose connections are pooled across the downloads
+    (to be created and closed inside the running event loop)
+    :param pool_size: Maximum number of simultaneous connections
+    :return: aiohttp.ClientSession
+    """
+    import aiohttp
+
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size),
+                                 timeout=aiohttp.ClientTimeout(total=None, sock_connect=DOWNLOAD_TIMEOUT,
+                                                               sock_read=DOWNLOAD_TIMEOUT))
+
+
+async def _async_get(session: "aiohttp.ClientSession", url: str, retries: int = 3, **kwargs):
+    """
+    Function sending a GET request, retried with an exponential backoff on connection errors and
+    server errors (as the Retry policy of make_session())
+    :return: aiohttp.ClientResponse (to be released by the caller)
+    """
+    import aiohttp
+
+    for attempt in range(retries + 1):
+        try:
+            response = await session.get(url, **kwargs)
+            if response.status not in RETRY_STATUSES or attempt == retries:
+                return response
+            response.release()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+        await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+async def async_list_remote_files(url: str, extensions: list = None,
+                                  session: "aiohttp.ClientSession" = None) -> dict:
+    """
+    Function listing the files of a remote directory (asynchronous version of list_remote_files())
+    :param url: URL of the directory (ending with a /)
+    :param extensions: List of the extensions to keep (all files if None)
+    :param session: Asynchronous HTTP session (a new one is created if None, see make_async_session())
+    :return: Dictionary filename --> URL
+    """
+    if session is None:
+        async with make_async_session(1) as session:
+            return await async_list_remote_files(url, extensions, session)
+    response = await _async_get(session, url)
+    async with response:
+        response.raise_for_status()
+        text = await response.text()
+    # The HTML parsing is done off the event loop
+    return await asyncio.to_thread(parse_remote_files, text, url, extensions)
+
+
+async def async_get_remote_checksums(url: str, session: "aiohttp.ClientSession" = None) -> dict:
+    """
+    Function gathering the SHA-256 checksums published along the files of a remote directory
+    (asynchronous version of get_remote_checksums())
+    :param url: URL of the directory (ending with a /)
+    :param session: Asynchronous HTTP session (a new one is created if None, see make_async_session())
+    :return: Dictionary URL of the file --> SHA-256 hexadecimal digest (empty if no checksums file is available)
+    """
+    import aiohttp
+
+    if session is None:
+        async with make_async_session(1) as session:
+            return await async_get_remote_checksums(url, session)
+    for base in get_checksums_folders(url):
+        try:
+            response = await _async_get(session, base + CHECKSUMS_FILENAME)
+        except aiohttp.ClientError:
+            continue
+        async with response:
+            if response.status != 200:
+                continue
+            text = await response.text()
+        return parse_checksums(text, base)
+    return {}
+
+
+async def async_download_file(url: str, path: str, sha256: str = None,
+                              session: "aiohttp.ClientSession" = None) -> dict:
+    """
+    Function downloading a single file, resuming a previous partial download (.part file) if any
+    (asynchronous version of download_file(): the blocks are written and hashed off the event loop)
+    :param url: URL of the file
+    :param path: Local path of the downloaded file
+    :param sha256: Expected SHA-256 digest (not verified if None)
+    :param session: Asynchronous HTTP session (a new one is created if None, see make_async_session())
+    :return: Dictionary reporting the download (path, downloaded bytes, resumed, verified, SHA-256 digest)
+    """
+    if session is None:
+        async with make_async_session(1) as session:
+            return await async_download_file(url, path, sha256, session)
+    result = {"url": url, "path": path, "bytes": 0, "resumed": False, "verified": False, "skipped": False,
+              "sha256": None}
+
+    # The file has already been completely downloaded
+    if os.path.isfile(path) and (sha256 is None or await asyncio.to_thread(compute_sha256, path) == sha256):
+        result.update(skipped=True, verified=sha256 is not None, sha256=sha256)
+        return result
+
+    def write(f, block: bytes, hasher) -> None:
+        f.write(block)
+        hasher.update(block)
+
+    part_path = path + ".part"
+    for attempt in range(2):
+        hasher = hashlib.sha256()
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        response = await _async_get(session, url, headers=headers)
+        async with response:
+            if response.status == 416:
+                # Range not satisfiable: the partial file is already complete
+                await asyncio.to_thread(compute_sha256, part_path, hasher)
+            else:
+                response.raise_for_status()
+                if response.status == 206:
+                    result["resumed"] = True
+                    await asyncio.to_thread(compute_sha256, part_path, hasher)
+                    mode = "ab"
+                else:
+                    # The server ignored the Range header: starting over
+                    mode = "wb"
+                with open(part_path, mode) as f:
+                    async for block in response.content.iter_chunked(DOWNLOAD_BLOCK_SIZE):
+                        await asyncio.to_thread(write, f, block, hasher)
+                        result["bytes"] += len(block)
+
+        if sha256 is None or hasher.hexdigest() == sha256:
+            os.replace(part_path, path)
+            result.update(verified=sha256 is not None, sha256=hasher.hexdigest())
+            return result
+
+        # Corrupted file: the download is restarted from scratch once
+        os.remove(part_path)
+        result["resumed"] = False
+    raise ValueError(f"Checksum mismatch for {url}")
+
+
+async def async_fetch(url: str, path: str, sha256: str = None, session: "aiohttp.ClientSession" = None,
+                      cache=None) -> dict:
+    """
+    Function serving a remote file from a DownloadCache (asynchronous version of DownloadCache.fetch():
+    the index of the cache is only accessed off the event loop)
+    :param url: URL of the file
+    :param path: Local path where the file has to be available
+    :param sha256: Expected SHA-256 digest (not verified if None)
+    :param session: Asynchronous HTTP session used on a cache miss
+    :param cache: DownloadCache (the file is directly downloaded if None)
+    :return: Dictionary reporting the download (see DownloadCache.fetch())
+    """
+    if cache is None:
+        return await async_download_file(url, path, sha256, session)
+    result = await asyncio.to_thread(cache.lookup_report, url, path, sha256)
+    if result is None:
+        # Only one task, thread or process downloads a given URL (see DownloadCache.acquire_url())
+        acquiring = asyncio.ensure_future(asyncio.to_thread(cache.acquire_url, url))
+        try:
+            lock_file = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The lock is released as soon as the thread waiting for it gets it
+            acquiring.add_done_callback(lambda k: k.cancelled() or k.exception() or cache.release_url(k.result()))
+            raise
+        try:
+            result = await asyncio.to_thread(cache.lookup_report, url, path, sha256)
+            if result is None:
+                # Partial downloads are kept (and resumed) inside the cache folder
+                tmp_path = cache.get_tmp_path(url)
+                result = await async_download_file(url, tmp_path, sha256, session)
+                cached_path = await asyncio.to_thread(cache.store, url, tmp_path, result["sha256"])
+                result.update(sha256=os.path.basename(cached_path), cached=False)
+        finally:
+            cache.release_url(lock_file)
+    result["link"] = await asyncio.to_thread(cache.link, cache.get_object_path(result["sha256"]), path)
+    return result
+
+
+async def async_download_files(links: dict, folder: str, workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                               checksums: dict = None, session: "aiohttp.ClientSession" = None, cache=None,
+                               limiter: asyncio.Semaphore = None) -> dict:
+    """
+    Function downloading several files concurrently (asynchronous version of download_files())
+    If a download fails or if the calling task is cancelled, the other downloads are cancelled (their
+    partial files are kept and resumed by the next call)
+    :param links: Dictionary filename --> URL
+    :param folder: Local destination folder
+    :param workers: Number of simultaneous downloads
+    :param checksums: Dictionary URL --> expected SHA-256 digest (see async_get_remote_checksums())
+    :param session: Asynchronous HTTP session (a new one is created if None)
+    :param cache: DownloadCache serving (and storing) the files (no cache if None)
+    :param limiter: Additional semaphore shared by several calls (e.g. process-wide limit of downloads)
+    :return: Dictionary filename --> download report (see download_file())
+    """
+    if workers is None or workers < 1:
+        raise ValueError("The number of workers must be a strictly positive integer.")
+    checksums = checksums or {}
+    os.makedirs(folder, exist_ok=True)
+    if session is None:
+        async with make_async_session(workers) as session:
+            return await async_download_files(links, folder, workers, checksums, session, cache, limiter)
+
+    semaphore = asyncio.Semaphore(workers)
+
+    async def fetch(file: str, url: str) -> dict:
+        async with semaphore:
+            if limiter is None:
+                return await async_fetch(url, os.path.join(folder, file), checksums.get(url), session, cache)
+            async with limiter:
+                return await async_fetch(url, os.path.join(folder, file), checksums.get(url), session, cache)
+
+    tasks = {file: asyncio.ensure_future(fetch(file, url)) for file, url in links.items()}
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return {file: task.result() for file, task in tasks.items()}
@@ -0,0 +1,206 @@
+"""
+Streaming XLSX writer of the records
+
+The workbooks are written part by part into the ZIP package (Office Open XML): the rows of the
+worksheets are formatted block by block with the vectorized text engine (see text.py) and compressed
+on the fly, so that the memory used does not depend on the length of the record.
+A record longer than the row limit of a worksheet spills into the next worksheets ("Sheet1", "Sheet2",
+...) and, if the number of worksheets per workbook is bounded, into the next workbooks. The first column
+("id") holds the index of the sample in the record on every worksheet.
+"""
+from .constants import *
+from .text import format_values, _format_unsigned
+import os
+import zipfile
+import numpy as np
+from xml.sax.saxutils import escape, quoteattr
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NAMESPACE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_RELATIONSHIPS_NAMESPACE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PACKAGE_RELATIONSHIPS_NAMESPACE = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+# Styles of the workbooks: default cells (s="0") and bold header cells (s="1")
+_STYLES = (
+    _XML_HEADER + f'<styleSheet xmlns="{_MAIN_NAMESPACE}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def get_column_letter(index: int) -> str:
+    """
+    Function returning the letters of a column of a worksheet
+    :param index: Index of the column (starting from 0)
+    :return: String ("A", "B", ..., "Z", "AA", ...)
+    """
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord("A") + rest) + letters
+    return letters
+
+
+def get_xlsx_layout(nb_observations: int, rows_per_sheet: int = EXCEL_ROW_LIMIT,
+                    sheets_per_workbook: int = None) -> list:
+    """
+    Function splitting the samples of a record into worksheets and workbooks
+    :param nb_observations: Number of samples
+    :param rows_per_sheet: Maximum number of samples per worksheet
+    :param sheets_per_workbook: Maximum number of worksheets per workbook (unbounded if None)
+    :return: List (1 item per workbook) of lists of (first sample, last sample excluded) tuples (1 per worksheet)
+    """
+    if rows_per_sheet is None or not 0 < rows_per_sheet <= EXCEL_ROW_LIMIT:
+        raise ValueError(f"The number of rows per sheet must be between 1 and {EXCEL_ROW_LIMIT}.")
+    if sheets_per_workbook is not None and sheets_per_workbook <= 0:
+        raise ValueError("The number of sheets per workbook must be a strictly positive integer.")
+    sheets = [(k, min(k + rows_per_sheet, nb_observations)) for k in range(0, nb_observations, rows_per_sheet)]
+    sheets = sheets or [(0, 0)]
+    size = sheets_per_workbook or len(sheets)
+    return [sheets[k: k + size] for k in range(0, len(sheets), size)]
+
+
+def get_xlsx_filenames(filename: str, nb_workbooks: int) -> list:
+    """
+    Function returning the filenames of the workbooks of a record
+    :param filename: Filename of the first workbook (e.g. out.xlsx)
+    :param nb_workbooks: Number of workbooks
+    :return: List of filenames (out.xlsx, out_2.xlsx, out_3.xlsx, ...)
+    """
+    root, extension = os.path.splitext(filename)
+    return [filename] + [f"{root}_{k}{extension}" for k in range(2, nb_workbooks + 1)]
+
+
+def _constant(text: str, nb_rows: int) -> np.ndarray:
+    """
+    Function repeating a string on every row of a byte matrix
+    """
+    text = text.encode("utf-8")
+    return np.broadcast_to(np.frombuffer(text, dtype=np.uint8), (nb_rows, len(text)))
+
+
+def _choose(mask: np.ndarray, a: str, b: str) -> np.ndarray:
+    """
+    Function writing a string or another on every row of a byte matrix (NUL-padded)
+    """
+    width = max(len(a), len(b))
+    return np.where(mask[:, None], np.frombuffer(a.encode().ljust(width, b"\x00"), dtype=np.uint8),
+                    np.frombuffer(b.encode().ljust(width, b"\x00"), dtype=np.uint8))
+
+
+def format_xlsx_rows(offset: int, block: np.ndarray, row: int, precision: int = None) -> bytes:
+    """
+    Function writing a block of samples as rows of a worksheet (sheetData element)
+    The missing values are written as empty cells and the infinite values as "inf" and "-inf" strings
+    :param offset: Index of the first sample of the block (first column)
+    :param block: Numpy ndarray of shape (samples, signals)
+    :param row: Number of the first row of the block in the worksheet (starting from 1)
+    :param precision: Number of decimals of the floating-point values (shortest representation if None)
+    :return: Encoded rows
+    """
+    block = np.asarray(block)
+    nb_rows = len(block)
+    rows = _format_unsigned(np.arange(row, row + nb_rows, dtype=np.uint64))
+    parts = [_constant('<row r="', nb_rows), rows, _constant('">', nb_rows)]
+    columns = [np.arange(offset, offset + nb_rows, dtype=np.int64)] + [block[:, j] for j in range(block.shape[1])]
+    for j, values in enumerate(columns):
+        chars = format_values(values, precision)
+        strings = np.isinf(values) if values.dtype.kind == "f" else np.zeros(nb_rows, dtype=bool)
+        cell = np.concatenate([
+            _constant(f'<c r="{get_column_letter(j)}', nb_rows), rows,
+            _choose(strings, '" t="inlineStr"><is><t>', '"><v>'), chars, _choose(strings, "</t></is></c>", "</v></c>")
+        ], axis=1)
+        if values.dtype.kind == "f":
+            # Missing values: the cell is not written
+            cell[np.isnan(values)] = 0
+        parts.append(cell)
+    parts.append(_constant("</row>", nb_rows))
+    lines = np.concatenate(parts, axis=1)
+    return lines[lines != 0].tobytes()
+
+
+def _write_package(archive: zipfile.ZipFile, sheet_names: list) -> None:
+    """
+    Function writing the parts of a workbook other than the worksheets
+    """
+    overrides = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{k + 1}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for k in range(len(sheet_names)))
+    archive.writestr("[Content_Types].xml", (
+        _XML_HEADER + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        f'{overrides}</Types>'))
+    archive.writestr("_rels/.rels", (
+        _XML_HEADER + f'<Relationships xmlns="{_PACKAGE_RELATIONSHIPS_NAMESPACE}">'
+        f'<Relationship Id="rId1" Type="{_RELATIONSHIPS_NAMESPACE}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'))
+    sheets = "".join(f'<sheet name={quoteattr(name)} sheetId="{k + 1}" r:id="rId{k + 1}"/>'
+                     for k, name in enumerate(sheet_names))
+    archive.writestr("xl/workbook.xml", (
+        _XML_HEADER + f'<workbook xmlns="{_MAIN_NAMESPACE}" xmlns:r="{_RELATIONSHIPS_NAMESPACE}">'
+        f'<sheets>{sheets}</sheets></workbook>'))
+    relationships = "".join(
+        f'<Relationship Id="rId{k + 1}" Type="{_RELATIONSHIPS_NAMESPACE}/worksheet" Target="worksheets/sheet{k + 1}.xml"/>'
+        for k in range(len(sheet_names)))
+    archive.writestr("xl/_rels/workbook.xml.rels", (
+        _XML_HEADER + f'<Relationships xmlns="{_PACKAGE_RELATIONSHIPS_NAMESPACE}">{relationships}'
+        f'<Relationship Id="rId{len(sheet_names) + 1}" Type="{_RELATIONSHIPS_NAMESPACE}/styles" Target="styles.xml"/>'
+        '</Relationships>'))
+    archive.writestr("xl/styles.xml", _STYLES)
+
+
+def write_xlsx(filename: str, read_chunks, columns: list, nb_observations: int, index_label: str = "id",
+               rows_per_sheet: int = EXCEL_ROW_LIMIT, sheets_per_workbook: int = None, precision: int = None,
+               compresslevel: int = EXCEL_COMPRESS_LEVEL) -> list:
+    """
+    Function writing a record to 1 or several XLSX workbooks block by block
+    :param filename: Filename of the first workbook
+    :param read_chunks: Callable (start, stop) returning the generator of (index of the first sample,
+    block of samples) tuples of the samples between start (included) and stop (excluded)
+    :param columns: Names of the signals
+    :param nb_observations: Number of samples
+    :param index_label: Header of the first column (index of the samples)
+    :param rows_per_sheet: Maximum number of samples per worksheet (besides the header row)
+    :param sheets_per_workbook: Maximum number of worksheets per workbook (unbounded if None)
+    :param precision: Number of decimals of the floating-point values (shortest representation if None)
+    :param compresslevel: Deflate compression level of the parts (0 to 9)
+    :return: List of the written filenames (see get_xlsx_filenames())
+    """
+    layout = get_xlsx_layout(nb_observations, rows_per_sheet, sheets_per_workbook)
+    filenames = get_xlsx_filenames(filename, len(layout))
+    header = "".join(f'<c r="{get_column_letter(j)}1" s="1" t="inlineStr"><is><t>{escape(str(name))}</t></is></c>'
+                     for j, name in enumerate([index_label] + list(columns)))
+    number = 0
+    for workbook, sheets in zip(filenames, layout):
+        with zipfile.ZipFile(workbook, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=compresslevel) as archive:
+            names = []
+            for start, stop in sheets:
+                number += 1
+                names.append(f"Sheet{number}")
+                with archive.open(f"xl/worksheets/sheet{len(names)}.xml", "w", force_zip64=True) as f:
+                    # Header row frozen at the top of the worksheet
+                    f.write((
+                        _XML_HEADER + f'<worksheet xmlns="{_MAIN_NAMESPACE}"><sheetViews><sheetView workbookViewId="0">'
+                        '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView>'
+                        f'</sheetViews><sheetData><row r="1">{header}</row>').encode("utf-8"))
+                    if stop > start:
+                        for offset, block in read_chunks(start, stop):
+                            f.write(format_xlsx_rows(offset, block, offset - start + 2, precision))
+                    f.write(b"</sheetData></worksheet>")
+            _write_package(archive, names)
+    return filenames
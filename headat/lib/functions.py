@@ -14,16 +14,30 @@ def get_current_datetime() -> str:
     return datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S+%f")
 
 
+def is_url(value: str) -> bool:
+    """
+    Function returning whether a string is a URL (validators is only imported for strings looking like a URL)
+    :param value: String
+    :return: Boolean
+    """
+    if "://" not in value:
+        return False
+    import validators
+
+    return bool(validators.url(value))
+
+
 def make_view_directory(out_folder: str = EXPORT_FOLDERS) -> str:
     """
     Function creating a dedicated directory for an HDView inside the out/ folder
+    (the out/ folder is created by the first view, not when the library is imported)
     :param out_folder: If not default, specified parent folder
     :return: String of the folder pathname; Exception if error has occured
     """
     path_filename = f"{out_folder}/view_{get_current_datetime()}/"
     if not os.path.isdir(path_filename) or not os.path.exists(path_filename):
         try:
-            os.mkdir(path_filename)
+            os.makedirs(path_filename)
             return path_filename
         except Exception as e:
             raise Exception("An error has occured during the folder creation process.\nError details: {e}")
@@ -45,3 +59,30 @@ def get_export_extensions() -> list:
     :return: list with specific types' extensions
     """
     return [formats[k]["extension"] for k in formats]
+
+
+def get_streaming_export_types() -> list:
+    """
+    Function returning the array of the export types supporting
+    the streaming (chunked) conversion
+    :return: list with specific types
+    """
+    return [k for k in formats if formats[k].get("streaming", False)]
+
+
+def get_chunked_export_types() -> list:
+    """
+    Function returning the array of the export types whose exporter accepts
+    a chunk_size argument (written block by block by export() and the batch conversion)
+    :return: list with specific types
+    """
+    return [k for k in formats if formats[k].get("chunked", False)]
+
+
+def get_parallel_export_types() -> list:
+    """
+    Function returning the array of the export types whose writers are I/O- or
+    compression-bound (and can run concurrently on threads)
+    :return: list with specific types
+    """
+    return [k for k in formats if formats[k].get("parallel", False)]
\ No newline at end of file
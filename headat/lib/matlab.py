@@ -0,0 +1,184 @@
+"""
+MATLAB (.mat) writer of the records
+
+The signals are written as a struct of per-signal vectors (HEADAT) and the record information
+as a second struct (HEADAT_info), directly from the NumPy arrays (no conversion to Python objects):
+    - MAT v5 (scipy.io.savemat) while the samples fit in the 2 GB limit of the format
+    - MAT v7.3 (HDF5 file with a 512-byte MATLAB header, written with h5py) for larger records:
+    every vector is a chunked HDF5 dataset filled block by block, so the record is never fully in memory
+"""
+from .constants import *
+import datetime
+import os
+import re
+import time
+import numpy as np
+
+# MATLAB classes of the NumPy dtypes (MAT v7.3 "MATLAB_class" attribute)
+MATLAB_CLASSES = {
+    "float64": "double", "float32": "single",
+    "int8": "int8", "int16": "int16", "int32": "int32", "int64": "int64",
+    "uint8": "uint8", "uint16": "uint16", "uint32": "uint32", "uint64": "uint64",
+    "bool": "logical"
+}
+
+
+def get_matlab_names(columns: list) -> list:
+    """
+    Function converting the names of the signals into unique and valid MATLAB field names
+    (letters, digits and underscores, starting with a letter, at most 63 characters)
+    :param columns: Names of the signals
+    :return: List of field names
+    """
+    names = []
+    for column in columns:
+        name = re.sub(r"\W", "_", str(column), flags=re.ASCII)
+        if not re.match(r"[A-Za-z]", name):
+            name = "sig_" + name
+        name, base, k = name[:63], name[:60], 1
+        while name in names:
+            name, k = f"{base}_{k}", k + 1
+        names.append(name)
+    return names
+
+
+def get_matlab_info(infos: dict) -> dict:
+    """
+    Function converting the record information into the fields of the HEADAT_info struct
+    (lists of strings become char matrices, dates and times ISO strings, missing values are skipped)
+    :param infos: Record information dictionary (see HDView.get_info())
+    :return: Dictionary field --> NumPy array or string
+    """
+    info = {}
+    for key, value in infos.items():
+        if value is None or (isinstance(value, (list, tuple)) and len(value) == 0):
+            continue
+        if isinstance(value, (datetime.date, datetime.time)):
+            info[key] = value.isoformat()
+        elif isinstance(value, str):
+            info[key] = value
+        elif isinstance(value, (list, tuple)) and all(isinstance(k, str) for k in value):
+            info[key] = np.array([str(k) for k in value])
+        else:
+            info[key] = np.asarray(value)
+    return info
+
+
+def exceeds_mat_v5(nb_observations: int, nb_signals: int, dtype) -> bool:
+    """
+    Function returning whether the samples of a record exceed the size limit of the MAT v5 format
+    :param nb_observations: Number of samples
+    :param nb_signals: Number of signals
+    :param dtype: dtype of the samples
+    :return: Boolean
+    """
+    return nb_observations * nb_signals * np.dtype(dtype).itemsize > MATLAB_V5_MAX_BYTES
+
+
+def write_mat_v5(filename: str, signals: np.ndarray, columns: list, infos: dict = None,
+                 compression: bool = False) -> None:
+    """
+    Function writing a record to a MAT v5 file
+    :param filename: Path of the .mat file
+    :param signals: Numpy ndarray of shape (samples, signals)
+    :param columns: Names of the signals
+    :param infos: Record information dictionary (HEADAT_info struct)
+    :param compression: If set to True, the variables are compressed
+    """
+    import scipy.io
+
+    mdict = {"HEADAT": {name: signals[:, k] for k, name in enumerate(get_matlab_names(columns))}}
+    if infos:
+        mdict["HEADAT_info"] = get_matlab_info(infos)
+    scipy.io.savemat(filename, mdict, do_compression=compression)
+
+
+def _write_mat_v73_header(filename: str) -> None:
+    """
+    Function writing the 128-byte MATLAB header in the user block of a MAT v7.3 file
+    """
+    text = f"MATLAB 7.3 MAT-file, Platform: {os.name}, Created on: {time.asctime()} HDF5 schema 1.00 ."
+    header = text.encode("ascii").ljust(116, b" ") + b"\x00" * 8 + b"\x00\x02" + b"IM"
+    with open(filename, "r+b") as f:
+        f.write(header)
+
+
+def _set_matlab_class(node, matlab_class: str) -> None:
+    node.attrs.create("MATLAB_class", np.bytes_(matlab_class))
+
+
+def _set_matlab_fields(group, names: list) -> None:
+    """
+    Function declaring the (ordered) fields of a MAT v7.3 struct
+    """
+    import h5py
+
+    vlen = h5py.vlen_dtype(np.dtype("S1"))
+    fields = np.empty(len(names), dtype=object)
+    for k, name in enumerate(names):
+        fields[k] = np.array(list(name), dtype="S1")
+    group.attrs.create("MATLAB_fields", fields, dtype=vlen)
+
+
+def _write_mat_v73_value(group, name: str, value) -> None:
+    """
+    Function writing a string, a char matrix or a numeric array in a MAT v7.3 struct
+    (the dimensions are reversed: MATLAB arrays are stored in column-major order)
+    """
+    value = np.asarray(value)
+    if value.dtype.kind in ["U", "S"]:
+        rows = np.atleast_1d(value).astype(str)
+        width = max([len(k) for k in rows] + [1])
+        chars = np.array([[ord(c) for c in k.ljust(width)] for k in rows], dtype=np.uint16)
+        dataset = group.create_dataset(name, data=chars.T)
+        _set_matlab_class(dataset, "char")
+        dataset.attrs.create("MATLAB_int_decode", np.int32(2))
+        return
+    if value.dtype.name not in MATLAB_CLASSES:
+        value = value.astype(np.float64)
+    dataset = group.create_dataset(name, data=np.atleast_2d(value).T)
+    _set_matlab_class(dataset, MATLAB_CLASSES[value.dtype.name])
+
+
+def write_mat_v73(filename: str, chunks, nb_observations: int, columns: list, dtype, infos: dict = None,
+                  compression: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """
+    Function writing a record to a MAT v7.3 (HDF5-based) file block by block
+    :param filename: Path of the .mat file
+    :param chunks: Iterable of (index of the first sample, block of samples) tuples covering the record
+    :param nb_observations: Number of samples
+    :param columns: Names of the signals
+    :param dtype: dtype of the samples
+    :param infos: Record information dictionary (HEADAT_info struct)
+    :param compression: If set to True, the vectors are compressed (gzip, as MATLAB does)
+    :param chunk_size: Number of samples per HDF5 chunk
+    """
+    import h5py
+
+    dtype = np.dtype(dtype)
+    if dtype.name not in MATLAB_CLASSES:
+        dtype = np.dtype(np.float64)
+    names = get_matlab_names(columns)
+    with h5py.File(filename, "w", userblock_size=512) as f:
+        group = f.create_group("HEADAT")
+        _set_matlab_class(group, "struct")
+        _set_matlab_fields(group, names)
+        # Row vectors (1 x samples in MATLAB), as written by write_mat_v5()
+        datasets = [group.create_dataset(name, shape=(nb_observations, 1), dtype=dtype,
+                                         chunks=(max(1, min(chunk_size, nb_observations)), 1),
+                                         compression="gzip" if compression else None)
+                    for name in names]
+        for dataset in datasets:
+            _set_matlab_class(dataset, MATLAB_CLASSES[dtype.name])
+        for offset, block in chunks:
+            for k, dataset in enumerate(datasets):
+                dataset[offset: offset + len(block), 0] = block[:, k]
+
+        if infos:
+            info = get_matlab_info(infos)
+            group = f.create_group("HEADAT_info")
+            _set_matlab_class(group, "struct")
+            _set_matlab_fields(group, list(info))
+            for key, value in info.items():
+                _write_mat_v73_value(group, key, value)
+    _write_mat_v73_header(filename)
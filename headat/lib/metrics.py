@@ -0,0 +1,349 @@
+"""
+Per-phase instrumentation of the views (wall time, bytes read and written, peak memory)
+
+Every measured phase (download, header parse, sample decode, frame build, each export) is
+recorded as a dictionary in the Metrics object of its view and passed to the registered hooks,
+which can forward it to any metrics system:
+    add_metrics_hook(lambda phase: statsd.timing(phase["name"], phase["wall_time"]))
+"""
+import contextlib
+import datetime
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import pandas as pd
+from .excel import get_xlsx_layout, get_xlsx_filenames
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: the process high-water mark is not reported
+    resource = None
+
+# Hooks called with every measured phase of every view (see add_metrics_hook())
+METRICS_HOOKS = []
+
+# Memory tracing state shared by the phases measured concurrently (tracemalloc is process-wide)
+_MEMORY_LOCK = threading.Lock()
+_MEMORY_STATES = []
+_MEMORY_TRACING_OWNED = False
+
+
+def add_metrics_hook(callback) -> None:
+    """
+    Function registering a hook called with every phase measured by any view
+    :param callback: Callable taking the phase dictionary (see Metrics.phase())
+    """
+    if callback not in METRICS_HOOKS:
+        METRICS_HOOKS.append(callback)
+
+
+def remove_metrics_hook(callback) -> None:
+    """
+    Function unregistering a hook registered by add_metrics_hook()
+    :param callback: Registered callable
+    """
+    if callback in METRICS_HOOKS:
+        METRICS_HOOKS.remove(callback)
+
+
+def get_max_rss():
+    """
+    Function returning the high-water mark of the resident memory of the process
+    :return: Number of bytes (None if not available on the platform)
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _update_memory_peaks() -> None:
+    """
+    Function propagating the traced memory peak to the phases being measured (before it is reset)
+    """
+    peak = tracemalloc.get_traced_memory()[1]
+    for state in _MEMORY_STATES:
+        state["peak"] = max(state["peak"], peak)
+
+
+def _start_memory_trace() -> dict:
+    """
+    Function starting the memory measure of a phase
+    :return: Dictionary {base, peak} of the traced memory
+    """
+    global _MEMORY_TRACING_OWNED
+    with _MEMORY_LOCK:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _MEMORY_TRACING_OWNED = True
+        _update_memory_peaks()
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        state = {"base": current, "peak": current}
+        _MEMORY_STATES.append(state)
+    return state
+
+
+def _stop_memory_trace(state: dict) -> int:
+    """
+    Function stopping the memory measure of a phase
+    :param state: Dictionary returned by _start_memory_trace()
+    :return: Peak of memory allocated during the phase (in bytes)
+    """
+    global _MEMORY_TRACING_OWNED
+    with _MEMORY_LOCK:
+        _update_memory_peaks()
+        _MEMORY_STATES.remove(state)
+        if not _MEMORY_STATES and _MEMORY_TRACING_OWNED:
+            tracemalloc.stop()
+            _MEMORY_TRACING_OWNED = False
+    return state["peak"] - state["base"]
+
+
+class Metrics:
+    """
+    Collection of the phases measured for a view
+    """
+
+    def __init__(self, trace_memory: bool = False, hooks: list = None, context: dict = None) -> None:
+        """
+        Constructor function initializing an empty collection of phases
+        :param trace_memory: If set to True, the peak of memory allocated by every phase is measured with
+        tracemalloc (which slows down the allocations while a phase is running)
+        :param hooks: List of callables called with every phase of this collection (in addition to METRICS_HOOKS)
+        :param context: Dictionary of fields added to every phase (record and view)
+        """
+        self.trace_memory = trace_memory
+        self.hooks = list(hooks or [])
+        self.context = dict(context or {})
+        self.phases = []
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Metrics(phases={len(self.phases)}, trace_memory={self.trace_memory})"
+
+    def derive(self, **context):
+        """
+        Function returning an empty collection sharing the settings and hooks of this one (see HDView.derive_view())
+        :param context: Fields of the context to override
+        :return: Metrics
+        """
+        return Metrics(self.trace_memory, self.hooks, {**self.context, **context})
+
+    def add_hook(self, callback) -> None:
+        """
+        Function registering a hook called with every phase of this collection
+        :param callback: Callable taking the phase dictionary
+        """
+        if callback not in self.hooks:
+            self.hooks.append(callback)
+
+    def remove_hook(self, callback) -> None:
+        """
+        Function unregistering a hook registered by add_hook()
+        :param callback: Registered callable
+        """
+        if callback in self.hooks:
+            self.hooks.remove(callback)
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **details):
+        """
+        Context manager measuring a phase
+        The yielded dictionary can be completed by the measured code (bytes_read, bytes_written, success, details):
+            with metrics.phase("decode") as phase:
+                ...
+                phase["bytes_read"] += size
+        :param name: Name of the phase ("download", "header", "decode", "frame", "export:<format>")
+        :param details: Additional information stored in the details field of the phase
+        :return: Dictionary containing:
+            - name, record, view: phase, record and view measured
+            - started_at: date and time of the beginning of the phase (ISO 8601)
+            - wall_time: duration of the phase (in seconds)
+            - cpu_time: CPU time of the calling thread during the phase (in seconds)
+            - bytes_read, bytes_written: number of bytes read and written by the phase (bytes_written is None
+            if the written size cannot be measured, e.g. an export to a remote database)
+            - peak_memory: peak of memory allocated during the phase (in bytes, None if trace_memory is False)
+            - max_rss: high-water mark of the resident memory of the process at the end of the phase (in bytes)
+            - success: whether the phase succeeded
+            - error: error message (None if no exception has been raised)
+            - details: dictionary of additional information
+        """
+        record = {
+            "name": name,
+            "record": self.context.get("record"),
+            "view": self.context.get("view"),
+            "started_at": datetime.datetime.now().isoformat(),
+            "wall_time": None,
+            "cpu_time": None,
+            "bytes_read": 0,
+            "bytes_written": 0,
+            "peak_memory": None,
+            "max_rss": None,
+            "success": True,
+            "error": None,
+            "details": details
+        }
+        memory = _start_memory_trace() if self.trace_memory else None
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        except BaseException as e:
+            record.update(success=False, error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            record["wall_time"] = time.perf_counter() - start
+            record["cpu_time"] = time.thread_time() - cpu_start
+            if memory is not None:
+                record["peak_memory"] = _stop_memory_trace(memory)
+            record["max_rss"] = get_max_rss()
+            self.add(record)
+
+    def add(self, record: dict) -> None:
+        """
+        Function adding a measured phase to the collection and passing it to the hooks
+        (a failing hook does not interrupt the measured operation)
+        :param record: Phase dictionary (see phase())
+        """
+        with self.lock:
+            self.phases.append(record)
+        for hook in self.hooks + METRICS_HOOKS:
+            try:
+                hook(record)
+            except Exception as e:
+                print(f"The metrics hook {hook} has failed: {type(e).__name__}: {e}")
+
+    def get_phases(self, name: str = None) -> list:
+        """
+        Function returning the measured phases
+        :param name: If specified, only the phases of this name are returned ("export:" for every export)
+        :return: List of phase dictionaries (in order of completion)
+        """
+        with self.lock:
+            phases = list(self.phases)
+        if name is None:
+            return phases
+        return [k for k in phases if k["name"] == name or (name.endswith(":") and k["name"].startswith(name))]
+
+    def get_last(self, name: str):
+        """
+        Function returning the last measured phase of a name
+        :param name: Name of the phase
+        :return: Phase dictionary (None if the phase has not been measured)
+        """
+        phases = self.get_phases(name)
+        return phases[-1] if phases else None
+
+    def summary(self) -> dict:
+        """
+        Function aggregating the phases by name
+        :return: Dictionary name --> {count, wall_time, cpu_time, bytes_read, bytes_written, peak_memory, errors}
+        (total durations and bytes, maximum peak of memory)
+        """
+        summary = {}
+        for k in self.get_phases():
+            entry = summary.setdefault(k["name"], {"count": 0, "wall_time": 0.0, "cpu_time": 0.0, "bytes_read": 0,
+                                                   "bytes_written": 0, "peak_memory": None, "errors": 0})
+            entry["count"] += 1
+            entry["wall_time"] += k["wall_time"]
+            entry["cpu_time"] += k["cpu_time"]
+            entry["bytes_read"] += k["bytes_read"]
+            entry["bytes_written"] += k["bytes_written"] or 0
+            if k["peak_memory"] is not None:
+                entry["peak_memory"] = max(entry["peak_memory"] or 0, k["peak_memory"])
+            entry["errors"] += not k["success"]
+        return summary
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Function returning the measured phases as a Pandas DataFrame (1 row per phase)
+        :return: Pandas DataFrame
+        """
+        return pd.DataFrame(self.get_phases(), columns=["name", "record", "view", "started_at", "wall_time",
+                                                        "cpu_time", "bytes_read", "bytes_written", "peak_memory",
+                                                        "max_rss", "success", "error", "details"])
+
+    def clear(self) -> None:
+        """
+        Function removing the measured phases
+        """
+        with self.lock:
+            self.phases = []
+
+
+@contextlib.contextmanager
+def measure_phase(metrics, name: str, **details):
+    """
+    Context manager measuring a phase in a Metrics collection (nothing is recorded if metrics is None)
+    :param metrics: Metrics or None
+    :param name: Name of the phase
+    :param details: Additional information of the phase
+    :return: Phase dictionary (see Metrics.phase())
+    """
+    if metrics is None:
+        yield {"bytes_read": 0, "bytes_written": 0, "success": True, "details": details}
+        return
+    with metrics.phase(name, **details) as record:
+        yield record
+
+
+def get_export_files(view, format: str, arguments: dict) -> list:
+    """
+    Function returning the files written by an exporter of HDView
+    :param view: HDView
+    :param format: Format type (see get_export_types())
+    :param arguments: Arguments of the exporter, default values included (see inspect.BoundArguments)
+    :return: List of filenames or None if the exporter does not write local files (e.g. SQL database URL)
+    """
+    filename = view.get_export_filename(format) + str(arguments.get("extension", ""))
+    if format == "sql" and arguments.get("url") is not None:
+        return None
+    if format == "xlsx" and arguments.get("engine") == "numpy" and not arguments.get("kwargs"):
+        # The streaming writer spills the long records into several workbooks
+        layout = get_xlsx_layout(view.nb_observations, arguments["rows_per_sheet"], arguments["sheets_per_workbook"])
+        return get_xlsx_filenames(filename, len(layout))
+    return [filename]
+
+
+def measure_export(format: str):
+    """
+    Decorator measuring an exporter of HDView as an "export:<format>" phase of its view
+    The phase fails if the exporter returns False and its written bytes are the total size of the exported files
+    (None if they cannot be measured, see get_export_files())
+    :param format: Format type (see get_export_types())
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            arguments = signature.bind(self, *args, **kwargs)
+            arguments.apply_defaults()
+            arguments = arguments.arguments
+            details = {"format": format}
+            if arguments.get("chunk_size") is not None:
+                details["chunk_size"] = arguments["chunk_size"]
+            with measure_phase(getattr(self, "metrics", None), f"export:{format}", **details) as phase:
+                success = method(self, *args, **kwargs)
+                phase["success"] = bool(success)
+                phase["details"]["filename"] = self.get_export_filename(format) + str(arguments.get("extension", ""))
+                try:
+                    files = get_export_files(self, format, arguments)
+                except ValueError:
+                    # Invalid layout of the workbooks: the exporter has failed as well
+                    files = None
+                if files is not None and len(files) > 1:
+                    phase["details"]["filenames"] = files
+                if success and files is not None and all(os.path.isfile(k) for k in files):
+                    phase["bytes_written"] = sum(os.path.getsize(k) for k in files)
+                else:
+                    phase["bytes_written"] = None if success else 0
+            return success
+        return wrapper
+    return decorator
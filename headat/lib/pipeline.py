@@ -0,0 +1,494 @@
+"""
+Streaming processing stages applied to the signals before their conversion
+
+A Pipeline chains stages processing the record block by block. The stages carry their
+state from one block to the next, so the output is the same as the one of the
+corresponding SciPy function applied to the whole record while only one block of
+samples is held in memory at a time:
+    - SOSFilter: scipy.signal.sosfilt (IIR filtering in second-order sections)
+    - Resample: scipy.signal.resample_poly (polyphase resampling)
+    - Detrend: scipy.signal.detrend (the trend is fitted during a first pass over the record)
+    - SelectChannels: selection of signals
+"""
+from .constants import *
+from .signals import SignalSource, iter_signal_chunks
+import copy
+import threading
+from fractions import Fraction
+import numpy as np
+
+
+class Stage:
+    """
+    Base class of the pipeline stages
+    Sub-classes implement process() and, if needed, configure(), reset(), flush(), output_length()
+    and the fitting methods (stages whose needs_fit attribute is True are fitted on a first pass, until their
+    fitted attribute is set: the base reset() clears it, stages keeping their fit across runs override reset())
+    """
+    needs_fit = False
+    fitted = False
+
+    def configure(self, fs: float, columns: list, dtype) -> tuple:
+        """
+        Function preparing the stage for a given input
+        :param fs: Sampling frequency of the input
+        :param columns: Names of the input signals
+        :param dtype: dtype of the input samples
+        :return: Tuple (sampling frequency, names of the signals, dtype) of the output
+        """
+        return fs, columns, np.dtype(dtype)
+
+    def output_length(self, nb_observations: int) -> int:
+        """
+        Function returning the number of output samples for a given number of input samples
+        """
+        return nb_observations
+
+    def reset(self) -> None:
+        """
+        Function resetting the state carried between the blocks (beginning of the record)
+        """
+        self.fitted = False
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Function processing the next block of samples
+        :param block: Numpy ndarray of shape (samples, signals)
+        :return: Numpy ndarray of the output samples available so far
+        """
+        raise NotImplementedError
+
+    def flush(self) -> np.ndarray:
+        """
+        Function returning the output samples held back by the stage (end of the record)
+        :return: Numpy ndarray (None if no sample is held back)
+        """
+        return None
+
+    def fit(self, block: np.ndarray) -> None:
+        """
+        Function updating the fitted parameters with the next block of samples (first pass)
+        """
+
+    def finish_fit(self) -> None:
+        """
+        Function computing the fitted parameters at the end of the first pass
+        """
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}()"
+
+
+class SOSFilter(Stage):
+    """
+    IIR filter in second-order sections whose state is carried from one block to the next
+    (same output as scipy.signal.sosfilt applied to the whole record)
+    """
+
+    def __init__(self, sos: np.ndarray = None, order: int = 4, cutoff=None, btype: str = "bandpass",
+                 ftype: str = "butter") -> None:
+        """
+        Constructor function initializing the filter, given either by its second-order sections
+        or by a design (scipy.signal.iirfilter) made with the sampling frequency of the record
+        :param sos: Second-order sections of the filter (array of shape (sections, 6))
+        :param order: Order of the designed filter
+        :param cutoff: Cutoff frequency (or pair of frequencies for band filters) in Hz
+        :param btype: Type of the designed filter: "lowpass", "highpass", "bandpass" or "bandstop"
+        :param ftype: Type of the designed IIR filter: "butter", "cheby1", "cheby2", "ellip" or "bessel"
+        """
+        if sos is None and cutoff is None:
+            raise ValueError("Either the second-order sections or the cutoff frequency of the filter are required.")
+        self.sos = None if sos is None else np.atleast_2d(np.asarray(sos, dtype=np.float64))
+        self.order = order
+        self.cutoff = cutoff
+        self.btype = btype
+        self.ftype = ftype
+        self.filter_sos = self.sos
+        self.zi = None
+
+    def configure(self, fs: float, columns: list, dtype) -> tuple:
+        # SciPy is only imported when a pipeline is configured (see lazy backends in main.py)
+        import scipy.signal
+
+        if self.sos is None:
+            self.filter_sos = scipy.signal.iirfilter(self.order, self.cutoff, btype=self.btype, ftype=self.ftype,
+                                                     fs=fs, output="sos")
+        return fs, columns, np.result_type(self.filter_sos, np.dtype(dtype))
+
+    def reset(self) -> None:
+        self.zi = None
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        import scipy.signal
+
+        if self.zi is None:
+            self.zi = np.zeros((self.filter_sos.shape[0], 2, block.shape[1]))
+        output, self.zi = scipy.signal.sosfilt(self.filter_sos, block, axis=0, zi=self.zi)
+        return output
+
+    def __repr__(self) -> str:
+        if self.sos is not None:
+            return f"SOSFilter(sections={len(self.sos)})"
+        return f"SOSFilter(order={self.order}, cutoff={self.cutoff}, btype={self.btype}, ftype={self.ftype})"
+
+
+class Resample(Stage):
+    """
+    Polyphase resampling by a rational factor up / down
+    (same output as scipy.signal.resample_poly applied to the whole record)
+    The input samples still needed by the next outputs are carried from one block to the next
+    """
+
+    def __init__(self, up: int = None, down: int = None, fs: float = None) -> None:
+        """
+        Constructor function initializing the resampling factor, given either as up / down or by the
+        output sampling frequency
+        :param up: Upsampling factor
+        :param down: Downsampling factor
+        :param fs: Sampling frequency of the output (in Hz)
+        """
+        if fs is None and (up is None or down is None):
+            raise ValueError("Either the output sampling frequency or the up and down factors are required.")
+        self.up = up
+        self.down = down
+        self.fs = fs
+        self.factor = None
+        self.h = None
+        self.dtype = None
+        self.nb_removed = 0
+        self.buffer = None
+        self.buffer_start = 0
+        self.received = 0
+        self.emitted = 0
+
+    def configure(self, fs: float, columns: list, dtype) -> tuple:
+        import scipy.signal
+
+        if self.fs is not None:
+            ratio = Fraction(self.fs).limit_denominator(1000) / Fraction(fs).limit_denominator(1000)
+        else:
+            ratio = Fraction(int(self.up), int(self.down))
+        self.factor = (ratio.numerator, ratio.denominator)
+        up, down = self.factor
+        dtype = np.dtype(dtype) if np.dtype(dtype).kind in ["f", "c"] else np.dtype(np.float64)
+        self.dtype = dtype
+
+        if up == down == 1:
+            return fs, columns, dtype
+
+        # Anti-aliasing filter of scipy.signal.resample_poly (zero-padded to center the outputs)
+        max_rate = max(up, down)
+        half_len = 10 * max_rate
+        h = scipy.signal.firwin(2 * half_len + 1, 1. / max_rate, window=("kaiser", 5.0)).astype(dtype) * up
+        nb_padded = down - half_len % down
+        self.h = np.concatenate([np.zeros(nb_padded, dtype=h.dtype), h])
+        self.nb_removed = (half_len + nb_padded) // down
+        return fs * up / down, columns, dtype
+
+    def output_length(self, nb_observations: int) -> int:
+        up, down = self.factor
+        return -(-nb_observations * up // down)
+
+    def reset(self) -> None:
+        self.buffer = None
+        self.buffer_start = 0
+        self.received = 0
+        self.emitted = 0
+
+    def _emit(self, stop: int) -> np.ndarray:
+        """
+        Function computing the outputs up to the output sample stop (excluded) from the buffered inputs
+        """
+        import scipy.signal
+
+        up, down = self.factor
+        start = self.emitted
+        if stop <= start:
+            return np.empty((0, self.buffer.shape[1]), dtype=self.dtype)
+        # The buffer starts on a multiple of down: output j of upfirdn is the output m = j + shift
+        shift = self.buffer_start * up // down - self.nb_removed
+        output = scipy.signal.upfirdn(self.h, self.buffer, up, down, axis=0)[start - shift: stop - shift]
+        self.emitted = stop
+
+        # Dropping the inputs which are not needed by the next outputs
+        first_needed = max(0, -(-((stop + self.nb_removed) * down - len(self.h) + 1) // up))
+        first_needed = first_needed // down * down
+        if first_needed > self.buffer_start:
+            self.buffer = self.buffer[first_needed - self.buffer_start:]
+            self.buffer_start = first_needed
+        return output
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        up, down = self.factor
+        block = np.asarray(block, dtype=self.dtype)
+        if up == down == 1:
+            return block
+        self.buffer = block if self.buffer is None else np.concatenate([self.buffer, block])
+        self.received += len(block)
+        # Output m only depends on the inputs up to (m + nb_removed) * down // up
+        return self._emit((self.received * up - 1) // down - self.nb_removed + 1)
+
+    def flush(self) -> np.ndarray:
+        if self.buffer is None or self.factor == (1, 1):
+            return None
+        # The record is followed by zeros (as in scipy.signal.resample_poly)
+        padding = np.zeros((len(self.h) // self.factor[0] + self.factor[1] + 1, self.buffer.shape[1]),
+                           dtype=self.dtype)
+        self.buffer = np.concatenate([self.buffer, padding])
+        return self._emit(self.output_length(self.received))
+
+    def __repr__(self) -> str:
+        if self.fs is not None:
+            return f"Resample(fs={self.fs})"
+        return f"Resample(up={self.up}, down={self.down})"
+
+
+class Detrend(Stage):
+    """
+    Removal of the mean ("constant") or of the least-squares line ("linear") of each signal
+    (same output as scipy.signal.detrend applied to the whole record)
+    The trend is fitted during a first pass over the record
+    """
+    needs_fit = True
+
+    def __init__(self, type: str = "linear") -> None:
+        """
+        Constructor function initializing the type of the removed trend
+        :param type: "linear" or "constant"
+        """
+        if type not in ["linear", "constant"]:
+            raise ValueError("The type of the trend must be either 'linear' or 'constant'.")
+        self.type = type
+        self.fitted = False
+        self.sums = None
+        self.intercept = None
+        self.slope = None
+        self.center = None
+        self.position = 0
+
+    def configure(self, fs: float, columns: list, dtype) -> tuple:
+        self.fitted = False
+        dtype = np.dtype(dtype)
+        return fs, columns, dtype if dtype.kind in ["f", "c"] else np.dtype(np.float64)
+
+    def fit(self, block: np.ndarray) -> None:
+        if self.sums is None:
+            self.sums = {"n": 0, "x": np.zeros(block.shape[1]), "tx": np.zeros(block.shape[1])}
+        t = np.arange(self.sums["n"], self.sums["n"] + len(block), dtype=np.float64)
+        self.sums["x"] += block.sum(axis=0)
+        self.sums["tx"] += t @ block
+        self.sums["n"] += len(block)
+
+    def finish_fit(self) -> None:
+        n = self.sums["n"]
+        # Least-squares line over the centered sample index t - (n - 1) / 2
+        self.intercept = self.sums["x"] / n
+        if self.type == "linear" and n > 1:
+            self.slope = (self.sums["tx"] - (n - 1) / 2 * self.sums["x"]) / (n * (n ** 2 - 1) / 12)
+        else:
+            self.slope = np.zeros_like(self.intercept)
+        self.center = (n - 1) / 2
+        self.sums = None
+        self.fitted = True
+
+    def reset(self) -> None:
+        self.position = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        t = np.arange(self.position, self.position + len(block), dtype=np.float64) - self.center
+        self.position += len(block)
+        return block - (self.intercept + t[:, None] * self.slope)
+
+    def __repr__(self) -> str:
+        return f"Detrend(type={self.type})"
+
+
+class SelectChannels(Stage):
+    """
+    Selection (and re-ordering) of the signals
+    """
+
+    def __init__(self, channels: list) -> None:
+        """
+        Constructor function initializing the selected signals
+        :param channels: List of signal names (see HDView.columns) and/or signal indexes
+        """
+        self.channels = [channels] if isinstance(channels, (str, int, np.integer)) else list(channels)
+        self.indexes = None
+
+    def configure(self, fs: float, columns: list, dtype) -> tuple:
+        self.indexes = []
+        for k in self.channels:
+            if isinstance(k, str):
+                name = k.lower().replace(" ", "_")
+                if name not in columns:
+                    raise KeyError(f"Unknown signal: {k} (available signals: {', '.join(columns)})")
+                self.indexes.append(columns.index(name))
+            else:
+                self.indexes.append(int(k) % len(columns))
+        return fs, [columns[k] for k in self.indexes], np.dtype(dtype)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        return block[:, self.indexes]
+
+    def __repr__(self) -> str:
+        return f"SelectChannels({self.channels})"
+
+
+def run_stages(stages: list, read_chunks):
+    """
+    Function running blocks of samples through a list of (configured) stages
+    :param stages: List of stages
+    :param read_chunks: Callable returning the generator of (index of the first sample, block) tuples of the input
+    :return: Generator of output blocks
+    """
+    for stage in stages:
+        stage.reset()
+    for _, block in read_chunks():
+        for stage in stages:
+            block = stage.process(block)
+        if len(block):
+            yield block
+    # The samples held back by a stage go through the following stages before their own flush
+    for k, stage in enumerate(stages):
+        block = stage.flush()
+        if block is None:
+            continue
+        for following in stages[k + 1:]:
+            block = following.process(block)
+        if len(block):
+            yield block
+
+
+class Pipeline:
+    """
+    Chain of streaming stages (see Stage)
+    """
+
+    def __init__(self, stages: list) -> None:
+        """
+        Constructor function initializing the chain of stages
+        :param stages: List of stages (applied in order)
+        """
+        if not stages or not all(isinstance(k, Stage) for k in stages):
+            raise TypeError("A pipeline is made of at least one Stage object.")
+        self.stages = list(stages)
+
+    def __repr__(self) -> str:
+        return f"Pipeline({', '.join(repr(k) for k in self.stages)})"
+
+    def configure(self, fs: float, columns: list, dtype) -> tuple:
+        """
+        Function preparing the stages for a given input
+        :return: Tuple (sampling frequency, names of the signals, dtype) of the output
+        """
+        for stage in self.stages:
+            fs, columns, dtype = stage.configure(fs, columns, dtype)
+        return fs, columns, dtype
+
+    def output_length(self, nb_observations: int) -> int:
+        """
+        Function returning the number of output samples for a given number of input samples
+        """
+        for stage in self.stages:
+            nb_observations = stage.output_length(nb_observations)
+        return nb_observations
+
+    def fit(self, read_chunks) -> None:
+        """
+        Function fitting the stages which need it (see Stage.needs_fit), by running the preceding
+        stages once over the input
+        :param read_chunks: Callable returning the generator of (index of the first sample, block) tuples of the input
+        """
+        for k, stage in enumerate(self.stages):
+            if stage.needs_fit and not stage.fitted:
+                for block in run_stages(self.stages[:k], read_chunks):
+                    stage.fit(block)
+                stage.finish_fit()
+
+    def run(self, read_chunks):
+        """
+        Function running the input through the stages (fitted first if needed)
+        :param read_chunks: Callable returning the generator of (index of the first sample, block) tuples of the input
+        :return: Generator of output blocks
+        """
+        self.fit(read_chunks)
+        yield from run_stages(self.stages, read_chunks)
+
+
+class PipelineSignals(SignalSource):
+    """
+    Signal source applying a pipeline to another source (Numpy ndarray or SignalSource)
+    The samples are processed block by block each time the source is iterated: reading a range of
+    samples processes the record from its beginning up to the end of the range
+    Every iteration runs its own copy of the (fitted) stages, so that the source can be iterated
+    by several threads at once (see HDView.export())
+    """
+
+    def __init__(self, source, pipeline: Pipeline, fs: float, columns: list,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        """
+        Constructor function initializing the processed source
+        :param source: Numpy ndarray or SignalSource
+        :param pipeline: Pipeline applied to the source
+        :param fs: Sampling frequency of the source
+        :param columns: Names of the signals of the source
+        :param chunk_size: Number of samples of the source read per block
+        """
+        self.fs, self.columns, dtype = pipeline.configure(fs, list(columns), source.dtype)
+        super().__init__(pipeline.output_length(len(source)), len(self.columns), dtype)
+        self.source = source
+        self.pipeline = pipeline
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+
+    def iter_chunks(self, chunk_size: int, start: int = 0, stop: int = None, channels: list = None):
+        """
+        Function processing the source and iterating over the output samples by blocks of chunk_size rows
+        :param chunk_size: Number of samples per block
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Generator of tuples (index of the first sample of the block, block)
+        """
+        if chunk_size is None or chunk_size <= 0:
+            raise ValueError("The chunk size must be a strictly positive integer.")
+        start, stop = self._check_bounds(start, stop)
+        channels = self._check_channels(channels)
+        position, pending, nb_pending, offset = 0, [], 0, start
+        read_chunks = lambda: iter_signal_chunks(self.source, self.chunk_size)
+        with self.lock:
+            self.pipeline.fit(read_chunks)
+            pipeline = copy.deepcopy(self.pipeline)
+        for block in pipeline.run(read_chunks):
+            low, high = max(start, position), min(stop, position + len(block))
+            if low < high:
+                pending.append(block[low - position: high - position, channels].astype(self.dtype, copy=False))
+                nb_pending += high - low
+            position += len(block)
+            # Blocks of exactly chunk_size samples (except the last one)
+            while nb_pending >= chunk_size or (nb_pending and position >= stop):
+                data = np.concatenate(pending) if len(pending) > 1 else pending[0]
+                yield offset, data[:chunk_size]
+                offset += min(chunk_size, len(data))
+                pending = [data[chunk_size:]] if len(data) > chunk_size else []
+                nb_pending = max(0, len(data) - chunk_size)
+            if position >= stop:
+                return
+        if nb_pending:
+            yield offset, np.concatenate(pending)
+
+    def read(self, start: int = 0, stop: int = None, channels: list = None) -> np.ndarray:
+        """
+        Function reading a block of processed samples
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Numpy ndarray of shape (stop - start, len(channels))
+        """
+        start, stop = self._check_bounds(start, stop)
+        channels = self._check_channels(channels)
+        blocks = [k for _, k in self.iter_chunks(max(1, stop - start), start, stop, channels)]
+        if not blocks:
+            return np.empty((0, len(channels)), dtype=self.dtype)
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
@@ -0,0 +1,204 @@
+"""
+Multi-resolution min/max/mean pyramid of the signals (fast overview rendering)
+
+Level k summarizes the signals by bins of base * factor ** k samples. An overview of any
+[start, stop) range drawn on a given number of pixels is answered from the coarsest level
+whose bins are not larger than 1 pixel: the cost is proportional to the number of pixels
+and not to the number of samples of the range.
+"""
+from .constants import *
+import json
+import numpy as np
+
+
+def _reduce_bins(minimum: np.ndarray, maximum: np.ndarray, total: np.ndarray, count: np.ndarray,
+                 bin_size: int) -> tuple:
+    """
+    Function merging consecutive rows by bins of bin_size rows (the last bin may be incomplete)
+    :return: Tuple (minimum, maximum, sum, count) of the bins
+    """
+    nb_bins = -(-len(minimum) // bin_size)
+    padding = nb_bins * bin_size - len(minimum)
+    if padding:
+        minimum = np.concatenate([minimum, np.full((padding,) + minimum.shape[1:], np.nan)])
+        maximum = np.concatenate([maximum, np.full((padding,) + maximum.shape[1:], np.nan)])
+        total = np.concatenate([total, np.zeros((padding,) + total.shape[1:])])
+        count = np.concatenate([count, np.zeros((padding,) + count.shape[1:], dtype=count.dtype)])
+    shape = (nb_bins, bin_size) + minimum.shape[1:]
+    # fmin/fmax ignore the NaN values (unless the whole bin is NaN)
+    return (np.fmin.reduce(minimum.reshape(shape), axis=1), np.fmax.reduce(maximum.reshape(shape), axis=1),
+            total.reshape(shape).sum(axis=1), count.reshape(shape).sum(axis=1))
+
+
+def _summarize(block: np.ndarray, bin_size: int) -> tuple:
+    """
+    Function summarizing a block of samples by bins of bin_size samples
+    :return: Tuple (minimum, maximum, sum, count of the valid samples) of the bins
+    """
+    block = np.asarray(block, dtype=np.float64)
+    valid = ~np.isnan(block)
+    return _reduce_bins(block, block, np.where(valid, block, 0.0), valid.astype(np.int64), bin_size)
+
+
+class SignalPyramid:
+    """
+    Min/max/mean pyramid of the signals of a record
+    Every level holds, for each bin and each signal, the minimum, maximum and mean of the
+    samples (NaN samples are ignored) and the number of valid samples
+    """
+
+    def __init__(self, nb_observations: int, columns: list, levels: list, base: int = PYRAMID_BASE_BIN,
+                 factor: int = PYRAMID_FACTOR) -> None:
+        """
+        Constructor function initializing a pyramid (see SignalPyramid.build() and SignalPyramid.load())
+        :param nb_observations: Number of samples of the record
+        :param columns: Names of the signals
+        :param levels: List of dictionaries {min, max, mean, count} of Numpy ndarrays of shape (bins, signals)
+        :param base: Number of samples per bin of the first level
+        :param factor: Number of bins of a level merged into 1 bin of the next level
+        """
+        self.nb_observations = int(nb_observations)
+        self.columns = list(columns)
+        self.levels = levels
+        self.base = int(base)
+        self.factor = int(factor)
+
+    def __repr__(self) -> str:
+        return f"SignalPyramid(samples={self.nb_observations}, signals={len(self.columns)}, " \
+               f"levels={len(self.levels)}, base={self.base}, factor={self.factor})"
+
+    @classmethod
+    def build(cls, chunks, nb_observations: int, columns: list, base: int = PYRAMID_BASE_BIN,
+              factor: int = PYRAMID_FACTOR):
+        """
+        Function building the pyramid of a record in a single pass over its samples
+        Only the first level is computed from the samples, the next ones are computed from the previous level
+        :param chunks: Iterable of (index of the first sample, block of samples) tuples covering the record
+        :param nb_observations: Number of samples of the record
+        :param columns: Names of the signals
+        :param base: Number of samples per bin of the first level
+        :param factor: Number of bins of a level merged into 1 bin of the next level
+        :return: SignalPyramid
+        """
+        if base < 1 or factor < 2:
+            raise ValueError("The base bin size must be >= 1 and the factor >= 2.")
+        parts = []
+        remainder = np.empty((0, len(columns)))
+        for _, block in chunks:
+            # The samples left over by a block (incomplete bin) are prepended to the next one
+            block = np.concatenate([remainder, block]) if len(remainder) else np.asarray(block)
+            complete = len(block) // base * base
+            if complete:
+                parts.append(_summarize(block[:complete], base))
+            remainder = block[complete:]
+        if len(remainder):
+            parts.append(_summarize(remainder, base))
+        if not parts:
+            raise ValueError("The record does not contain any sample.")
+
+        minimum, maximum, total, count = [np.concatenate(k) for k in zip(*parts)]
+        levels = []
+        while True:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.where(count > 0, total / count, np.nan)
+            levels.append({"min": minimum, "max": maximum, "mean": mean, "count": count})
+            if len(minimum) <= factor:
+                break
+            minimum, maximum, total, count = _reduce_bins(minimum, maximum, total, count, factor)
+        return cls(nb_observations, columns, levels, base, factor)
+
+    def get_bin_size(self, level: int) -> int:
+        """
+        Function returning the number of samples per bin of a level
+        :param level: Index of the level (0 = finest level)
+        :return: Integer
+        """
+        return self.base * self.factor ** level
+
+    def query(self, start: int = 0, stop: int = None, pixels: int = DEFAULT_OVERVIEW_PIXELS, channels: list = None,
+              source=None) -> dict:
+        """
+        Function returning the min/max/mean overview of a range of samples drawn on a number of pixels
+        The range is answered from the coarsest level whose bins are not larger than a pixel (the samples
+        themselves are read from the source when a pixel holds less samples than a bin of the first level)
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param pixels: Maximum number of points of the overview
+        :param channels: List of the signal indexes (all signals if None)
+        :param source: Numpy ndarray or SignalSource of the samples (optional)
+        :return: Dictionary containing:
+            - index: index of the first sample of each point
+            - min, max, mean: Numpy ndarrays of shape (points, signals)
+            - level: level used (-1 for the samples), samples_per_point: number of samples of the used bins
+        """
+        if pixels is None or pixels < 1:
+            raise ValueError("The number of pixels must be a strictly positive integer.")
+        start, stop, _ = slice(start, stop).indices(self.nb_observations)
+        stop = max(start, stop)
+        channels = list(range(len(self.columns))) if channels is None else list(channels)
+        samples_per_pixel = (stop - start) / pixels
+
+        if samples_per_pixel < self.base and source is not None:
+            # Zoomed in: less than pixels * base samples are read
+            if hasattr(source, "read"):
+                block = source.read(start, stop, channels)
+            else:
+                block = np.asarray(source[start: stop])[:, channels]
+            minimum, maximum, total, count = _summarize(block, 1)
+            level, bin_size, first = -1, 1, start
+        else:
+            level = 0
+            while level + 1 < len(self.levels) and self.get_bin_size(level + 1) <= samples_per_pixel:
+                level += 1
+            bin_size = self.get_bin_size(level)
+            first, last = start // bin_size, -(-stop // bin_size)
+            data = self.levels[level]
+            minimum, maximum = data["min"][first: last, channels], data["max"][first: last, channels]
+            count = data["count"][first: last, channels]
+            total = np.where(count > 0, data["mean"][first: last, channels], 0.0) * count
+            first *= bin_size
+
+        # Merging the bins into (at most) 1 point per pixel
+        if len(minimum) > pixels:
+            edges = np.linspace(0, len(minimum), pixels + 1).astype(np.int64)[:-1]
+            minimum, maximum = np.fmin.reduceat(minimum, edges, axis=0), np.fmax.reduceat(maximum, edges, axis=0)
+            total, count = np.add.reduceat(total, edges, axis=0), np.add.reduceat(count, edges, axis=0)
+        else:
+            edges = np.arange(len(minimum))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+        return {
+            "index": first + edges * bin_size,
+            "min": minimum,
+            "max": maximum,
+            "mean": mean,
+            "columns": [self.columns[k] for k in channels],
+            "level": level,
+            "samples_per_point": bin_size
+        }
+
+    def save(self, filename: str) -> str:
+        """
+        Function saving the pyramid to a NumPy .npz file
+        :param filename: Path of the file
+        :return: Path of the file
+        """
+        arrays = {f"level_{k}_{field}": data[field] for k, data in enumerate(self.levels) for field in data}
+        meta = {"nb_observations": self.nb_observations, "columns": self.columns, "base": self.base,
+                "factor": self.factor, "nb_levels": len(self.levels)}
+        with open(filename, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        return filename
+
+    @classmethod
+    def load(cls, filename: str):
+        """
+        Function loading a pyramid saved by SignalPyramid.save()
+        :param filename: Path of the file
+        :return: SignalPyramid
+        """
+        with np.load(filename) as data:
+            meta = json.loads(str(data["meta"]))
+            levels = [{field: data[f"level_{k}_{field}"] for field in ["min", "max", "mean", "count"]}
+                      for k in range(meta["nb_levels"])]
+        return cls(meta["nb_observations"], meta["columns"], levels, meta["base"], meta["factor"])
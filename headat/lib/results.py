@@ -0,0 +1,231 @@
+from .constants import *
+from .download import compute_sha256
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the index is only protected against concurrent threads
+    fcntl = None
+
+# Digests of the last hashed files (LRU): path --> (size, modification time, SHA-256 digest)
+_file_digests = collections.OrderedDict()
+_file_digests_lock = threading.Lock()
+
+
+def get_content_digest(paths: list) -> str:
+    """
+    Function returning a digest of the content of several files (e.g. the files of a record)
+    A file is only hashed again if its size or its modification time has changed (the digests of the
+    RESULT_DIGEST_MEMO_SIZE last hashed files are kept)
+    :param paths: List of file paths
+    :return: SHA-256 hexadecimal digest
+    """
+    hasher = hashlib.sha256()
+    for path in sorted(os.path.abspath(k) for k in paths):
+        status = os.stat(path)
+        key = (status.st_size, status.st_mtime_ns)
+        with _file_digests_lock:
+            entry = _file_digests.get(path)
+            if entry is not None:
+                _file_digests.move_to_end(path)
+        if entry is not None and entry[:2] == key:
+            digest = entry[2]
+        else:
+            digest = compute_sha256(path)
+            with _file_digests_lock:
+                _file_digests[path] = key + (digest,)
+                _file_digests.move_to_end(path)
+                while len(_file_digests) > RESULT_DIGEST_MEMO_SIZE:
+                    _file_digests.popitem(last=False)
+        hasher.update(f"{os.path.basename(path)}:{digest}\n".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def get_result_key(digest: str, format: str, options: dict = None) -> str:
+    """
+    Function returning the key of a conversion in the result cache
+    :param digest: Digest of the content of the record (see get_content_digest())
+    :param format: Format name
+    :param options: Keyword arguments of the exporter (JSON-serializable)
+    :return: SHA-256 hexadecimal digest
+    """
+    payload = json.dumps({"record": digest, "format": format.lower(), "options": options or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent cache of the converted files, keyed by the content of the record, the format and the
+    options of the exporter (see get_result_key()), shared across the processes using the same folder
+        - objects/<2 first chars>/<key>/ : converted files of a conversion
+        - index.json : key --> {files, size, last access, format, options} (used for the LRU eviction)
+    """
+
+    def __init__(self, folder: str = DEFAULT_RESULT_CACHE_FOLDER, max_size: int = DEFAULT_RESULT_CACHE_SIZE) -> None:
+        """
+        Constructor function initializing (or re-opening) a cache folder
+        :param folder: Path of the cache folder
+        :param max_size: Maximum total size of the cached files (in bytes)
+        """
+        if max_size is None or max_size < 0:
+            raise ValueError("The maximum size of the cache must be a positive integer.")
+        self.folder = folder
+        self.max_size = int(max_size)
+        self.objects_folder = os.path.join(folder, "objects")
+        self.index_filename = os.path.join(folder, "index.json")
+        self.lock = threading.RLock()
+        os.makedirs(self.objects_folder, exist_ok=True)
+
+        # The maximum size may have been lowered since the last use of the folder
+        self.evict()
+
+    def __repr__(self) -> str:
+        return f"ResultCache({self.folder}, max_size={self.max_size})"
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Context manager locking the index against concurrent threads and processes
+        """
+        with self.lock:
+            with open(os.path.join(self.folder, ".lock"), "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_filename, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self, index: dict) -> None:
+        tmp_filename = self.index_filename + f".{os.getpid()}.tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_filename, self.index_filename)
+
+    def get_entry_folder(self, key: str) -> str:
+        """
+        Function returning the folder of the converted files of a conversion
+        :param key: Key of the conversion (see get_result_key())
+        :return: Path of the folder
+        """
+        return os.path.join(self.objects_folder, key[:2], key)
+
+    def lookup(self, key: str) -> list:
+        """
+        Function returning the cached files of a conversion (and marking them as recently used)
+        :param key: Key of the conversion (see get_result_key())
+        :return: List of the paths of the converted files or None if the conversion is not cached
+        """
+        with self._locked():
+            index = self._read_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            folder = self.get_entry_folder(key)
+            paths = [os.path.join(folder, k) for k in entry["files"]]
+            if not all(os.path.isfile(k) for k in paths):
+                del index[key]
+                self._write_index(index)
+                return None
+            entry["last_access"] = time.time()
+            self._write_index(index)
+            return paths
+
+    def store(self, key: str, paths: list, info: dict = None) -> list:
+        """
+        Function moving the converted files of a conversion into the cache
+        :param key: Key of the conversion (see get_result_key())
+        :param paths: Paths of the converted files (moved into the cache)
+        :param info: Additional JSON-serializable information kept in the index (e.g. format, options)
+        :return: List of the paths of the cached files
+        """
+        folder = self.get_entry_folder(key)
+        with self._locked():
+            # Same conversion stored again: the previous files are replaced
+            shutil.rmtree(folder, ignore_errors=True)
+            os.makedirs(folder)
+            files = []
+            for path in paths:
+                files.append(os.path.basename(path))
+                shutil.move(path, os.path.join(folder, files[-1]))
+            index = self._read_index()
+            index[key] = dict(info or {}, files=files, last_access=time.time(),
+                              size=sum(os.path.getsize(os.path.join(folder, k)) for k in files))
+            self._write_index(index)
+            self._evict(index, keep=key)
+        return [os.path.join(folder, k) for k in files]
+
+    def evict(self) -> None:
+        """
+        Function removing the least recently used conversions until the cache fits in its maximum size
+        """
+        with self._locked():
+            self._evict(self._read_index())
+
+    def _evict(self, index: dict, keep: str = None) -> None:
+        """
+        Function removing the least recently used conversions until the cache fits in its maximum size
+        (the caller must hold the lock)
+        :param index: Current index
+        :param keep: Key of a conversion which must not be evicted
+        """
+        total_size = sum(k["size"] for k in index.values())
+        evicted = []
+        for key, entry in sorted(index.items(), key=lambda k: k[1]["last_access"]):
+            if total_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.get_entry_folder(key), ignore_errors=True)
+            evicted.append(key)
+            total_size -= entry["size"]
+        if evicted:
+            for key in evicted:
+                del index[key]
+            self._write_index(index)
+
+    def get_size(self) -> int:
+        """
+        Function returning the total size of the cached files
+        :return: Size in bytes
+        """
+        return sum(k["size"] for k in self._read_index().values())
+
+    def get_info(self) -> dict:
+        """
+        Function returning information about the cache
+        :return: Dictionary
+        """
+        index = self._read_index()
+        return {
+            "folder": self.folder,
+            "max_size": self.max_size,
+            "size": sum(k["size"] for k in index.values()),
+            "nb_results": len(index),
+            "nb_files": sum(len(k["files"]) for k in index.values())
+        }
+
+    def clear(self) -> None:
+        """
+        Function removing every cached conversion
+        """
+        with self._locked():
+            shutil.rmtree(self.objects_folder, ignore_errors=True)
+            os.makedirs(self.objects_folder, exist_ok=True)
+            self._write_index({})
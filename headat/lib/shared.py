@@ -0,0 +1,131 @@
+"""
+Signal buffers shared between processes
+
+The signals of a view are copied once (block by block) into a shared memory segment
+(multiprocessing.shared_memory) or into a memory-mapped .npy file. Other processes rebuild a zero-copy,
+read-only array from a small picklable handle instead of receiving (or re-decoding) the signals.
+The process which created the buffer owns it: the buffer is released (unlinked or removed) by close().
+"""
+from .constants import *
+from .signals import iter_signal_chunks
+import os
+import tempfile
+import uuid
+import numpy as np
+from multiprocessing import shared_memory
+
+SHARED_KINDS = ["shm", "memmap"]
+
+
+class SharedSignals:
+    """
+    Signal array placed in shared memory ("shm") or in a memory-mapped .npy file ("memmap")
+        - create(): copies signals into a new buffer owned by the calling process
+        - attach(): zero-copy, read-only access to an existing buffer from its handle
+    The handle (handle attribute) is a picklable dictionary {kind, name, shape, dtype, metadata}
+    """
+
+    def __init__(self, array: np.ndarray, handle: dict, owner: bool = False, segment=None) -> None:
+        """
+        Constructor function (see create() and attach())
+        :param array: Numpy ndarray backed by the buffer
+        :param handle: Handle of the buffer
+        :param owner: If set to True, the buffer is released by close()
+        :param segment: multiprocessing.shared_memory.SharedMemory of the "shm" buffers
+        """
+        self.array = array
+        self.handle = handle
+        self.owner = owner
+        self.segment = segment
+        self.closed = False
+
+    def __repr__(self) -> str:
+        return (f"SharedSignals({self.handle['kind']}, {self.handle['name']}, shape={tuple(self.handle['shape'])}, "
+                f"owner={self.owner}, closed={self.closed})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @classmethod
+    def create(cls, signals, kind: str = "shm", path: str = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+               metadata: dict = None):
+        """
+        Function copying signals into a new shared buffer
+        :param signals: Numpy ndarray or SignalSource (read block by block)
+        :param kind: "shm" (shared memory segment) or "memmap" (memory-mapped .npy file)
+        :param path: Path of the .npy file of the "memmap" buffers (temporary file if None)
+        :param chunk_size: Number of samples copied per block
+        :param metadata: Picklable information carried by the handle
+        :return: SharedSignals owned by the calling process
+        """
+        if kind not in SHARED_KINDS:
+            raise ValueError(f"The kind of shared buffer must be one of: {', '.join(SHARED_KINDS)}")
+        shape, dtype = tuple(int(k) for k in signals.shape), np.dtype(signals.dtype)
+        segment = None
+        if kind == "shm":
+            # The size of a segment cannot be null
+            segment = shared_memory.SharedMemory(name=f"{SHARED_SIGNALS_PREFIX}{uuid.uuid4().hex[:16]}", create=True,
+                                                 size=max(1, int(np.prod(shape)) * dtype.itemsize))
+            array, name = np.ndarray(shape, dtype=dtype, buffer=segment.buf), segment.name
+        else:
+            if path is None:
+                handle, path = tempfile.mkstemp(prefix=SHARED_SIGNALS_PREFIX, suffix=".npy")
+                os.close(handle)
+            array, name = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape), os.path.abspath(path)
+        shared = cls(array, {"kind": kind, "name": name, "shape": shape, "dtype": dtype.str,
+                             "metadata": metadata or {}}, owner=True, segment=segment)
+        try:
+            for offset, block in iter_signal_chunks(signals, chunk_size):
+                array[offset: offset + len(block)] = block
+            if kind == "memmap":
+                array.flush()
+        except BaseException:
+            shared.close()
+            raise
+        return shared
+
+    @classmethod
+    def attach(cls, handle: dict):
+        """
+        Function accessing an existing shared buffer without copying it
+        :param handle: Handle of the buffer (handle attribute of the owner)
+        :return: SharedSignals (not owner) whose array is read-only
+        """
+        shape, dtype = tuple(handle["shape"]), np.dtype(handle["dtype"])
+        segment = None
+        if handle["kind"] == "shm":
+            try:
+                # Python >= 3.13: the segment is not unlinked when the attached process exits
+                segment = shared_memory.SharedMemory(name=handle["name"], track=False)
+            except TypeError:
+                segment = shared_memory.SharedMemory(name=handle["name"])
+            array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+            array.flags.writeable = False
+        elif handle["kind"] == "memmap":
+            array = np.load(handle["name"], mmap_mode="r")
+        else:
+            raise ValueError(f"Unknown kind of shared buffer: {handle['kind']}")
+        return cls(array, handle, owner=False, segment=segment)
+
+    def close(self) -> None:
+        """
+        Function releasing the access to the buffer (and the buffer itself if this process owns it)
+        The arrays built on the buffer (e.g. the signals of a view) must not be used anymore
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.array = None
+        if self.segment is not None:
+            try:
+                self.segment.close()
+            except BufferError:
+                # Arrays built on the segment are still referenced: it is unmapped once they are collected
+                pass
+            if self.owner:
+                self.segment.unlink()
+        elif self.owner and os.path.exists(self.handle["name"]):
+            os.remove(self.handle["name"])
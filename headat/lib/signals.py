@@ -0,0 +1,542 @@
+from .constants import *
+import bisect
+import collections
+import os
+import threading
+import numpy as np
+import wfdb as wf
+
+
+class SignalSource:
+    """
+    Array-like object giving on-demand access to the signals of a record
+    Sub-classes only have to implement the read() method
+        - 1 row = 1 record (1 observation)
+        - 1 column = 1 signal
+    """
+    ndim = 2
+
+    def __init__(self, nb_observations: int, nb_signals: int, dtype) -> None:
+        """
+        Constructor function initializing the shape of the source
+        :param nb_observations: Number of samples (rows)
+        :param nb_signals: Number of signals (columns)
+        :param dtype: Numpy dtype of the values returned by read()
+        """
+        self.shape = (int(nb_observations), int(nb_signals))
+        self.dtype = np.dtype(dtype)
+
+    def read(self, start: int = 0, stop: int = None, channels: list = None) -> np.ndarray:
+        """
+        Function reading a contiguous block of samples
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Numpy ndarray of shape (stop - start, len(channels))
+        """
+        raise NotImplementedError
+
+    def iter_chunks(self, chunk_size: int, start: int = 0, stop: int = None, channels: list = None):
+        """
+        Function iterating over the samples by blocks of chunk_size rows
+        :param chunk_size: Number of samples per block
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Generator of tuples (index of the first sample of the block, block)
+        """
+        if chunk_size is None or chunk_size <= 0:
+            raise ValueError("The chunk size must be a strictly positive integer.")
+        start, stop = self._check_bounds(start, stop)
+        for offset in range(start, stop, chunk_size):
+            yield offset, self.read(offset, min(offset + chunk_size, stop), channels)
+
+    def _check_bounds(self, start: int, stop: int) -> tuple:
+        """
+        Function clipping a [start, stop) range of samples to the record length
+        :return: Tuple (start, stop)
+        """
+        start, stop, _ = slice(start, stop).indices(self.shape[0])
+        return start, max(start, stop)
+
+    def _check_channels(self, channels) -> list:
+        """
+        Function normalizing a channel selection into a list of signal indexes
+        :return: List of signal indexes
+        """
+        if channels is None:
+            return list(range(self.shape[1]))
+        if isinstance(channels, slice):
+            return list(range(self.shape[1]))[channels]
+        if isinstance(channels, (int, np.integer)):
+            channels = [channels]
+        return [int(k) % self.shape[1] for k in channels]
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.size * self.dtype.itemsize
+
+    def __getitem__(self, key):
+        """
+        Function providing the Numpy basic indexing (rows and/or columns) of the source
+        Only the requested rows and columns are read from the underlying storage
+        """
+        if isinstance(key, tuple):
+            if len(key) > 2:
+                raise IndexError("Too many indices for a 2-dimensional signal source")
+            rows, cols = key if len(key) == 2 else (key[0], slice(None))
+        else:
+            rows, cols = key, slice(None)
+        channels = self._check_channels(cols)
+
+        if isinstance(rows, (int, np.integer)):
+            index = int(rows) + self.shape[0] if rows < 0 else int(rows)
+            if not 0 <= index < self.shape[0]:
+                raise IndexError("Sample index out of range")
+            data = self.read(index, index + 1, channels)[0]
+        elif isinstance(rows, slice):
+            indexes = range(*rows.indices(self.shape[0]))
+            if len(indexes) == 0:
+                data = np.empty((0, len(channels)), dtype=self.dtype)
+            else:
+                low, high = min(indexes), max(indexes) + 1
+                data = self.read(low, high, channels)[indexes.start - low:: indexes.step]
+        else:
+            raise TypeError("Only integers and slices are supported for the rows selection.")
+        return data[..., 0] if isinstance(cols, (int, np.integer)) else data
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        data = self.read(0, self.shape[0])
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def tolist(self) -> list:
+        return self.read(0, self.shape[0]).tolist()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(shape={self.shape}, dtype={self.dtype})"
+
+
+def get_signals_dtype(fmts: list, physical: bool = True, dtype=None) -> np.dtype:
+    """
+    Function returning (and checking) the dtype of the signals of a record
+    :param fmts: List of the WFDB formats of the signals
+    :param physical: If set to True, the physical values are returned (digital ADC values otherwise)
+    :param dtype: Requested dtype (float64 for physical values and the native integer type for digital values if None)
+    :return: Numpy dtype
+    """
+    if dtype is None:
+        if physical:
+            return np.dtype(np.float64)
+        return np.result_type(np.int8, *[np.dtype(DAT_DIGITAL_DTYPE.get(k, "int32")) for k in fmts or ["32"]])
+    dtype = np.dtype(dtype)
+    if physical and dtype.kind != "f":
+        raise ValueError("Physical values can only be stored as floating-point numbers (float32 or float64).")
+    if dtype.kind not in ["f", "i", "u"]:
+        raise ValueError("The dtype of the signals must be a numeric type.")
+    return dtype
+
+
+def iter_signal_chunks(signals, chunk_size: int, start: int = 0, stop: int = None, channels: list = None):
+    """
+    Function iterating by blocks over a Numpy ndarray or a SignalSource
+    :param signals: Numpy ndarray or SignalSource
+    :param chunk_size: Number of samples per block
+    :param start: Index of the first sample (included)
+    :param stop: Index of the last sample (excluded)
+    :param channels: List of the signal indexes to read (all signals if None)
+    :return: Generator of tuples (index of the first sample of the block, block)
+    """
+    if isinstance(signals, SignalSource):
+        yield from signals.iter_chunks(chunk_size, start, stop, channels)
+        return
+    if chunk_size is None or chunk_size <= 0:
+        raise ValueError("The chunk size must be a strictly positive integer.")
+    start, stop, _ = slice(start, stop).indices(len(signals))
+    for offset in range(start, max(start, stop), chunk_size):
+        block = signals[offset: min(offset + chunk_size, stop)]
+        yield offset, (block if channels is None else block[:, channels])
+
+
+class WindowSignals(SignalSource):
+    """
+    Signal source restricted to a [start, stop) range of samples and to a subset of the signals
+    of another source (Numpy ndarray or SignalSource)
+    Only the samples of the window are read from the underlying source
+    """
+
+    def __init__(self, source, start: int, stop: int, channels: list) -> None:
+        """
+        Constructor function initializing the window
+        :param source: Numpy ndarray or SignalSource
+        :param start: Index of the first sample of the window in the source (included)
+        :param stop: Index of the last sample of the window in the source (excluded)
+        :param channels: List of the signal indexes of the source kept in the window
+        """
+        super().__init__(stop - start, len(channels), source.dtype)
+        self.source = source
+        self.start = start
+        self.stop = stop
+        self.channels = list(channels)
+
+    def read(self, start: int = 0, stop: int = None, channels: list = None) -> np.ndarray:
+        """
+        Function reading a block of samples of the window
+        :param start: Index of the first sample (included), relative to the window
+        :param stop: Index of the last sample (excluded), relative to the window
+        :param channels: List of the signal indexes to read (all signals of the window if None)
+        :return: Numpy ndarray of shape (stop - start, len(channels))
+        """
+        start, stop = self._check_bounds(start, stop)
+        channels = [self.channels[k] for k in self._check_channels(channels)]
+        if isinstance(self.source, SignalSource):
+            return self.source.read(self.start + start, self.start + stop, channels)
+        return self.source[self.start + start: self.start + stop, channels]
+
+    def iter_chunks(self, chunk_size: int, start: int = 0, stop: int = None, channels: list = None):
+        """
+        Function iterating over the samples of the window by blocks of chunk_size rows
+        (the iteration is delegated to the underlying source)
+        :param chunk_size: Number of samples per block
+        :param start: Index of the first sample (included), relative to the window
+        :param stop: Index of the last sample (excluded), relative to the window
+        :param channels: List of the signal indexes to read (all signals of the window if None)
+        :return: Generator of tuples (index of the first sample of the block, block)
+        """
+        start, stop = self._check_bounds(start, stop)
+        channels = [self.channels[k] for k in self._check_channels(channels)]
+        for offset, block in iter_signal_chunks(self.source, chunk_size, self.start + start, self.start + stop,
+                                                channels):
+            yield offset - self.start, block
+
+
+class LazySignals(SignalSource):
+    """
+    Signal source memory-mapping the .dat files of a WFDB record
+    Samples are only decoded (digital to physical units) for the rows and
+    columns actually requested
+    """
+
+    def __init__(self, record: str, header: wf.Record = None, physical: bool = True, dtype=None) -> None:
+        """
+        Constructor function initializing the lazy view of a record
+        :param record: Record name (path without the .hea extension)
+        :param header: wfdb.Record header object (read from the .hea file if None)
+        :param physical: If set to True, the samples are converted into physical units (digital ADC values otherwise)
+        :param dtype: dtype of the returned samples (see get_signals_dtype())
+        """
+        if header is None:
+            header = wf.rdheader(record)
+        if not self.is_supported(header):
+            raise ValueError("The record cannot be memory-mapped (unsupported WFDB format).")
+        super().__init__(header.sig_len, header.n_sig, get_signals_dtype(header.fmt, physical, dtype))
+        self.physical = physical
+        self.digital_dtype = get_signals_dtype(header.fmt, physical=False)
+        self.record = record
+        self.header = header
+        self.directory = os.path.dirname(record)
+        self.adc_gain = np.asarray(header.adc_gain, dtype=np.float64)
+        self.baseline = np.asarray(header.baseline, dtype=np.float64)
+
+        # Grouping the signals by .dat file (signals are interleaved inside a file)
+        self.files = {}
+        for k, file_name in enumerate(header.file_name):
+            self.files.setdefault(file_name, {
+                "fmt": header.fmt[k],
+                "byte_offset": header.byte_offset[k] or 0,
+                "signals": [],
+                "map": None
+            })["signals"].append(k)
+
+    @staticmethod
+    def is_supported(header) -> bool:
+        """
+        Function returning whether a record header can be read lazily
+        (single segment, no skew, 1 sample per frame and memory-mappable formats)
+        :param header: wfdb header object
+        :return: Boolean
+        """
+        if not isinstance(header, wf.Record) or not header.n_sig or not header.sig_len:
+            return False
+        for k in range(header.n_sig):
+            if header.fmt[k] not in LAZY_DAT_FORMATS:
+                return False
+            if (header.samps_per_frame[k] or 1) != 1 or (header.skew[k] or 0) != 0:
+                return False
+            if header.adc_gain[k] == 0:
+                return False
+        return True
+
+    def _get_map(self, file_name: str) -> np.memmap:
+        """
+        Function returning the (lazily opened) memory-map of a .dat file
+        :param file_name: Name of the .dat file
+        :return: Numpy memmap
+        """
+        group = self.files[file_name]
+        if group["map"] is None:
+            load_type, bytes_per_sample = LAZY_DAT_FORMATS[group["fmt"]]
+            nb_bytes = int(np.ceil(self.shape[0] * len(group["signals"]) * bytes_per_sample))
+            path = os.path.join(self.directory, file_name)
+            available = os.path.getsize(path) - group["byte_offset"]
+            if available < nb_bytes:
+                raise ValueError(f"The signal file {path} is shorter than declared in the header.")
+            group["map"] = np.memmap(path, dtype=np.uint8, mode="r", offset=group["byte_offset"], shape=(nb_bytes,))
+        return group["map"]
+
+    def _read_digital(self, file_name: str, start: int, stop: int) -> np.ndarray:
+        """
+        Function decoding the digital samples of every signal stored in one .dat file
+        :return: Numpy ndarray of shape (stop - start, nb of signals in the file)
+        """
+        group = self.files[file_name]
+        fmt = group["fmt"]
+        width = len(group["signals"])
+        raw = self._get_map(file_name)
+        load_type, bytes_per_sample = LAZY_DAT_FORMATS[fmt]
+
+        if fmt == "212":
+            # Pairs of 12-bit samples are packed into byte triplets
+            first, last = start * width, stop * width
+            block_start, block_stop = first // 2, (last + 1) // 2
+            data = np.zeros(3 * (block_stop - block_start), dtype=np.int16)
+            chunk = raw[3 * block_start: 3 * block_stop]
+            data[: len(chunk)] = chunk
+            samples = np.empty(2 * (block_stop - block_start), dtype=np.int16)
+            samples[0::2] = data[0::3] + 256 * np.bitwise_and(data[1::3], 0x0F)
+            samples[1::2] = data[2::3] + 256 * np.bitwise_and(data[1::3] >> 4, 0x0F)
+            samples[samples > 2047] -= 4096
+            samples = samples[first - 2 * block_start: first - 2 * block_start + last - first]
+            return samples.reshape(-1, width)
+
+        nb_bytes = int(bytes_per_sample)
+        block = raw[start * width * nb_bytes: stop * width * nb_bytes]
+        if fmt == "24":
+            triplets = block.reshape(-1, 3).astype(np.int32)
+            samples = triplets[:, 0] + (triplets[:, 1] << 8) + (triplets[:, 2] << 16)
+            samples[samples > 2 ** 23 - 1] -= 2 ** 24
+        else:
+            samples = block.view(load_type)
+            if fmt == "80":
+                samples = (samples.astype(np.int16) - 128).astype(np.int8)
+            elif fmt == "160":
+                samples = (samples.astype(np.int32) - 32768).astype(np.int16)
+        return samples.reshape(-1, width)
+
+    def read_digital(self, start: int = 0, stop: int = None, channels: list = None) -> np.ndarray:
+        """
+        Function reading a block of digital (ADC) samples
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Numpy ndarray of digital values (native integer dtype of the WFDB formats)
+        """
+        start, stop = self._check_bounds(start, stop)
+        channels = self._check_channels(channels)
+        out = np.empty((stop - start, len(channels)), dtype=self.digital_dtype)
+        for file_name, group in self.files.items():
+            wanted = [(i, group["signals"].index(k)) for i, k in enumerate(channels) if k in group["signals"]]
+            if not wanted:
+                continue
+            block = self._read_digital(file_name, start, stop)
+            for i, j in wanted:
+                out[:, i] = block[:, j]
+        return out
+
+    def read(self, start: int = 0, stop: int = None, channels: list = None) -> np.ndarray:
+        """
+        Function reading a block of samples converted into physical units (unless the source is digital)
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Numpy ndarray of physical values (NaN for invalid samples) or digital values
+        """
+        channels = self._check_channels(channels)
+        digital = self.read_digital(start, stop, channels)
+        if not self.physical:
+            return digital.astype(self.dtype, copy=False)
+        invalid = np.array([DAT_INVALID_SAMPLE_VALUE[self.header.fmt[k]] for k in channels])
+        nan_locations = digital == invalid
+        physical = digital.astype(self.dtype)
+        np.subtract(physical, self.baseline[channels], physical)
+        np.divide(physical, self.adc_gain[channels], physical)
+        physical[nan_locations] = np.nan
+        return physical
+
+    def get_infos(self) -> dict:
+        """
+        Function returning the record information (same fields as wfdb.rdsamp)
+        (with the formats, ADC gains and baselines for digital sources)
+        :return: Dictionary
+        """
+        fields = RECORD_INFO_FIELDS if self.physical else RECORD_INFO_FIELDS + DIGITAL_INFO_FIELDS
+        return {field: getattr(self.header, field) for field in fields}
+
+
+def get_segment_index(record: str, header=None) -> list:
+    """
+    Function returning the segments of a record with their range of samples
+    (the layout segment of the variable-layout records is skipped)
+    :param record: Record name (path without the .hea extension)
+    :param header: wfdb header object (read from the .hea file if None)
+    :return: List of dictionaries {name, start, stop} (null segments are named "~")
+    """
+    if header is None:
+        header = wf.rdheader(record)
+    if not isinstance(header, wf.MultiRecord):
+        return [{"name": os.path.basename(record), "start": 0, "stop": header.sig_len}]
+    segments = []
+    start = 0
+    for name, length in zip(header.seg_name, header.seg_len):
+        if length == 0:
+            continue
+        segments.append({"name": name, "start": start, "stop": start + length})
+        start += length
+    return segments
+
+
+class MultiSegmentSignals(SignalSource):
+    """
+    Signal source joining lazily the segments of a multi-segment WFDB record
+    A segment is only opened (memory-mapped when its format allows it) when one of its samples
+    is read, and the blocks iterated by iter_chunks() never straddle two segments
+    Signals missing from a segment (and null segments) are read as NaN
+    """
+
+    def __init__(self, record: str, header=None, physical: bool = True, dtype=None,
+                 cache_segments: int = MULTI_SEGMENT_CACHE) -> None:
+        """
+        Constructor function reading the segment index of a record
+        :param record: Record name (path without the .hea extension)
+        :param header: wfdb.MultiRecord header object (read from the .hea file if None)
+        :param physical: Only physical values are supported (each segment has its own ADC gains)
+        :param dtype: dtype of the returned samples (float64 or float32)
+        :param cache_segments: Maximum number of segments kept open
+        """
+        if header is None:
+            header = wf.rdheader(record)
+        if not isinstance(header, wf.MultiRecord):
+            raise ValueError("The record is not a multi-segment record.")
+        if not physical:
+            raise ValueError("The digital values of a multi-segment record cannot be joined "
+                             "(each segment has its own ADC gains).")
+        self.record = record
+        self.header = header
+        self.directory = os.path.dirname(record)
+        self.segments = get_segment_index(record, header)
+        self.starts = [k["start"] for k in self.segments] + [self.segments[-1]["stop"] if self.segments else 0]
+
+        # Signals of the record: layout segment (variable layout) or first segment (fixed layout)
+        if header.layout == "variable":
+            self.layout = wf.rdheader(os.path.join(self.directory, header.seg_name[0]))
+        else:
+            self.layout = wf.rdheader(os.path.join(self.directory, next(k["name"] for k in self.segments
+                                                                        if k["name"] != "~")))
+        super().__init__(self.starts[-1], self.layout.n_sig, get_signals_dtype([], True, dtype))
+        self.cache_segments = cache_segments
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_segments(self) -> list:
+        """
+        Function returning the segment index of the record
+        :return: List of dictionaries {name, start, stop} (see get_segment_index())
+        """
+        return [dict(k) for k in self.segments]
+
+    def _get_segment(self, k: int) -> tuple:
+        """
+        Function returning the (lazily opened) samples of a segment
+        :param k: Index of the segment
+        :return: Tuple (LazySignals, Numpy ndarray or None for a null segment, list of the segment
+        signal index of each signal of the record, -1 if the signal is missing from the segment)
+        """
+        with self.lock:
+            if k in self.cache:
+                self.cache.move_to_end(k)
+                return self.cache[k]
+        name = self.segments[k]["name"]
+        if name == "~":
+            source, mapping = None, []
+        else:
+            path = os.path.join(self.directory, name)
+            header = wf.rdheader(path)
+            if LazySignals.is_supported(header):
+                source = LazySignals(path, header, True, self.dtype)
+            else:
+                source = wf.rdsamp(path, return_res=32 if self.dtype == np.float32 else 64)[0].astype(self.dtype)
+            mapping = [header.sig_name.index(signal) if signal in header.sig_name else -1
+                       for signal in self.layout.sig_name]
+        with self.lock:
+            self.cache[k] = (source, mapping)
+            while len(self.cache) > self.cache_segments:
+                self.cache.popitem(last=False)
+        return source, mapping
+
+    def read(self, start: int = 0, stop: int = None, channels: list = None) -> np.ndarray:
+        """
+        Function reading a block of samples from the segments it overlaps
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Numpy ndarray of physical values (NaN for missing signals and null segments)
+        """
+        start, stop = self._check_bounds(start, stop)
+        channels = self._check_channels(channels)
+        out = np.full((stop - start, len(channels)), np.nan, dtype=self.dtype)
+        if stop == start:
+            return out
+        first, last = bisect.bisect_right(self.starts, start) - 1, bisect.bisect_left(self.starts, stop)
+        for k in range(first, last):
+            source, mapping = self._get_segment(k)
+            wanted = [(i, mapping[c]) for i, c in enumerate(channels) if source is not None and mapping[c] >= 0]
+            if not wanted:
+                continue
+            offset = self.starts[k]
+            low, high = max(start, offset), min(stop, self.starts[k + 1])
+            columns = [j for _, j in wanted]
+            if isinstance(source, SignalSource):
+                block = source.read(low - offset, high - offset, columns)
+            else:
+                block = source[low - offset: high - offset, columns]
+            out[low - start: high - start, [i for i, _ in wanted]] = block
+        return out
+
+    def iter_chunks(self, chunk_size: int, start: int = 0, stop: int = None, channels: list = None):
+        """
+        Function iterating over the samples segment by segment, by blocks of at most chunk_size rows
+        :param chunk_size: Number of samples per block
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Generator of tuples (index of the first sample of the block, block)
+        """
+        if chunk_size is None or chunk_size <= 0:
+            raise ValueError("The chunk size must be a strictly positive integer.")
+        start, stop = self._check_bounds(start, stop)
+        for segment in self.segments:
+            low, high = max(start, segment["start"]), min(stop, segment["stop"])
+            for offset in range(low, high, chunk_size):
+                yield offset, self.read(offset, min(offset + chunk_size, high), channels)
+
+    def get_infos(self) -> dict:
+        """
+        Function returning the record information (same fields as wfdb.rdsamp)
+        :return: Dictionary
+        """
+        return {
+            "fs": self.header.fs,
+            "sig_len": self.shape[0],
+            "n_sig": self.shape[1],
+            "base_date": self.header.base_date,
+            "base_time": self.header.base_time,
+            "units": self.layout.units,
+            "sig_name": self.layout.sig_name,
+            "comments": self.header.comments or []
+        }
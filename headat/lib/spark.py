@@ -0,0 +1,107 @@
+from .constants import *
+from .streaming import chunk_to_frame
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# SparkSession shared by every HDView of the process (see get_spark_session())
+_spark = {"session": None}
+
+
+def get_spark_session(master: str = None, app_name: str = SPARK_APP_NAME, config: dict = None):
+    """
+    Function returning the SparkSession shared by the HDViews (created on the first call)
+    Arrow-based transfers between pandas and Spark are enabled
+    :param master: Spark master URL (HEADAT_SPARK_MASTER environment variable, local[*] by default)
+    :param app_name: Name of the Spark application
+    :param config: Dictionary of additional Spark configuration options
+    :return: pyspark.sql.SparkSession
+    """
+    from pyspark.sql import SparkSession
+
+    session = _spark["session"]
+    if session is not None and session.sparkContext._jsc is not None:
+        return session
+
+    builder = SparkSession.builder.master(master or DEFAULT_SPARK_MASTER).appName(app_name)
+    for key, value in {**SPARK_DEFAULT_CONFIG, **(config or {})}.items():
+        builder = builder.config(key, value)
+    _spark["session"] = builder.getOrCreate()
+    return _spark["session"]
+
+
+def stop_spark_session() -> None:
+    """
+    Function stopping the SparkSession shared by the HDViews
+    """
+    if _spark["session"] is not None:
+        print("Shutting down current SparkContext")
+        _spark["session"].stop()
+        _spark["session"] = None
+
+
+def stage_record(record: str, filename: str, lazy: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """
+    Function writing a record to a Parquet file with an additional "id" column (sample index)
+    :param record: Record name
+    :param filename: Path of the Parquet file
+    :param lazy: If set to True, the record is memory-mapped (see HDView.add_record())
+    :param chunk_size: Number of samples per row group
+    :return: Path of the Parquet file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from ..main import HDView
+
+    view = HDView(record, lazy=lazy)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    writer = None
+    try:
+        for offset, block in view.iter_chunks(chunk_size):
+            df = chunk_to_frame(offset, block, view.columns)
+            df.index.name = "id"
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            if writer is None:
+                writer = pq.ParquetWriter(filename, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return filename
+
+
+def load_records_spark(records: list, staging_folder: str, spark=None, workers: int = None, lazy: bool = True,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Function loading many records into one Spark DataFrame partitioned by record
+    The records are staged in parallel as Parquet files (staging_folder/record=<name>/) which
+    are then read by Spark without going through the driver memory
+    :param records: List of record names
+    :param staging_folder: Folder of the staged Parquet files
+    :param spark: SparkSession (shared session if None)
+    :param workers: Number of staging processes (number of CPUs if None, 0 to stage in the current process)
+    :param lazy: If set to True, the records are memory-mapped (see HDView.add_record())
+    :param chunk_size: Number of samples per row group
+    :return: pyspark.sql.DataFrame with a "record" partition column and an "id" (sample index) column
+    """
+    if not records:
+        raise ValueError("At least one record has to be specified.")
+
+    # Partition names (made unique when several records share the same basename)
+    filenames = []
+    names = {}
+    for record in records:
+        name = os.path.basename(record)
+        names[name] = names.get(name, 0) + 1
+        if names[name] > 1:
+            name = f"{name}_{names[name] - 1}"
+        filenames.append(os.path.join(staging_folder, f"record={name}", "part-00000.parquet"))
+
+    if workers == 0:
+        for record, filename in zip(records, filenames):
+            stage_record(record, filename, lazy, chunk_size)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(stage_record, records, filenames, [lazy] * len(records), [chunk_size] * len(records)))
+
+    spark = spark or get_spark_session()
+    return spark.read.option("mergeSchema", "true").parquet(staging_folder)
@@ -0,0 +1,251 @@
+"""
+Chunked bulk loader of the records into SQL databases (SQLAlchemy)
+
+Schema (every table name is prefixed, "headat_" by default), shared by all the loaded records:
+    - records: 1 row per loaded record (record_id, name, fs, sig_len, base_date, ..., infos as JSON)
+    - channels: 1 row per signal of each record (record_id, channel, column of the samples table, units, ...)
+    - samples: 1 row per sample (record_id, sample, time in seconds, 1 column per signal), primary key
+    (record_id, sample) and index (record_id, time). The columns of the signals which are not in the
+    table yet are added when a record is appended (NULL for the other records).
+The samples are inserted block by block inside a single transaction per record (a failed load leaves
+no partial record) with the executemany() method of the DB-API cursor or with multi-row INSERTs.
+"""
+from .constants import *
+from .store import _to_json
+import datetime
+import itertools
+import json
+import numpy as np
+
+# Columns of the samples table which cannot be used by the signals
+SQL_RESERVED_COLUMNS = ["record_id", "sample", "time"]
+
+
+def get_sql_columns(columns: list) -> list:
+    """
+    Function returning the names of the columns of the signals in the samples table
+    (names colliding with the reserved columns are prefixed by "sig_")
+    :param columns: Names of the signals
+    :return: List of column names
+    """
+    return [f"sig_{k}" if k in SQL_RESERVED_COLUMNS else str(k) for k in columns]
+
+
+def get_sql_tables(prefix: str, columns: list, dtype, metadata=None) -> tuple:
+    """
+    Function declaring the records, channels and samples tables
+    :param prefix: Prefix of the table names
+    :param columns: Names of the columns of the signals in the samples table
+    :param dtype: dtype of the samples (integer or floating-point columns)
+    :param metadata: sqlalchemy.MetaData (a new one is created if None)
+    :return: Tuple (records, channels, samples) of sqlalchemy.Table
+    """
+    import sqlalchemy as sa
+
+    metadata = sa.MetaData() if metadata is None else metadata
+    value_type = sa.BigInteger if np.dtype(dtype).kind in ["i", "u"] else sa.Float
+    records = sa.Table(
+        f"{prefix}records", metadata,
+        sa.Column("record_id", sa.Integer, primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(255)),
+        sa.Column("title", sa.String(255)),
+        sa.Column("fs", sa.Float),
+        sa.Column("sig_len", sa.BigInteger),
+        sa.Column("n_sig", sa.Integer),
+        sa.Column("base_date", sa.String(10)),
+        sa.Column("base_time", sa.String(15)),
+        sa.Column("comments", sa.Text),
+        sa.Column("infos", sa.Text),
+        sa.Column("loaded_at", sa.DateTime),
+    )
+    channels = sa.Table(
+        f"{prefix}channels", metadata,
+        sa.Column("record_id", sa.Integer, sa.ForeignKey(f"{prefix}records.record_id"), primary_key=True),
+        sa.Column("channel", sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column("column_name", sa.String(255)),
+        sa.Column("sig_name", sa.String(255)),
+        sa.Column("units", sa.String(63)),
+        sa.Column("fmt", sa.String(15)),
+        sa.Column("adc_gain", sa.Float),
+        sa.Column("baseline", sa.BigInteger),
+    )
+    samples = sa.Table(
+        f"{prefix}samples", metadata,
+        sa.Column("record_id", sa.Integer, sa.ForeignKey(f"{prefix}records.record_id"), primary_key=True,
+                  autoincrement=False),
+        sa.Column("sample", sa.BigInteger, primary_key=True, autoincrement=False),
+        sa.Column("time", sa.Float, nullable=False),
+        *[sa.Column(k, value_type) for k in columns],
+        sa.Index(f"{prefix}samples_time", "record_id", "time"),
+    )
+    return records, channels, samples
+
+
+def prepare_sql_tables(connection, prefix: str, columns: list, dtype, if_exists: str = "append") -> tuple:
+    """
+    Function creating the tables (or adding the missing columns of the signals to the samples table)
+    :param connection: sqlalchemy.Connection
+    :param prefix: Prefix of the table names
+    :param columns: Names of the columns of the signals in the samples table
+    :param dtype: dtype of the samples
+    :param if_exists: Behavior if the tables already exist: "append", "replace" (drop them) or "fail"
+    :return: Tuple (records, channels, samples) of sqlalchemy.Table
+    """
+    import sqlalchemy as sa
+    from sqlalchemy.schema import CreateColumn
+
+    if if_exists not in ["append", "replace", "fail"]:
+        raise ValueError("if_exists must be either 'append', 'replace' or 'fail'.")
+    records, channels, samples = get_sql_tables(prefix, columns, dtype)
+    inspector = sa.inspect(connection)
+    if inspector.has_table(samples.name):
+        if if_exists == "fail":
+            raise ValueError(f"The table {samples.name} already exists.")
+        if if_exists == "replace":
+            records.metadata.drop_all(connection)
+        else:
+            existing = {k["name"] for k in inspector.get_columns(samples.name)}
+            preparer = connection.dialect.identifier_preparer
+            for column in samples.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {preparer.format_table(samples)} ADD COLUMN {ddl}")
+    records.metadata.create_all(connection)
+    return records, channels, samples
+
+
+def write_record_sql(connection, chunks, columns: list, infos: dict, dtype, name: str = None, title: str = None,
+                     prefix: str = DEFAULT_SQL_PREFIX, if_exists: str = "append", method: str = "multi",
+                     batch_size: int = DEFAULT_SQL_BATCH_SIZE) -> int:
+    """
+    Function loading a record into the tables (the caller handles the transaction)
+    :param connection: sqlalchemy.Connection
+    :param chunks: Iterable of (index of the first sample, block of samples) tuples covering the record
+    :param columns: Names of the signals
+    :param infos: Record information dictionary (see HDView.get_info())
+    :param dtype: dtype of the samples
+    :param name: Record name
+    :param title: Title of the view
+    :param prefix: Prefix of the table names
+    :param if_exists: Behavior if the tables already exist (see prepare_sql_tables())
+    :param method: Insertion method:
+        - "multi": multi-row INSERT ... VALUES statements of up to batch_size rows (fewest statements, about
+        3 times faster than executemany() on SQLite)
+        - "executemany": batches of rows sent to the executemany() method of the DB-API cursor
+        The drivers with named placeholders (e.g. psycopg2) receive the batches through SQLAlchemy, which
+        sends them as multi-row INSERTs ("insertmanyvalues") in both cases
+    :param batch_size: Number of rows per executemany() call or per multi-row INSERT
+    :return: Identifier of the record (record_id column)
+    """
+    if method not in ["multi", "executemany"]:
+        raise ValueError("The insertion method must be either 'multi' or 'executemany'.")
+    sql_columns = get_sql_columns(columns)
+    records, channels, samples = prepare_sql_tables(connection, prefix, sql_columns, dtype, if_exists)
+
+    # Metadata of the record and of its signals
+    record_id = connection.execute(records.insert().values(
+        name=name,
+        title=title,
+        fs=float(infos["fs"]),
+        sig_len=int(infos["sig_len"]),
+        n_sig=int(infos["n_sig"]),
+        base_date=infos["base_date"].isoformat() if infos.get("base_date") is not None else None,
+        base_time=infos["base_time"].isoformat() if infos.get("base_time") is not None else None,
+        comments="\n".join(infos.get("comments") or []),
+        infos=json.dumps(infos, default=_to_json),
+        loaded_at=datetime.datetime.now()
+    )).inserted_primary_key[0]
+
+    def field(key: str, k: int):
+        values = infos.get(key)
+        return values[k] if values is not None and k < len(values) else None
+
+    connection.execute(channels.insert(), [{
+        "record_id": record_id,
+        "channel": k,
+        "column_name": column,
+        "sig_name": field("sig_name", k),
+        "units": field("units", k),
+        "fmt": None if field("fmt", k) is None else str(field("fmt", k)),
+        "adc_gain": None if field("adc_gain", k) is None else float(field("adc_gain", k)),
+        "baseline": None if field("baseline", k) is None else int(field("baseline", k))
+    } for k, column in enumerate(sql_columns)])
+
+    # Samples: the rows are built from the columns of the blocks (tolist() converts them at C speed)
+    keys = SQL_RESERVED_COLUMNS + sql_columns
+    compiled = samples.insert().compile(dialect=connection.dialect, column_keys=keys)
+    statement = str(compiled)
+    # Multi-row INSERTs are built by repeating the VALUES group for the drivers with anonymous
+    # placeholders; the other drivers get the rows as dictionaries (batched by SQLAlchemy itself)
+    anonymous = connection.dialect.paramstyle in ["qmark", "format"]
+    order = [keys.index(k) for k in compiled.positiontup] if anonymous else None
+    if method == "multi" and anonymous:
+        # Bounded by the maximum number of parameters per statement (999 before SQLite 3.32)
+        max_parameters = SQL_MAX_PARAMETERS
+        if connection.dialect.name == "sqlite" and connection.dialect.dbapi.sqlite_version_info < (3, 32):
+            max_parameters = 999
+        batch_size = max(1, min(batch_size, max_parameters // len(keys)))
+        head, group = statement[: statement.rindex("(")], statement[statement.rindex("("):]
+        statements = {}
+    cursor = connection.connection.cursor()
+
+    fs = float(infos["fs"])
+    try:
+        for offset, block in chunks:
+            block = np.asarray(block)
+            values = [itertools.repeat(record_id, len(block)), range(offset, offset + len(block)),
+                      (np.arange(offset, offset + len(block)) / fs).tolist()] + \
+                     [block[:, k].tolist() for k in range(block.shape[1])]
+            if not anonymous:
+                rows = [dict(zip(keys, row)) for row in zip(*values)]
+            else:
+                rows = list(zip(*[values[k] for k in order]))
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start: start + batch_size]
+                if not anonymous:
+                    connection.execute(samples.insert(), batch)
+                elif method == "multi":
+                    if len(batch) not in statements:
+                        statements[len(batch)] = head + ", ".join([group] * len(batch))
+                    cursor.execute(statements[len(batch)], [k for row in batch for k in row])
+                else:
+                    cursor.executemany(statement, batch)
+    finally:
+        cursor.close()
+    return record_id
+
+
+def load_records_sql(records: list, url: str, lazy: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     prefix: str = DEFAULT_SQL_PREFIX, if_exists: str = "append", method: str = "multi",
+                     batch_size: int = DEFAULT_SQL_BATCH_SIZE) -> list:
+    """
+    Function loading many records into one SQL database (1 transaction per record)
+    :param records: List of record names
+    :param url: SQLAlchemy database URL (e.g. "sqlite:///records.db") or sqlalchemy.Engine
+    :param lazy: If set to True, the records are memory-mapped (see HDView.add_record())
+    :param chunk_size: Number of samples read per block
+    :param prefix: Prefix of the table names
+    :param if_exists: Behavior if the tables already exist (applied to the first record, the next ones are appended)
+    :param method: Insertion method (see write_record_sql())
+    :param batch_size: Number of rows per insertion call
+    :return: List of the record identifiers (record_id column)
+    """
+    import sqlalchemy as sa
+    from ..main import HDView
+
+    if not records:
+        raise ValueError("At least one record has to be specified.")
+    engine = sa.create_engine(url) if isinstance(url, str) else url
+    record_ids = []
+    try:
+        for k, record in enumerate(records):
+            view = HDView(record, lazy=lazy)
+            with engine.begin() as connection:
+                record_ids.append(write_record_sql(connection, view.iter_chunks(chunk_size), view.columns,
+                                                   view.get_info(), view.get_signals().dtype, view.record,
+                                                   view.title, prefix, if_exists if k == 0 else "append",
+                                                   method, batch_size))
+    finally:
+        if isinstance(url, str):
+            engine.dispose()
+    return record_ids
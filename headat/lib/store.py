@@ -0,0 +1,270 @@
+"""
+HEADAT-native signal store (.hds files)
+
+A store keeps every signal as a sequence of compressed, time-chunked arrays so that
+a reader only decompresses the chunks overlapping the requested [start, stop) range
+of the requested channels. File layout:
+    - STORE_MAGIC (8 bytes)
+    - compressed chunks (1 chunk = chunk_size samples of 1 signal)
+    - JSON index: dtype, shape, columns, record information and (position, size) of every chunk
+    - size of the JSON index (8 bytes, little-endian) followed by STORE_MAGIC
+"""
+from .constants import *
+from .signals import SignalSource
+import bisect
+import bz2
+import collections
+import datetime
+import json
+import lzma
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+
+# Compression codecs: name --> (compress(data, level), decompress(data))
+STORE_CODECS = {
+    "none": (lambda data, level: data, lambda data: data),
+    "zlib": (lambda data, level: zlib.compress(data, 6 if level is None else level), zlib.decompress),
+    "bz2": (lambda data, level: bz2.compress(data, 9 if level is None else level), bz2.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+
+
+def _shuffle(column: np.ndarray) -> bytes:
+    """
+    Function grouping the bytes of the samples by significance (byte-shuffle filter)
+    The most significant bytes of neighbouring samples are often identical, which
+    greatly improves the compression ratio of the signals
+    """
+    return column.view(np.uint8).reshape(-1, column.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, dtype: np.dtype) -> np.ndarray:
+    """
+    Function reverting the byte-shuffle filter (see _shuffle())
+    """
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, -1)
+    return np.ascontiguousarray(raw.T).view(dtype).ravel()
+
+
+def _to_json(value):
+    """
+    Function converting the values of the record information which are not JSON-serializable
+    """
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_store(filename: str, chunks, columns: list, dtype=None, infos: dict = None, compression: str = "zlib",
+                level: int = None, shuffle: bool = True) -> dict:
+    """
+    Function writing blocks of samples to a HEADAT store
+    Every block is stored as 1 compressed chunk per signal
+    :param filename: Path of the .hds file
+    :param chunks: Iterable of Numpy ndarray blocks of samples (or of (index of the first sample, block) tuples)
+    :param columns: Names of the signals
+    :param dtype: dtype of the stored samples (dtype of the first block if None)
+    :param infos: Record information dictionary (see HDView.get_info())
+    :param compression: Compression codec (see STORE_CODECS)
+    :param level: Compression level (default level of the codec if None)
+    :param shuffle: If set to True, the bytes of the samples are shuffled before the compression
+    :return: Index of the store
+    """
+    if compression not in STORE_CODECS:
+        raise ValueError(f"Unsupported compression: {compression} (available: {', '.join(STORE_CODECS)})")
+    compress = STORE_CODECS[compression][0]
+    index = {
+        "version": STORE_VERSION,
+        "dtype": None,
+        "shape": [0, len(columns)],
+        "columns": list(columns),
+        "compression": compression,
+        "shuffle": bool(shuffle),
+        "starts": [],
+        "chunks": [[] for _ in columns],
+        "infos": infos or {}
+    }
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(STORE_MAGIC)
+        for block in chunks:
+            if isinstance(block, tuple):
+                block = block[1]
+            if dtype is None:
+                dtype = block.dtype
+            block = np.asarray(block, dtype=np.dtype(dtype).newbyteorder("<"))
+            if block.ndim != 2 or block.shape[1] != len(columns):
+                raise ValueError("The blocks must be 2-dimensional arrays with 1 column per signal.")
+            if len(block) == 0:
+                continue
+            index["starts"].append(index["shape"][0])
+            index["shape"][0] += len(block)
+            for k in range(len(columns)):
+                column = np.ascontiguousarray(block[:, k])
+                data = compress(_shuffle(column) if shuffle else column.tobytes(), level)
+                index["chunks"][k].append([f.tell(), len(data)])
+                f.write(data)
+        index["dtype"] = np.dtype(dtype or np.float64).newbyteorder("<").str
+        footer = json.dumps(index, default=_to_json).encode("utf-8")
+        f.write(footer)
+        f.write(struct.pack("<Q", len(footer)))
+        f.write(STORE_MAGIC)
+    os.replace(tmp_filename, filename)
+    return index
+
+
+def read_store_index(filename: str) -> dict:
+    """
+    Function reading the index of a HEADAT store
+    :param filename: Path of the .hds file
+    :return: Dictionary
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(STORE_MAGIC)) != STORE_MAGIC:
+            raise ValueError(f"{filename} is not a HEADAT store.")
+        f.seek(-len(STORE_MAGIC) - 8, os.SEEK_END)
+        size, magic = struct.unpack("<Q", f.read(8))[0], f.read(len(STORE_MAGIC))
+        if magic != STORE_MAGIC:
+            raise ValueError(f"The HEADAT store {filename} is truncated.")
+        f.seek(-len(STORE_MAGIC) - 8 - size, os.SEEK_END)
+        index = json.loads(f.read(size).decode("utf-8"))
+    if index["version"] > STORE_VERSION:
+        raise ValueError(f"The HEADAT store {filename} has been written by a newer version of HEADAT.")
+    return index
+
+
+class StoreSignals(SignalSource):
+    """
+    Signal source reading a HEADAT store
+    Only the chunks overlapping the requested rows and columns are read and decompressed
+    (the most recently decompressed chunks are kept in a small cache)
+    """
+
+    def __init__(self, filename: str, dtype=None, cache_chunks: int = STORE_CACHE_CHUNKS) -> None:
+        """
+        Constructor function opening a HEADAT store
+        :param filename: Path of the .hds file
+        :param dtype: dtype of the returned samples (stored dtype if None)
+        :param cache_chunks: Maximum number of decompressed chunks kept in memory
+        """
+        self.filename = filename
+        self.index = read_store_index(filename)
+        self.stored_dtype = np.dtype(self.index["dtype"])
+        super().__init__(self.index["shape"][0], self.index["shape"][1],
+                         self.stored_dtype.newbyteorder("=") if dtype is None else dtype)
+        self.columns = self.index["columns"]
+        self.starts = self.index["starts"] + [self.shape[0]]
+        self.decompress = STORE_CODECS[self.index["compression"]][1]
+        self.cache_chunks = cache_chunks
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.file = None
+
+    def _check_channels(self, channels) -> list:
+        """
+        Function normalizing a channel selection (signal indexes and/or names) into a list of signal indexes
+        :return: List of signal indexes
+        """
+        if isinstance(channels, str):
+            channels = [channels]
+        if isinstance(channels, (list, tuple)):
+            names = self.index["infos"].get("sig_name") or self.columns
+            for k in channels:
+                if isinstance(k, str) and k not in self.columns and k not in names:
+                    raise KeyError(f"Unknown signal: {k}")
+            channels = [(self.columns.index(k) if k in self.columns else names.index(k)) if isinstance(k, str) else k
+                        for k in channels]
+        return super()._check_channels(channels)
+
+    def _read_chunk(self, channel: int, chunk: int) -> np.ndarray:
+        """
+        Function returning the decompressed samples of 1 chunk of 1 signal
+        :return: Numpy ndarray (read-only)
+        """
+        key = (channel, chunk)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            if self.file is None:
+                self.file = open(self.filename, "rb")
+            position, size = self.index["chunks"][channel][chunk]
+            self.file.seek(position)
+            data = self.file.read(size)
+
+        # Decompression outside of the lock (zlib, bz2 and lzma release the GIL)
+        data = self.decompress(data)
+        if self.index["shuffle"]:
+            samples = _unshuffle(data, self.stored_dtype)
+        else:
+            samples = np.frombuffer(data, dtype=self.stored_dtype)
+
+        with self.lock:
+            self.cache[key] = samples
+            while len(self.cache) > self.cache_chunks:
+                self.cache.popitem(last=False)
+        return samples
+
+    def read(self, start: int = 0, stop: int = None, channels: list = None) -> np.ndarray:
+        """
+        Function reading a block of samples
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes or names to read (all signals if None)
+        :return: Numpy ndarray of shape (stop - start, len(channels))
+        """
+        start, stop = self._check_bounds(start, stop)
+        channels = self._check_channels(channels)
+        out = np.empty((stop - start, len(channels)), dtype=self.dtype)
+        if stop == start:
+            return out
+        first, last = bisect.bisect_right(self.starts, start) - 1, bisect.bisect_left(self.starts, stop)
+        for chunk in range(first, last):
+            low, high = max(start, self.starts[chunk]), min(stop, self.starts[chunk + 1])
+            for i, k in enumerate(channels):
+                samples = self._read_chunk(k, chunk)
+                out[low - start: high - start, i] = samples[low - self.starts[chunk]: high - self.starts[chunk]]
+        return out
+
+    def get_infos(self) -> dict:
+        """
+        Function returning the record information saved in the store
+        :return: Dictionary
+        """
+        infos = dict(self.index["infos"])
+        if isinstance(infos.get("base_date"), str):
+            infos["base_date"] = datetime.date.fromisoformat(infos["base_date"])
+        if isinstance(infos.get("base_time"), str):
+            infos["base_time"] = datetime.time.fromisoformat(infos["base_time"])
+        infos.setdefault("sig_name", list(self.columns))
+        infos["sig_len"], infos["n_sig"] = self.shape
+        return infos
+
+    def get_compression_ratio(self) -> float:
+        """
+        Function returning the ratio between the raw size of the samples and their stored size
+        :return: Float
+        """
+        stored = sum(size for chunks in self.index["chunks"] for _, size in chunks)
+        return self.shape[0] * self.shape[1] * self.stored_dtype.itemsize / stored if stored else 1.0
+
+    def close(self) -> None:
+        """
+        Function closing the store file and releasing the cached chunks
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,192 @@
+"""
+Chunked (streaming) writers used by the HDView exporters
+
+Every writer receives a read_chunks(channels=None) callable returning a generator
+of (index of the first sample, block of samples) tuples, so that only one block of
+samples is held in memory at a time. The written files are identical (or read back
+identically) to the ones produced by the corresponding pandas methods.
+"""
+from .constants import *
+import io
+import numpy as np
+import pandas as pd
+from .text import write_text
+
+
+def chunk_to_frame(offset: int, block: np.ndarray, columns: list) -> pd.DataFrame:
+    """
+    Function wrapping a block of samples into a DataFrame indexed by the sample number
+    :param offset: Index of the first sample of the block
+    :param block: Numpy ndarray of samples
+    :param columns: Names of the columns
+    :return: Pandas DataFrame
+    """
+    return pd.DataFrame(block, columns=columns, index=pd.RangeIndex(offset, offset + len(block)), copy=False)
+
+
+def stream_csv(read_chunks, columns: list, filename: str, **kwargs) -> None:
+    """
+    Function writing the record to a CSV (or custom text) file block by block
+    :param read_chunks: Callable returning the generator of blocks
+    :param columns: Names of the columns
+    :param filename: Output filename
+    """
+    kwargs.pop("header", None)
+    kwargs.pop("mode", None)
+    with open(filename, "w", newline="") as f:
+        for k, (offset, block) in enumerate(read_chunks()):
+            chunk_to_frame(offset, block, columns).to_csv(f, header=(k == 0), **kwargs)
+
+
+def stream_json(read_chunks, columns: list, filename: str, orient: str = "columns", lines: bool = False, **kwargs) -> None:
+    """
+    Function writing the record to a JSON file block by block
+    Supported layouts are orient="columns" (pandas default) and orient="records" (optionally with lines=True)
+    :param read_chunks: Callable returning the generator of blocks
+    :param columns: Names of the columns
+    :param filename: Output filename
+    :param orient: JSON layout
+    :param lines: If set to True (with orient="records"), writes 1 JSON object per line
+    """
+    if orient not in ["columns", "records"] or (lines and orient != "records"):
+        raise ValueError("Streaming JSON export only supports the 'columns' and 'records' orientations.")
+
+    with open(filename, "w") as f:
+        if orient == "columns":
+            # Column-major layout: each signal is streamed separately
+            f.write("{")
+            for j, column in enumerate(columns):
+                # Encoding the column name exactly as pandas does ('{"name":{}}' --> '"name":')
+                f.write(("," if j else "") + pd.DataFrame({column: []}).to_json()[1:-3] + "{")
+                first = True
+                for offset, block in read_chunks(channels=[j]):
+                    body = chunk_to_frame(offset, block, [column])[column].to_json(**kwargs)[1:-1]
+                    if body:
+                        f.write(("" if first else ",") + body)
+                        first = False
+                f.write("}")
+            f.write("}")
+        elif lines:
+            for offset, block in read_chunks():
+                f.write(chunk_to_frame(offset, block, columns).to_json(orient="records", lines=True, **kwargs))
+        else:
+            f.write("[")
+            first = True
+            for offset, block in read_chunks():
+                body = chunk_to_frame(offset, block, columns).to_json(orient="records", **kwargs)[1:-1]
+                if body:
+                    f.write(("" if first else ",") + body)
+                    first = False
+            f.write("]")
+
+
+def stream_ndjson(read_chunks, columns: list, filename: str, **kwargs) -> None:
+    """
+    Function writing the record to a NDJSON file block by block with the vectorized text engine
+    :param read_chunks: Callable returning the generator of blocks
+    :param columns: Names of the columns
+    :param filename: Output filename
+    """
+    write_text(read_chunks(), columns, filename, "ndjson", **kwargs)
+
+
+def stream_xml(read_chunks, columns: list, filename: str, root_name: str = "data", **kwargs) -> None:
+    """
+    Function writing the record to an XML file block by block
+    :param read_chunks: Callable returning the generator of blocks
+    :param columns: Names of the columns
+    :param filename: Output filename
+    :param root_name: Name of the root element
+    """
+    opening, closing = f"<{root_name}>", f"</{root_name}>"
+    footer = ""
+    with open(filename, "w", encoding=kwargs.get("encoding", "utf-8"), newline="") as f:
+        for k, (offset, block) in enumerate(read_chunks()):
+            # Rendering through a buffer (same output as when pandas writes the file itself)
+            buffer = io.BytesIO()
+            chunk_to_frame(offset, block, columns).to_xml(buffer, root_name=root_name, **kwargs)
+            text = buffer.getvalue().decode(kwargs.get("encoding", "utf-8"))
+            head_end = text.index(opening) + len(opening)
+            tail_start = text.rindex(closing)
+            if k == 0:
+                f.write(text[:head_end])
+            body = text[head_end:tail_start].rstrip("\n")
+            f.write(body)
+            # Keeping the line break (pretty print) before the closing root element
+            footer = text[head_end + len(body):]
+        f.write(footer)
+
+
+def stream_parquet(read_chunks, columns: list, filename: str, compression: str = "snappy", **kwargs) -> None:
+    """
+    Function writing the record to an Apache Parquet file (1 row group per block)
+    :param read_chunks: Callable returning the generator of blocks
+    :param columns: Names of the columns
+    :param filename: Output filename
+    :param compression: Parquet compression codec
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for offset, block in read_chunks():
+            table = pa.Table.from_pandas(chunk_to_frame(offset, block, columns), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(filename, table.schema, compression=compression, **kwargs)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def stream_feather(read_chunks, columns: list, filename: str, compression: str = "lz4", **kwargs) -> None:
+    """
+    Function writing the record to a Feather (Arrow IPC) file (1 record batch per block)
+    :param read_chunks: Callable returning the generator of blocks
+    :param columns: Names of the columns
+    :param filename: Output filename
+    :param compression: Arrow IPC compression codec ("lz4", "zstd" or "uncompressed")
+    """
+    import pyarrow as pa
+
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == "uncompressed" else compression)
+    writer = None
+    try:
+        for offset, block in read_chunks():
+            batch = pa.RecordBatch.from_pandas(chunk_to_frame(offset, block, columns), preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_file(filename, batch.schema, options=options)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def stream_hdf5(read_chunks, columns: list, filename: str, key: str = "df", **kwargs) -> None:
+    """
+    Function writing the record to an HDF5 file block by block
+    The data is appended to a PyTables "table" (the "fixed" format of pandas cannot be appended)
+    :param read_chunks: Callable returning the generator of blocks
+    :param columns: Names of the columns
+    :param filename: Output filename
+    :param key: Identifier of the group inside the HDF5 file
+    """
+    kwargs.pop("mode", None)
+    kwargs.pop("format", None)
+    with pd.HDFStore(filename, mode="w") as store:
+        for offset, block in read_chunks():
+            store.append(key, chunk_to_frame(offset, block, columns), format="table", **kwargs)
+
+
+# Registry of the streaming writers (format name --> writer)
+STREAM_WRITERS = {
+    "text": stream_csv,
+    "csv": stream_csv,
+    "json": stream_json,
+    "ndjson": stream_ndjson,
+    "xml": stream_xml,
+    "parquet": stream_parquet,
+    "feather": stream_feather,
+    "hdf5": stream_hdf5,
+}
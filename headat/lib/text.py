@@ -0,0 +1,326 @@
+"""
+Vectorized text writer of the records (CSV, custom text and NDJSON)
+
+The blocks of samples are formatted with NumPy operations instead of the per-value formatting of
+pandas: every value is scaled to an integer whose digits are written into a matrix of ASCII bytes
+(1 row per sample, NUL bytes padding the fields), then the NUL bytes are dropped to get the lines.
+    - precision=None: the floating-point values are written as their shortest representation, as
+    pandas does (the number of decimals of each column is detected per block, the columns which cannot
+    be written exactly this way fall back to the NumPy float to string conversion)
+    - precision=k: the floating-point values are written with k decimals ("%.kf", as float_format does)
+The blocks are formatted on a pool of threads (the NumPy operations release the GIL) while the calling
+thread writes them to the file in order.
+"""
+from .constants import *
+import collections
+import json
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+# Powers of 10 used to count the digits of unsigned 64-bit integers
+_POWERS_OF_10 = 10 ** np.arange(1, 20, dtype=np.uint64)
+
+# Keyword arguments of DataFrame.to_csv() supported by the text engine
+TEXT_ENGINE_OPTIONS = ["sep", "index_label", "na_rep", "lineterminator"]
+
+
+def _count_digits(values: np.ndarray) -> np.ndarray:
+    """
+    Function counting the decimal digits of unsigned integers
+    :param values: Numpy ndarray of uint64
+    :return: Numpy ndarray of the numbers of digits
+    """
+    return 1 + np.searchsorted(_POWERS_OF_10, values, side="right")
+
+
+def _write_digits(values: np.ndarray, width: int) -> np.ndarray:
+    """
+    Function writing unsigned integers as zero-padded ASCII digits
+    :param values: Numpy ndarray of uint64
+    :param width: Number of digits written per value
+    :return: Numpy ndarray of uint8 of shape (values, width)
+    """
+    chars = np.empty((len(values), width), dtype=np.uint8)
+    rest = values.copy()
+    for j in range(width - 1, -1, -1):
+        chars[:, j] = rest % 10
+        rest //= 10
+    chars += ord("0")
+    return chars
+
+
+def _format_unsigned(values: np.ndarray, negative: np.ndarray = None) -> np.ndarray:
+    """
+    Function writing integers given by their absolute values and signs (right-aligned, NUL-padded)
+    :param values: Numpy ndarray of uint64 (absolute values)
+    :param negative: Numpy ndarray of booleans (minus signs), no sign if None
+    :return: Numpy ndarray of uint8 of shape (values, width)
+    """
+    digits = _count_digits(values)
+    width = int(digits.max(initial=1))
+    chars = _write_digits(values, width)
+    chars[np.arange(width) < (width - digits)[:, None]] = 0
+    if negative is not None and negative.any():
+        chars = np.concatenate([np.zeros((len(values), 1), dtype=np.uint8), chars], axis=1)
+        rows = np.flatnonzero(negative)
+        chars[rows, width - digits[rows]] = ord("-")
+    return chars
+
+
+def _format_integers(values: np.ndarray) -> np.ndarray:
+    """
+    Function writing signed or unsigned integers
+    :param values: Numpy ndarray of integers
+    :return: Numpy ndarray of uint8 of shape (values, width)
+    """
+    if values.dtype.kind == "u":
+        return _format_unsigned(values.astype(np.uint64))
+    values = values.astype(np.int64)
+    # The absolute value of the smallest int64 wraps around but is correct once viewed as uint64
+    return _format_unsigned(np.abs(values).view(np.uint64), values < 0)
+
+
+def _split(values: np.ndarray) -> tuple:
+    """
+    Function splitting floats into 2 halves of 26 bits (Dekker's algorithm)
+    """
+    scaled = values * 134217729.0
+    high = scaled - (scaled - values)
+    return high, values - high
+
+
+def _round_scaled(values: np.ndarray, precision: int) -> np.ndarray:
+    """
+    Function rounding values * 10 ** precision to the nearest integer (half to even) as printf() does,
+    that is from the exact product and not from the rounded one (e.g. 0.0061725 * 10 ** 6 is rounded up
+    as its binary value is slightly above 6172.5, while the rounded product is 6172.5)
+    :param values: Numpy ndarray of finite floats (|value| * 10 ** precision below 2 ** 52)
+    :param precision: Number of decimals
+    :return: Numpy ndarray of rounded floats
+    """
+    scale = 10.0 ** precision
+    product = values * scale
+    rounded = np.rint(product)
+    # Rounding error of the product (exact, as scale is exactly represented)
+    high, low = _split(values)
+    scale_high, scale_low = _split(np.float64(scale))
+    error = ((high * scale_high - product) + high * scale_low + low * scale_high) + low * scale_low
+    # Only the ties of the rounded product can be rounded the other way
+    half = product - rounded
+    rounded += ((half == 0.5) & (error > 0)).astype(np.float64) - ((half == -0.5) & (error < 0))
+    return rounded
+
+
+def _format_fixed(values: np.ndarray, precision: int, strip: bool = False) -> np.ndarray:
+    """
+    Function writing finite floating-point values with a fixed number of decimals
+    :param values: Numpy ndarray of finite floats (|value| * 10 ** precision below 2 ** 52)
+    :param precision: Number of decimals
+    :param strip: If set to True, the trailing zeros of the decimals are removed (at least 1 is kept)
+    :return: Numpy ndarray of uint8 of shape (values, width)
+    """
+    scaled = _round_scaled(np.abs(values), precision).astype(np.uint64)
+    integer, fraction = np.divmod(scaled, np.uint64(10 ** precision))
+    chars = _format_unsigned(integer, np.signbit(values))
+    if not precision:
+        return chars
+    decimals = _write_digits(fraction, precision)
+    if strip:
+        zeros = np.zeros(len(values), dtype=np.int64)
+        for k in range(1, precision):
+            zeros += fraction % np.uint64(10 ** k) == 0
+        decimals[np.arange(precision) >= (precision - zeros)[:, None]] = 0
+    point = np.full((len(values), 1), ord("."), dtype=np.uint8)
+    return np.concatenate([chars, point, decimals], axis=1)
+
+
+def get_shortest_precision(values: np.ndarray):
+    """
+    Function returning the smallest number of decimals writing every value exactly as its shortest
+    representation (as repr() does): the values have to be written without exponent and with at most
+    15 significant digits, so that the decimal number is the only one of its length read back as the value
+    :param values: Numpy ndarray of float64
+    :return: Number of decimals (None if the values cannot be written this way)
+    """
+    finite = values[np.isfinite(values)]
+    magnitude = np.abs(finite)
+    if not len(magnitude):
+        return 0
+    nonzero = magnitude[magnitude != 0]
+    if len(nonzero) and (nonzero.min() < 1e-4 or nonzero.max() >= 1e15):
+        return None
+    for precision in range(0, 16 - len(str(int(magnitude.max())))):
+        scale = 10.0 ** precision
+        if np.array_equal(np.rint(finite * scale) / scale, finite):
+            return precision
+    return None
+
+
+def _fill(chars: np.ndarray, rows: np.ndarray, text: bytes) -> np.ndarray:
+    """
+    Function replacing the fields of some rows by a string
+    :param chars: Numpy ndarray of uint8 of shape (values, width)
+    :param rows: Numpy ndarray of booleans (rows to replace)
+    :param text: Replacing string
+    :return: Numpy ndarray of uint8 (widened if needed)
+    """
+    if not rows.any():
+        return chars
+    if len(text) > chars.shape[1]:
+        padding = np.zeros((len(chars), len(text) - chars.shape[1]), dtype=np.uint8)
+        chars = np.concatenate([padding, chars], axis=1)
+    chars[rows] = 0
+    if text:
+        chars[rows, chars.shape[1] - len(text):] = np.frombuffer(text, dtype=np.uint8)
+    return chars
+
+
+def format_values(values: np.ndarray, precision: int = None, na_rep: str = "", json_mode: bool = False) -> np.ndarray:
+    """
+    Function writing a column of values
+    :param values: Numpy ndarray (1 dimension) of numbers
+    :param precision: Number of decimals of the floating-point values (shortest representation if None)
+    :param na_rep: Representation of the missing (NaN) values
+    :param json_mode: If set to True, the values are written as JSON (NaN and infinite values as null)
+    :return: Numpy ndarray of uint8 of shape (values, width), the fields being padded with NUL bytes
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in ["i", "u"]:
+        return _format_integers(values)
+    if values.dtype.kind == "b":
+        return np.where(values, b"true" if json_mode else b"True", b"false" if json_mode else b"False")[:, None] \
+            .view(np.uint8)
+    if values.dtype.kind != "f":
+        raise TypeError(f"The values of dtype {values.dtype} cannot be written by the text engine.")
+
+    finite = np.isfinite(values)
+    clean = np.where(finite, values, 0.0)
+    magnitude = np.abs(clean).max(initial=0.0)
+    if precision is None:
+        shortest = get_shortest_precision(values) if values.dtype == np.float64 else None
+        if shortest is not None:
+            chars = _format_fixed(clean, max(shortest, 1), strip=True)
+        else:
+            chars = np.ascontiguousarray(values.astype("S32"))[:, None].view(np.uint8)
+    elif magnitude * 10.0 ** precision < 2 ** 52:
+        chars = _format_fixed(clean, precision)
+    else:
+        chars = np.char.mod(f"%.{precision}f".encode(), values).astype("S")[:, None].view(np.uint8)
+
+    if not finite.all():
+        nan = np.isnan(values)
+        chars = _fill(chars, nan, b"null" if json_mode else na_rep.encode())
+        chars = _fill(chars, values == np.inf, b"null" if json_mode else b"inf")
+        chars = _fill(chars, values == -np.inf, b"null" if json_mode else b"-inf")
+    return chars
+
+
+def format_text_block(offset: int, block: np.ndarray, columns: list, format: str = "csv", sep: str = ",",
+                      index_label: str = None, precision: int = None, na_rep: str = "",
+                      lineterminator: str = None) -> bytes:
+    """
+    Function writing a block of samples as lines of text
+    :param offset: Index of the first sample of the block
+    :param block: Numpy ndarray of shape (samples, signals)
+    :param columns: Names of the columns
+    :param format: "csv" (delimited values) or "ndjson" (1 JSON object per line)
+    :param sep: Separator of the columns (CSV)
+    :param index_label: Name of the column of the sample indexes (no index column if None)
+    :param precision: Number of decimals of the floating-point values (shortest representation if None)
+    :param na_rep: Representation of the missing values (CSV)
+    :param lineterminator: End of line (os.linesep for CSV as pandas does, "\\n" for NDJSON if None)
+    :return: Encoded lines
+    """
+    block = np.asarray(block)
+    if block.ndim != 2 or block.shape[1] != len(columns):
+        raise ValueError("The block has to be a 2-dimensional array with 1 column per signal.")
+    nb_rows = len(block)
+    json_mode = format == "ndjson"
+    if lineterminator is None:
+        lineterminator = "\n" if json_mode else os.linesep
+
+    values = [format_values(block[:, j], precision, na_rep, json_mode) for j in range(block.shape[1])]
+    names = list(columns)
+    if index_label is not None:
+        values.insert(0, _format_unsigned(np.arange(offset, offset + nb_rows, dtype=np.uint64)))
+        names.insert(0, index_label)
+    if json_mode:
+        prefixes = [("{" if j == 0 else ",") + json.dumps(str(k)) + ":" for j, k in enumerate(names)]
+        suffix = "}" + lineterminator
+    else:
+        prefixes = [""] + [sep] * (len(names) - 1)
+        suffix = lineterminator
+
+    parts = []
+    for prefix, chars in zip(prefixes, values):
+        if prefix:
+            parts.append(np.broadcast_to(np.frombuffer(prefix.encode(), dtype=np.uint8), (nb_rows, len(prefix.encode()))))
+        parts.append(chars)
+    parts.append(np.broadcast_to(np.frombuffer(suffix.encode(), dtype=np.uint8), (nb_rows, len(suffix.encode()))))
+    lines = np.concatenate(parts, axis=1)
+    return lines[lines != 0].tobytes()
+
+
+def get_csv_header(columns: list, sep: str = ",", index_label: str = None, lineterminator: str = None) -> bytes:
+    """
+    Function writing the header line of a CSV file (quoted as pandas does)
+    :param columns: Names of the columns
+    :param sep: Separator of the columns
+    :param index_label: Name of the column of the sample indexes (no index column if None)
+    :param lineterminator: End of line (os.linesep if None)
+    :return: Encoded header line
+    """
+    header = pd.DataFrame(columns=columns).to_csv(None, sep=sep, index=index_label is not None,
+                                                  index_label=index_label, lineterminator=lineterminator)
+    return header.encode("utf-8")
+
+
+def write_text(chunks, columns: list, filename: str, format: str = "csv", sep: str = ",", index_label: str = None,
+               precision: int = None, na_rep: str = "", lineterminator: str = None, workers: int = None) -> None:
+    """
+    Function writing a record to a text file block by block
+    Up to 2 blocks per worker are formatted concurrently, the file being written by the calling thread
+    in the order of the blocks
+    :param chunks: Iterable of (index of the first sample, block of samples) tuples covering the record
+    :param columns: Names of the columns
+    :param filename: Output filename
+    :param format: "csv" (header line and delimited values) or "ndjson" (1 JSON object per line)
+    :param sep: Separator of the columns (CSV)
+    :param index_label: Name of the column of the sample indexes (no index column if None)
+    :param precision: Number of decimals of the floating-point values (shortest representation if None)
+    :param na_rep: Representation of the missing values (CSV)
+    :param lineterminator: End of line (see format_text_block())
+    :param workers: Number of formatting threads (DEFAULT_TEXT_WORKERS if None, 1 to format in the calling thread)
+    """
+    if format not in ["csv", "ndjson"]:
+        raise ValueError("The text format must be either 'csv' or 'ndjson'.")
+    if precision is not None and (not isinstance(precision, int) or not 0 <= precision <= TEXT_MAX_PRECISION):
+        raise ValueError(f"The precision must be an integer between 0 and {TEXT_MAX_PRECISION}.")
+    workers = DEFAULT_TEXT_WORKERS if workers is None else workers
+    if workers < 1:
+        raise ValueError("The number of workers must be a strictly positive integer.")
+
+    def format_block(offset: int, block: np.ndarray) -> bytes:
+        return format_text_block(offset, block, columns, format, sep, index_label, precision, na_rep, lineterminator)
+
+    with open(filename, "wb") as f:
+        if format == "csv":
+            f.write(get_csv_header(columns, sep, index_label, lineterminator))
+        if workers == 1:
+            for offset, block in chunks:
+                f.write(format_block(offset, block))
+            return
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque()
+            try:
+                for offset, block in chunks:
+                    pending.append(executor.submit(format_block, offset, block))
+                    if len(pending) >= 2 * workers:
+                        f.write(pending.popleft().result())
+                while pending:
+                    f.write(pending.popleft().result())
+            finally:
+                for future in pending:
+                    future.cancel()
@@ -13,27 +13,35 @@
             Official Git repo   :   https://github.com/lcsrodriguez/headat-signals
 
 """
+import copy
+import datetime
 import math
 import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 import wfdb as wf
-from wfdb.io.convert import wfdb_to_wav, wfdb_to_edf
-import scipy.io
-import pyspark
-import tqdm
-import requests
-import validators
-import wget
-from pyspark.sql import SparkSession
+# The optional backends (pyspark, scipy, requests, validators, wfdb converters, ...) are imported
+# by the methods using them: importing headat.main only loads the core dependencies
 from .lib.functions import *
-
-
-if not os.path.exists(EXPORT_FOLDERS) or not os.path.isdir(EXPORT_FOLDERS):
-    os.mkdir(EXPORT_FOLDERS)
+from .lib.signals import SignalSource, LazySignals, WindowSignals, MultiSegmentSignals, iter_signal_chunks, \
+    get_signals_dtype, get_segment_index
+from .lib.streaming import STREAM_WRITERS
+from .lib.text import write_text, TEXT_ENGINE_OPTIONS
+from .lib.excel import write_xlsx, get_xlsx_layout, get_xlsx_filenames
+from .lib.catalog import RecordCatalog, scan_headers
+from .lib.download import make_session, list_remote_files, get_remote_checksums, download_files
+from .lib.cache import DownloadCache, get_default_cache, set_default_cache
+from .lib.spark import get_spark_session, stop_spark_session, load_records_spark
+from .lib.store import StoreSignals, write_store, read_store_index
+from .lib.pyramid import SignalPyramid
+from .lib.pipeline import Pipeline, PipelineSignals, Stage, SOSFilter, Resample, Detrend, SelectChannels
+from .lib.sql import write_record_sql, load_records_sql
+from .lib.matlab import write_mat_v5, write_mat_v73, exceeds_mat_v5
+from .lib.shared import SharedSignals
+from .lib.metrics import Metrics, measure_phase, measure_export, add_metrics_hook, remove_metrics_hook
 
 
 class HDView:
@@ -43,9 +51,18 @@ class HDView:
     VIEWS_INITIALIZED_COUNTER = 0
     VIEWS_TITLES = []
 
-    def __init__(self, record: str = "", title: str = "") -> None:
+    def __init__(self, record: str = "", title: str = "", lazy: bool = False, cache_frame: bool = True,
+                 physical: bool = True, dtype=None, trace_memory: bool = False) -> None:
         """
         Constructor function initializing a new HDView object
+        :param record: Record name or URL (optional)
+        :param title: Title of the view (optional)
+        :param lazy: If set to True, the .dat files are memory-mapped instead of being fully loaded
+        :param physical: If set to False, the digital (ADC) values are kept (see add_record())
+        :param dtype: dtype of the signals (see add_record())
+        :param cache_frame: If set to True, the DataFrame built by t_frame() is kept and re-used by the exporters
+        :param trace_memory: If set to True, the peak of memory allocated by every measured phase is traced
+        (see get_metrics())
         """
 
         # Declaring main variables
@@ -60,26 +77,35 @@ class HDView:
         self.start_time = get_current_datetime()
         self.sim_start = None
         self.sim_end = None
+        self.cache_frame = cache_frame
+        self.cached_frame = None
+        self.window = None
+        self.pyramid = None
+        self.pipeline = None
+        self.shared = None
 
         # Parsing the arguments of the c-tor
         if not isinstance(record, str) or not isinstance(title, str):
             raise TypeError("Record and title must be string values.")
+
+        # Formatting HDView's title if title is not defined by the user
+        # (the counter is incremented by add_record())
+        if title == "":
+            title = f"View #{HDView.VIEWS_INITIALIZED_COUNTER + (record != '')}"
+
+        # Registering the HDView title
+        self.title = title
+        self.metrics = Metrics(trace_memory, context={"view": title})
+
         if record == "":
             #print(f"No record has been submitted.\nPlease consider adding one to the view by doing .add_record("
             #      f"record_name)")
             pass
         else:
             # Registering the record name
-            if not self.add_record(record):
+            if not self.add_record(record, lazy=lazy, physical=physical, dtype=dtype):
                 raise Exception("The submitted record name is not valid. Please try it again")
 
-        # Formatting HDView's title if title is not defined by the user
-        if title == "":
-            title = f"View #{HDView.VIEWS_INITIALIZED_COUNTER}"
-
-        # Registering the HDView title
-        self.title = title
-
         # Creation of the folder
         view_folder_name = make_view_directory()
         self.folder_name = view_folder_name
@@ -111,13 +137,10 @@ class HDView:
         to kill a selected instance of HDView
         :return: bool
         """
-        if self.spark_context is not None:
-            print("Shutting down current SparkContext")
-            self.spark_context.stop()
-
+        # The SparkSession is shared by the views: it is stopped by stop_spark_session()
+        # (the durations of the phases are available through get_metrics())
         self.stop_clock()
         self.compute_clock()
-        print(f"sim_dur: {self.sim_duration}")
         return True
 
     def __repr__(self) -> str:
@@ -134,11 +157,18 @@ class HDView:
         """
         return HDView.VIEWS_INITIALIZED_COUNTER
 
-    def download_sources(self, url_parent_folder: str = "") -> bool:
+    def download_sources(self, url_parent_folder: str = "", workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                         verify: bool = True, cache=True) -> bool:
         """
         Function performing the complete download of remote files from
         https://physionet.org/ website resources
+        The files are downloaded in parallel over pooled HTTP connections and interrupted downloads
+        are resumed (HTTP Range requests) when the method is called again
         :param url_parent_folder: String containing the URL from https://physionet.org
+        :param workers: Number of simultaneous downloads
+        :param verify: If set to True, the files are checked against the published SHA256SUMS.txt (if any)
+        :param cache: DownloadCache serving the already downloaded files (True for the shared default cache,
+        False to disable it)
         :rtype: bool
         :return: Boolean showing if the full download has been performed with complete success
         """
@@ -154,7 +184,7 @@ class HDView:
 
         # Processing the URL
         # Checking if the record name is a URL
-        if validators.url(url_parent_folder):
+        if is_url(url_parent_folder):
             try:
                 url = urlparse(url_parent_folder)
                 print(f"URL : {url}")
@@ -165,23 +195,22 @@ class HDView:
                         if url.path.split("/")[1] == "files":
                             # Download the files
 
-                            # Getting the list of files from url
-                            r = requests.get(url.geturl())
-                            data = r.text
-                            soup = BeautifulSoup(data, "html.parser")
+                            session = make_session(workers)
 
-                            # Formatting the relevant files
-                            links = {
-                                k.get("href"): url.geturl() + k.get("href") for k in soup.find_all("a")[1:] if
-                                k.get("href").split(".")[-1] in ["hea", "dat"]
-                            }
+                            # Getting the list of the relevant files from url
+                            links = list_remote_files(url.geturl(), ["hea", "dat"], session)
+                            checksums = get_remote_checksums(url.geturl(), session) if verify else {}
 
                             # Downloading the files
-                            for file, link in tqdm.tqdm(links.items(), colour="blue"):
-                                tqdm.tqdm.write(f"Processing link : {link}")
-                                wget.download(url=link,
-                                              out=f"{self.samples_foldername}{file}",
-                                              bar=None)
+                            if cache is True:
+                                cache = get_default_cache()
+                            with self.metrics.phase("download", url=url.geturl()) as phase:
+                                reports = download_files(links, self.samples_foldername, workers, checksums,
+                                                         session, cache=cache or None)
+                                # Bytes transferred over the network (and written to the samples folder)
+                                phase["bytes_read"] = phase["bytes_written"] = sum(k["bytes"] for k in reports.values())
+                                phase["details"]["files"] = len(reports)
+                                phase["details"]["skipped"] = sum(bool(k.get("skipped")) for k in reports.values())
                             print(f"Downloading from {url_parent_folder} completed successfully")
                             return True
                         else:
@@ -191,16 +220,24 @@ class HDView:
                 else:
                     raise ValueError("Headat only covers HTTPS protocol for web resources.")
             except Exception as e:
-                raise Exception(f"An exception has occured during ")
+                raise Exception(f"An exception has occured during the download.\nError details: {e}")
 
         # If not, it's a local file and we simply read it using wfdb
         else:
             raise ValueError("The argument specified is not a valid URL.")
 
-    def add_record(self, record: str = None) -> bool:
+    def add_record(self, record: str = None, lazy: bool = False, physical: bool = True, dtype=None) -> bool:
         """
         Function allowing user to add a record to the view
         :param record: Record name
+        :param lazy: If set to True, the .dat files are memory-mapped and the samples are only
+        decoded (digital to physical units) when they are accessed; the segments of the multi-segment
+        records are only opened when one of their samples is accessed
+        :param physical: If set to False, the digital (ADC) values are kept in their native integer dtype
+        (int8, int16 or int32 depending on the WFDB format); the formats, ADC gains and baselines are then
+        added to the record information (physical = (digital - baseline) / adc_gain)
+        :param dtype: dtype of the signals: float64 (default) or float32 for physical values,
+        native integer dtype (default) or any other numeric dtype for digital values
         :rtype: bool
         :return: Boolean representing the success of the operation
         """
@@ -212,7 +249,8 @@ class HDView:
             HDView.VIEWS_INITIALIZED_COUNTER += 1
 
             # Checking if the record name is a URL
-            if validators.url(record):
+            self.metrics.context["record"] = record
+            if is_url(record):
                 url = urlparse(record)
                 print(f"URL : {url}")
 
@@ -228,7 +266,7 @@ class HDView:
                     record = url.geturl().split("/")[-1].split(".")[0]
                 else:
                     record = url.geturl().split("/")[-1]
-                read_rec = wf.rdsamp(f"{self.samples_foldername}{record}")
+                record = f"{self.samples_foldername}{record}"
             # If not, it's a local file and we simply read it using wfdb
             else:
 
@@ -238,12 +276,17 @@ class HDView:
                     # We have the path to a .hea file
                     record = record.split(".")[0]
 
-                # Reading the file
-                read_rec = wf.rdsamp(record)
+            # Reading the file
+            self.metrics.context["record"] = record
+            read_rec = self.read_record(record, lazy, physical, dtype, self.metrics)
 
             # Filtering the signals and additional information from the signals using wfdb library
             self.signals = read_rec[0]
             self.infos = read_rec[1]
+            self.clear_frame_cache()
+            self.window = None
+            self.pyramid = None
+            self.pipeline = None
             self.columns = [k.lower().replace(" ", "_") for k in self.infos["sig_name"]]
             self.nb_observations = self.infos["sig_len"]
 
@@ -253,28 +296,110 @@ class HDView:
         except Exception as e:
             raise Exception(f"Failure on the reading of the record: \nError details : {e}")
 
+    @staticmethod
+    def read_record(record: str, lazy: bool = False, physical: bool = True, dtype=None, metrics: Metrics = None) -> tuple:
+        """
+        Function reading the signals and the information of a record
+        :param record: Record name (path without the .hea extension) or path of a HEADAT store (.hds file)
+        :param lazy: If set to True, the signals are returned as a memory-mapped LazySignals object
+        when the WFDB format of the record allows it (full loading otherwise), as a MultiSegmentSignals object
+        for multi-segment records or as a StoreSignals object for HEADAT stores
+        :param physical: If set to False, the digital (ADC) values are returned (see add_record())
+        :param dtype: dtype of the signals (see add_record())
+        :param metrics: If specified, the header parse ("header" phase) and the decoding of the samples
+        ("decode" phase) are measured in this Metrics collection
+        :return: Tuple containing the signals and the information dictionary (as wfdb.rdsamp)
+        """
+        if record.endswith("." + formats["store"]["extension"]):
+            # HEADAT store (see t_store()): the samples are returned as they have been stored
+            with measure_phase(metrics, "header", lazy=lazy) as phase:
+                signals = StoreSignals(record, dtype)
+                stored = sum(size for chunks in signals.index["chunks"] for _, size in chunks)
+                phase["bytes_read"] = os.path.getsize(record) - stored
+            with measure_phase(metrics, "decode", lazy=lazy) as phase:
+                if not lazy:
+                    phase["bytes_read"] = stored
+                return (signals if lazy else np.asarray(signals)), signals.get_infos()
+
+        with measure_phase(metrics, "header", lazy=lazy) as phase:
+            header = wf.rdheader(record)
+            phase["bytes_read"] = os.path.getsize(record + ".hea")
+        with measure_phase(metrics, "decode", lazy=lazy) as phase:
+            if lazy:
+                # The samples are only read when they are accessed (no bytes read by this phase)
+                if LazySignals.is_supported(header):
+                    signals = LazySignals(record, header, physical, dtype)
+                    return signals, signals.get_infos()
+                if isinstance(header, wf.MultiRecord) and physical:
+                    # The segments are joined lazily (and memory-mapped when possible)
+                    signals = MultiSegmentSignals(record, header, physical, dtype)
+                    return signals, signals.get_infos()
+                print(f"Record {record} cannot be memory-mapped: loading the full record instead")
+                phase["details"]["lazy"] = False
+
+            folder = os.path.dirname(record)
+            phase["bytes_read"] = sum(os.path.getsize(os.path.join(folder, k))
+                                      for k in HDView.list_record_files(record, header))
+            fmts = header.fmt if isinstance(header, wf.Record) else []
+            dtype = get_signals_dtype(fmts, physical, dtype)
+            if physical:
+                # wfdb natively decodes into float64 or float32
+                signals, infos = wf.rdsamp(record, return_res=32 if dtype == np.float32 else 64)
+                return signals.astype(dtype, copy=False), infos
+
+            rec = wf.rdrecord(record, physical=False, return_res=8 * dtype.itemsize)
+            infos = {field: getattr(rec, field) for field in RECORD_INFO_FIELDS + DIGITAL_INFO_FIELDS}
+            return rec.d_signal.astype(dtype, copy=False), infos
+
     def get_record_files(self, unique: bool = True) -> list:
         """
         Function returning the relative path of signal filenames
         :param unique: Boolean. If set to True, get_record_files(True) returns a list of unique (non-redundant items)
         filenames
         :rtype: list
-        :return: List of signal filenames
+        :return: List of signal filenames (with the segment headers for the multi-segment records)
         """
         try:
-            record_hea_filename = self.record + ".hea"
-            with open(record_hea_filename, "r") as f:
-                files = f.readlines()[1 : ]
-            if unique:
-                return list(set([k.split(" ")[0] for k in files]))
-            else:
-                return [k.split(" ")[0] for k in files]
+            return self.list_record_files(self.record, unique=unique)
         except:
             raise Exception("Unable to find accurate signal files")
 
+    @staticmethod
+    def list_record_files(record: str, header=None, unique: bool = True) -> list:
+        """
+        Function returning the signal filenames of a record (relative to the folder of the record)
+        :param record: Record name (path without the .hea extension)
+        :param header: wfdb.Record or wfdb.MultiRecord header of the record (read if None)
+        :param unique: If set to True, the redundant filenames are removed
+        :return: List of signal filenames (with the segment headers for the multi-segment records)
+        """
+        header = wf.rdheader(record) if header is None else header
+        if isinstance(header, wf.MultiRecord):
+            files = []
+            for name in header.seg_name:
+                if name == "~":
+                    continue
+                segment = wf.rdheader(os.path.join(os.path.dirname(record), name))
+                files += [f"{name}.hea"] + [k for k in segment.file_name or [] if k != "~"]
+        else:
+            files = list(header.file_name or [])
+        return list(dict.fromkeys(files)) if unique else files
+
+    def get_segments(self) -> list:
+        """
+        Function returning the segment index of the record
+        (1 segment for the single-segment records)
+        :return: List of dictionaries {name, start, stop} where [start, stop) is the range of samples of the
+        segment (null segments, i.e. gaps of the recording, are named "~")
+        """
+        if isinstance(self.signals, MultiSegmentSignals):
+            return self.signals.get_segments()
+        return get_segment_index(self.record)
+
     def get_signals(self) -> np.ndarray:
         """
         Function returning the array of signals as Numpy ndarray
+        (or as an array-like SignalSource if the record has been lazily added)
         :return: Numpy ndarray of signals where
             - 1 row = 1 record (1 observation)
             - 1 column = 1 signal
@@ -290,6 +415,176 @@ class HDView:
         """
         return self.signals.tolist()
 
+    def iter_chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE, start: int = 0, stop: int = None,
+                    channels: list = None):
+        """
+        Function iterating over the signals by blocks of samples
+        :param chunk_size: Number of samples per block
+        :param start: Index of the first sample (included)
+        :param stop: Index of the last sample (excluded)
+        :param channels: List of the signal indexes to read (all signals if None)
+        :return: Generator of tuples (index of the first sample of the block, Numpy ndarray block)
+        """
+        return iter_signal_chunks(self.get_signals(), chunk_size, start, stop, channels)
+
+    def get_window(self, start=None, stop=None, channels=None, seconds: bool = False) -> tuple:
+        """
+        Function converting a selection of samples and signals into sample and signal indexes
+        :param start: Beginning of the window (included), first sample if None
+        :param stop: End of the window (excluded), last sample if None
+        :param channels: Signal (or list of signals) given by index or by name (see the columns attribute
+        or the sig_name field of the information), all signals if None
+        :param seconds: If set to True, start and stop are given in seconds (using the sampling frequency fs)
+        :return: Tuple (start, stop, list of signal indexes)
+        """
+        if not self.check_registered_record():
+            raise Exception("No record has been registered. Please call the .add_record() method before")
+        if seconds:
+            fs = self.infos["fs"]
+            # Sample n belongs to the window [t0, t1) if t0 <= n / fs < t1
+            start = None if start is None else math.ceil(start * fs - 1e-9)
+            stop = None if stop is None else math.ceil(stop * fs - 1e-9)
+        start, stop, _ = slice(start, stop).indices(self.nb_observations)
+        if stop <= start:
+            raise ValueError("The selected window is empty.")
+
+        if channels is None:
+            return start, stop, list(range(len(self.columns)))
+        if isinstance(channels, (str, int, np.integer)):
+            channels = [channels]
+        indexes = []
+        for k in channels:
+            if isinstance(k, str):
+                name = k.lower().replace(" ", "_")
+                if name not in self.columns:
+                    raise KeyError(f"Unknown signal: {k} (available signals: {', '.join(self.columns)})")
+                indexes.append(self.columns.index(name))
+            elif -len(self.columns) <= k < len(self.columns):
+                indexes.append(int(k) % len(self.columns))
+            else:
+                raise IndexError(f"Signal index out of range: {k}")
+        return start, stop, indexes
+
+    def read(self, start=None, stop=None, channels=None, seconds: bool = False) -> np.ndarray:
+        """
+        Function reading a window of the signals
+        Only the selected samples are read from disk for the lazily added records (see add_record())
+        :param start: Beginning of the window (see get_window())
+        :param stop: End of the window (see get_window())
+        :param channels: Selected signals (see get_window())
+        :param seconds: If set to True, start and stop are given in seconds
+        :return: Numpy ndarray of shape (number of samples, number of signals)
+        """
+        start, stop, channels = self.get_window(start, stop, channels, seconds)
+        return WindowSignals(self.get_signals(), start, stop, channels).read()
+
+    def select(self, start=None, stop=None, channels=None, seconds: bool = False, title: str = ""):
+        """
+        Function returning a view restricted to a window of the signals
+        Every conversion and export method of the returned view only processes (and writes) the window,
+        whose samples are read on demand for the lazily added records (see add_record()):
+            v.select(10, 20, ["ii", "v1"], seconds=True).t_csv()
+        :param start: Beginning of the window (see get_window())
+        :param stop: End of the window (see get_window())
+        :param channels: Selected signals (see get_window())
+        :param seconds: If set to True, start and stop are given in seconds
+        :param title: Title of the returned view (title of the view followed by the window if empty)
+        :return: HDView sharing the record and the export folder of the view
+        """
+        start, stop, channels = self.get_window(start, stop, channels, seconds)
+        view = self.derive_view(title or f"{self.title} [{start}:{stop}]")
+
+        # Samples of the window (views of the array for the in-memory records)
+        if isinstance(self.signals, np.ndarray):
+            view.signals = self.signals[start: stop]
+            if channels != list(range(len(self.columns))):
+                view.signals = view.signals[:, channels]
+        else:
+            view.signals = WindowSignals(self.signals, start, stop, channels)
+        view.columns = [self.columns[k] for k in channels]
+        view.nb_observations = stop - start
+
+        # Information of the window (the starting time is shifted by the beginning of the window)
+        view.infos = dict(self.infos)
+        for field in SIGNAL_INFO_FIELDS:
+            if field in view.infos and view.infos[field] is not None:
+                view.infos[field] = [view.infos[field][k] for k in channels]
+        view.infos["sig_len"], view.infos["n_sig"] = stop - start, len(channels)
+        if view.infos.get("base_time") is not None and start:
+            base = datetime.datetime.combine(view.infos.get("base_date") or datetime.date.min, view.infos["base_time"])
+            base += datetime.timedelta(seconds=start / self.infos["fs"])
+            view.infos["base_time"] = base.time()
+            if view.infos.get("base_date") is not None:
+                view.infos["base_date"] = base.date()
+
+        # Window expressed in the samples and signals of the record (used by the WFDB-based exporters)
+        if self.pipeline is not None:
+            view.window = None
+        elif self.window is None:
+            view.window = {"start": start, "stop": stop, "channels": channels}
+        else:
+            view.window = {"start": self.window["start"] + start, "stop": self.window["start"] + stop,
+                           "channels": [self.window["channels"][k] for k in channels]}
+        return view
+
+    def derive_view(self, title: str):
+        """
+        Function returning a copy of the view sharing its record, signals and export folder
+        (used by select() and process())
+        :param title: Title of the returned view
+        :return: HDView
+        """
+        view = copy.copy(self)
+        view.start_time = get_current_datetime()
+        view.title = title
+        view.cached_frame = None
+        view.pyramid = None
+        view.spark_context = None
+        view.metrics = self.metrics.derive(view=title)
+        return view
+
+    def process(self, *stages, chunk_size: int = DEFAULT_CHUNK_SIZE, title: str = ""):
+        """
+        Function returning a view of the signals processed by a pipeline of streaming stages
+        The stages (SOSFilter, Resample, Detrend, SelectChannels or any Stage sub-class) process the
+        record block by block while carrying their state, so the output matches the processing of the
+        whole array while only one block is held in memory. The processing runs each time the signals of the
+        returned view are iterated, directly feeding its exporters:
+            v.process(SOSFilter(cutoff=(0.5, 40)), Resample(fs=250), Detrend()).t_parquet(chunk_size=100000)
+        :param stages: Stages applied in order (or a single Pipeline)
+        :param chunk_size: Number of samples of the record read per block
+        :param title: Title of the returned view (title of the view followed by the stages if empty)
+        :return: HDView sharing the record and the export folder of the view
+        """
+        if not self.check_registered_record():
+            raise Exception("No record has been registered. Please call the .add_record() method before")
+        pipeline = stages[0] if len(stages) == 1 and isinstance(stages[0], Pipeline) else Pipeline(list(stages))
+        signals = PipelineSignals(self.get_signals(), pipeline, self.infos["fs"], self.columns, chunk_size)
+
+        view = self.derive_view(title or f"{self.title} {pipeline}")
+        view.signals = signals
+        view.pipeline = pipeline
+        view.window = None
+        view.columns = list(signals.columns)
+        view.nb_observations = signals.shape[0]
+        view.infos = dict(self.infos)
+        channels = [self.columns.index(k) for k in view.columns]
+        for field in SIGNAL_INFO_FIELDS:
+            if field in view.infos and view.infos[field] is not None:
+                view.infos[field] = [view.infos[field][k] for k in channels]
+        view.infos["fs"], view.infos["sig_len"], view.infos["n_sig"] = signals.fs, *signals.shape
+        return view
+
+    def get_record_window(self) -> dict:
+        """
+        Function returning the window of the view in the samples and signals of the record (see select())
+        :return: Dictionary of the sampfrom, sampto and channels arguments of the wfdb functions
+        (empty if the view is not restricted to a window)
+        """
+        if self.window is None:
+            return {}
+        return {"sampfrom": self.window["start"], "sampto": self.window["stop"], "channels": self.window["channels"]}
+
     def get_info(self) -> dict:
         """
         Function returning information about studied signals
@@ -297,16 +592,26 @@ class HDView:
         """
         return self.infos
 
-    def get_spark_context(self) -> pyspark.sql.SparkSession:
+    def get_metrics(self) -> Metrics:
         """
-        Function initializing a SparkContext
+        Function returning the phases measured for the view: download, header parse ("header"),
+        sample decode ("decode"), DataFrame build ("frame") and every export ("export:<format>")
+            v.get_metrics().summary()                 # totals per phase
+            v.get_metrics().add_hook(send_to_statsd)  # called with every new phase dictionary
+        (see add_metrics_hook() for the hooks shared by every view)
+        :return: Metrics
+        """
+        return self.metrics
+
+    def get_spark_context(self, master: str = None, config: dict = None) -> "pyspark.sql.SparkSession":
+        """
+        Function returning the SparkSession shared by every HDView (see get_spark_session())
+        :param master: Spark master URL (HEADAT_SPARK_MASTER environment variable, local[*] by default)
+        :param config: Dictionary of additional Spark configuration options
         :rtype: pyspark.sql.SparkSession
         :return: SparkContext
         """
-        if self.spark_context is None:
-             self.spark_context = SparkSession.builder.master("local[1]")\
-                 .appName('HEADAT RDD Converter')\
-                .getOrCreate()
+        self.spark_context = get_spark_session(master, config=config)
         return self.spark_context
 
     # ----------------------------------------------------------------
@@ -331,7 +636,7 @@ class HDView:
         Function returning a converted Numpy ndarray of signals series
         :return: Numpy ndarrays
         """
-        return self.get_signals()
+        return np.asarray(self.get_signals())
 
     def t_numpy_records(self) -> np.record:
         """
@@ -344,19 +649,105 @@ class HDView:
     def t_frame(self) -> pd.DataFrame:
         """
         Function returning a converted array as a Pandas DataFrame
+        The DataFrame wraps the signals array without copying it and, unless the cache has been
+        disabled (cache_frame attribute), is built once and re-used by the following calls
         :return: Pandas DataFrame of the underlying signals
         """
-        return pd.DataFrame(self.get_signals(), columns=self.columns)
+        if self.cached_frame is not None:
+            return self.cached_frame
+        with self.metrics.phase("frame") as phase:
+            df = pd.DataFrame(np.asarray(self.get_signals()), columns=self.columns, copy=False)
+            phase["details"]["nbytes"] = int(df.memory_usage(index=False).sum())
+        if self.cache_frame:
+            self.cached_frame = df
+        return df
+
+    def clear_frame_cache(self) -> None:
+        """
+        Function releasing the DataFrame cached by t_frame()
+        """
+        self.cached_frame = None
+
+    def get_frame_cache_info(self) -> dict:
+        """
+        Function returning information about the DataFrame cached by t_frame()
+        :return: Dictionary containing:
+            - enabled: whether the cache is enabled
+            - cached: whether a DataFrame is currently cached
+            - nbytes: memory used by the cached DataFrame values
+            - zero_copy: whether the cached DataFrame shares its memory with the signals array
+        """
+        df = self.cached_frame
+        return {
+            "enabled": self.cache_frame,
+            "cached": df is not None,
+            "nbytes": int(df.memory_usage(index=False).sum()) if df is not None else 0,
+            "zero_copy": df is not None and isinstance(self.signals, np.ndarray)
+                         and np.shares_memory(df.to_numpy(copy=False), self.signals)
+        }
+
+    def get_pyramid(self, chunk_size: int = DEFAULT_CHUNK_SIZE, base: int = PYRAMID_BASE_BIN,
+                    factor: int = PYRAMID_FACTOR) -> SignalPyramid:
+        """
+        Function returning the min/max/mean pyramid of the signals (built on the first call, see t_pyramid())
+        :param chunk_size: Number of samples read per block while building the pyramid
+        :param base: Number of samples per bin of the finest level
+        :param factor: Number of bins of a level merged into 1 bin of the next level
+        :return: SignalPyramid
+        """
+        if not self.check_registered_record():
+            raise Exception("No record has been registered. Please call the .add_record() method before")
+        if self.pyramid is None or self.pyramid.base != base or self.pyramid.factor != factor:
+            self.pyramid = SignalPyramid.build(self.iter_chunks(chunk_size), self.nb_observations, self.columns,
+                                               base, factor)
+        return self.pyramid
+
+    def get_overview(self, start=None, stop=None, pixels: int = DEFAULT_OVERVIEW_PIXELS, channels=None,
+                     seconds: bool = False) -> dict:
+        """
+        Function returning the min/max/mean overview of a window of the signals drawn on a number of pixels
+        The overview is answered from the pyramid (see get_pyramid()) in a time proportional to the
+        number of pixels (and not to the length of the window)
+        :param start: Beginning of the window (see get_window())
+        :param stop: End of the window (see get_window())
+        :param pixels: Maximum number of points of the overview
+        :param channels: Selected signals (see get_window())
+        :param seconds: If set to True, start and stop are given in seconds
+        :return: Dictionary (see SignalPyramid.query()) with the time (in seconds) of each point
+        """
+        start, stop, channels = self.get_window(start, stop, channels, seconds)
+        overview = self.get_pyramid().query(start, stop, pixels, channels, self.get_signals())
+        overview["time"] = overview["index"] / self.infos["fs"]
+        return overview
+
+    def t_spark(self, transfer: str = "arrow", chunk_size: int = DEFAULT_CHUNK_SIZE) -> "pyspark.sql.DataFrame":
+        """
+        Function returning a PySpark DataFrame of the signals
+        :param transfer: Transfer method of the samples into Spark:
+            - "arrow": the pandas DataFrame is sent to Spark as Arrow record batches
+            - "parquet": the record is written block by block to a Parquet file read by Spark
+            (the samples never go through the driver memory)
+        :param chunk_size: Number of samples per row group ("parquet" transfer)
+        :rtype: pyspark.sql.DataFrame
+        :return: PySpark DataFrame
+        """
+        spark = self.get_spark_context()
+        if transfer == "arrow":
+            return spark.createDataFrame(self.t_frame())
+        if transfer == "parquet":
+            if not self.t_parquet(chunk_size=chunk_size):
+                raise Exception("An error has occured during the Parquet staging of the record.")
+            return spark.read.parquet(os.path.abspath(self.get_export_filename("parquet")))
+        raise ValueError("The transfer method must be either 'arrow' or 'parquet'.")
 
-    def t_rdd(self) -> pyspark.RDD:
+    def t_rdd(self, transfer: str = "arrow") -> "pyspark.RDD":
         """
         Function returning a PySpark RDD
+        :param transfer: Transfer method of the samples into Spark (see t_spark())
         :rtype: pyspark.RDD
         :return: PySpark RDD object
         """
-        spark = self.get_spark_context()
-        df_ps = spark.createDataFrame(self.t_frame())
-        return df_ps.rdd
+        return self.t_spark(transfer).rdd
 
     # ----------------------------------------------------------------
     #                    EXPORT METHODS (GENERIC METHODS)
@@ -368,11 +759,12 @@ class HDView:
         """
         return (self.record is not None) and (self.signals is not None) and (self.infos is not None)
 
-    def get_conversion_details(self, format: str = "csv") -> tuple:
+    def get_conversion_details(self, format: str = "csv", build_frame: bool = True) -> tuple:
         """
         Intermediary function converting the signals data into the desired/specified data type
         :param format: Format type (conversion output)
-        :return: Tuple containing the original DataFrame, the extension and the method
+        :param build_frame: If set to False, the DataFrame is not built (streaming exports)
+        :return: Tuple containing the original DataFrame (or None), the extension and the method
         """
 
         # Checking if a record is registered
@@ -388,38 +780,351 @@ class HDView:
             raise ValueError("The format is not yet supported by the system. Please consider initiating a GitHub issue.")
 
         print(f"Conversion to format : {format}")
-        df = self.t_frame()
-        filename = self.folder_name + f"out_{self.start_time}.{formats[format]['extension']}"
-        return df, formats[format]["method"], filename
+        df = self.t_frame() if build_frame else None
+        return df, formats[format]["method"], self.get_export_filename(format)
+
+    def get_xlsx_files(self, rows_per_sheet: int = EXCEL_ROW_LIMIT, sheets_per_workbook: int = None) -> list:
+        """
+        Function returning the workbooks written by t_xlsx()
+        :param rows_per_sheet: Maximum number of samples per worksheet
+        :param sheets_per_workbook: Maximum number of worksheets per workbook (unbounded if None)
+        :return: List of dictionaries (1 per workbook) containing the filename and the list of the worksheets
+        (dictionaries containing the name, the first and the last sample excluded of each worksheet)
+        """
+        layout = get_xlsx_layout(self.nb_observations, rows_per_sheet, sheets_per_workbook)
+        workbooks, number = [], 0
+        for filename, sheets in zip(get_xlsx_filenames(self.get_export_filename("xlsx"), len(layout)), layout):
+            workbooks.append({"filename": filename, "sheets": []})
+            for start, stop in sheets:
+                number += 1
+                workbooks[-1]["sheets"].append({"name": f"Sheet{number}", "start": start, "stop": stop})
+        return workbooks
+
+    def get_export_filename(self, format: str = "csv") -> str:
+        """
+        Function returning the path of the file written by the exporter of a format
+        :param format: Format type (conversion output)
+        :return: String of the filename
+        """
+        return self.folder_name + f"out_{self.start_time}.{formats[format.lower()]['extension']}"
+
+    def export(self, formats_list: list = None, max_workers: int = None, chunk_size: int = None,
+               options: dict = None, start=None, stop=None, channels=None, seconds: bool = False) -> dict:
+        """
+        Function converting the record to several formats in a single pass
+        The record is checked and the DataFrame is built only once, then the I/O- and compression-bound
+        writers (see get_parallel_export_types()) run concurrently on a pool of threads while the
+        CPU-bound (GIL-holding) writers run in the calling thread
+        :param formats_list: List of format names (see get_export_types()), all formats if None
+        :param max_workers: Maximum number of writer threads (default of ThreadPoolExecutor if None)
+        :param chunk_size: If specified, the chunked formats are written block by block (see get_chunked_export_types())
+        :param options: Dictionary format --> dictionary of keyword arguments passed to the exporter
+        :param start: If specified, beginning of the exported window (see select())
+        :param stop: If specified, end of the exported window (see select())
+        :param channels: If specified, exported signals (see select())
+        :param seconds: If set to True, start and stop are given in seconds
+        :return: Dictionary format --> result dictionary containing:
+            - success: Boolean set to True if conversion has been successfully performed
+            - filename: Path of the written file
+            - duration: Duration of the conversion (in seconds)
+            - size: Size of the written file (in bytes, None if no file has been written)
+            - error: Error message (None if no exception has been raised)
+            - metrics: Measured phase of the export (see get_metrics())
+        """
+        if not self.check_registered_record():
+            raise Exception("No record has been registered. Please call the .add_record() method before")
+        if start is not None or stop is not None or channels is not None:
+            return self.select(start, stop, channels, seconds).export(formats_list, max_workers, chunk_size, options)
+        if formats_list is None:
+            formats_list = get_export_types()
+        if isinstance(formats_list, str):
+            formats_list = [formats_list]
+        formats_list = [k.lower() for k in formats_list]
+        unknown = [k for k in formats_list if k not in get_export_types()]
+        if unknown:
+            raise ValueError(f"Unsupported export format(s): {', '.join(unknown)}")
+        options = options or {}
+
+        def run(format: str) -> dict:
+            kwargs = dict(options.get(format, {}))
+            if chunk_size is not None and formats[format].get("chunked", False):
+                kwargs["chunk_size"] = chunk_size
+            result = {"success": False, "filename": self.get_export_filename(format), "duration": None,
+                      "size": None, "error": None}
+            start = time.perf_counter()
+            try:
+                result["success"] = bool(getattr(self, formats[format]["callback"])(**kwargs))
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+            result["duration"] = time.perf_counter() - start
+            if format == "text":
+                result["filename"] += str(kwargs.get("extension", ""))
+            if os.path.isfile(result["filename"]):
+                result["size"] = os.path.getsize(result["filename"])
+            result["metrics"] = self.metrics.get_last(f"export:{format}")
+            return result
+
+        # Building the DataFrame once for every writer (even if the frame cache is disabled)
+        frame_cached = self.cached_frame is not None
+        if chunk_size is None or any(not formats[k].get("chunked", False) for k in formats_list):
+            self.cached_frame = self.t_frame()
+        try:
+            results = {}
+            parallel = [k for k in formats_list if k in get_parallel_export_types()]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {k: executor.submit(run, k) for k in parallel}
+                for format in formats_list:
+                    if format not in futures:
+                        results[format] = run(format)
+                for format, future in futures.items():
+                    results[format] = future.result()
+        finally:
+            if not self.cache_frame and not frame_cached:
+                self.cached_frame = None
+        return {k: results[k] for k in formats_list}
+
+    def share_signals(self, kind: str = "shm", path: str = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> SharedSignals:
+        """
+        Function copying the signals of the view into a buffer shared with other processes
+        The handle of the returned buffer (handle attribute) is a small picklable dictionary from which
+        from_shared() rebuilds the view in another process without copying the signals (the lazy, windowed
+        and processed views are decoded block by block into the buffer)
+        The calling process owns the buffer: it has to be released with close() (or a with statement) once the
+        other processes are done with it
+        :param kind: "shm" (multiprocessing.shared_memory segment) or "memmap" (memory-mapped .npy file)
+        :param path: Path of the .npy file of the "memmap" buffers (temporary file if None)
+        :param chunk_size: Number of samples copied per block
+        :return: SharedSignals
+        """
+        if not self.check_registered_record():
+            raise Exception("No record has been registered. Please call the .add_record() method before")
+        state = {k: v for k, v in self.__dict__.items() if k not in SHARED_VIEW_EXCLUDED}
+        state["metrics"] = {"trace_memory": self.metrics.trace_memory, "context": dict(self.metrics.context)}
+        with self.metrics.phase("share", kind=kind) as phase:
+            shared = SharedSignals.create(self.get_signals(), kind, path, chunk_size, {"view": state})
+            phase["bytes_written"] = shared.array.nbytes
+        return shared
+
+    @classmethod
+    def from_shared(cls, handle: dict):
+        """
+        Function rebuilding a view from the handle of its shared signals (see share_signals()), e.g. in a
+        worker process: the signals are a read-only array over the shared buffer and the exporters write
+        to the export folder of the original view
+        The view has to be released with release_shared() once it is not used anymore
+        :param handle: Handle of the shared signals (handle attribute of the SharedSignals)
+        :return: HDView
+        """
+        shared = SharedSignals.attach(handle)
+        state = dict(handle["metadata"]["view"])
+        view = cls.__new__(cls)
+        view.__dict__.update(state)
+        view.metrics = Metrics(state["metrics"]["trace_memory"], context=state["metrics"]["context"])
+        view.signals = shared.array
+        view.cached_frame = None
+        view.pyramid = None
+        view.spark_context = None
+        view.shared = shared
+        return view
+
+    def release_shared(self) -> None:
+        """
+        Function releasing the shared signals of a view rebuilt by from_shared()
+        (the signals of the view are not available anymore)
+        """
+        if self.shared is None:
+            return
+        self.signals = None
+        self.clear_frame_cache()
+        self.pyramid = None
+        shared, self.shared = self.shared, None
+        shared.close()
+
+    @staticmethod
+    def export_shared(handle: dict, format: str, chunk_size: int = None, options: dict = None) -> dict:
+        """
+        Function converting a view rebuilt from its shared signals to a format (executed inside a worker process)
+        :param handle: Handle of the shared signals (see share_signals())
+        :param format: Format name
+        :param chunk_size: If specified and if the format supports it, the file is written block by block
+        :param options: Dictionary of keyword arguments passed to the exporter
+        :return: Result dictionary (see export())
+        """
+        view = HDView.from_shared(handle)
+        try:
+            return view.export([format], chunk_size=chunk_size, options={format: options or {}})[format]
+        finally:
+            view.release_shared()
+
+    def multiprocess_export(self, formats_list: list = None, workers: int = None, chunk_size: int = None,
+                            options: dict = None, kind: str = "shm") -> dict:
+        """
+        Function converting the record to several formats in parallel over a pool of processes
+        The signals are shared once (see share_signals()) and every worker process rebuilds the view from the
+        handle instead of receiving a copy of the signals, so that the CPU-bound writers are not serialized by
+        the GIL; the buffer is released once every format has been written
+        :param formats_list: List of format names (see get_export_types()), all formats if None
+        :param workers: Number of worker processes (number of CPUs if None)
+        :param chunk_size: If specified, the chunked formats are written block by block (see get_chunked_export_types())
+        :param options: Dictionary format --> dictionary of keyword arguments passed to the exporter
+        :param kind: "shm" (shared memory segment) or "memmap" (memory-mapped .npy file)
+        :return: Dictionary format --> result dictionary (see export())
+        """
+        if formats_list is None:
+            formats_list = get_export_types()
+        if isinstance(formats_list, str):
+            formats_list = [formats_list]
+        formats_list = [k.lower() for k in formats_list]
+        unknown = [k for k in formats_list if k not in get_export_types()]
+        if unknown:
+            raise ValueError(f"Unsupported export format(s): {', '.join(unknown)}")
+        options = options or {}
+
+        results = {}
+        with self.share_signals(kind) as shared:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {k: executor.submit(HDView.export_shared, shared.handle, k, chunk_size, options.get(k))
+                           for k in formats_list}
+                for format, future in futures.items():
+                    try:
+                        results[format] = future.result()
+                    except Exception as e:
+                        # The worker process itself has failed (e.g. killed)
+                        results[format] = {"success": False, "filename": self.get_export_filename(format),
+                                           "duration": None, "size": None, "error": f"{type(e).__name__}: {e}",
+                                           "metrics": None}
+                    # The phases measured by the workers are added to the metrics of the view
+                    if results[format]["metrics"] is not None:
+                        self.metrics.add(results[format]["metrics"])
+        return results
+
+    def stream_export(self, format: str = "csv", chunk_size: int = DEFAULT_CHUNK_SIZE, extension: str = "",
+                      **kwargs) -> bool:
+        """
+        Function converting the record block by block (of chunk_size samples) without building
+        the full DataFrame: the peak memory is bounded by the chunk size
+        :param format: Format type (conversion output), see get_streaming_export_types()
+        :param chunk_size: Number of samples per block
+        :param extension: Additional extension appended to the filename
+        :rtype: bool
+        :return: Boolean set to True if conversion has been successfully performed
+        """
+        if not isinstance(format, str) or format.lower() not in get_streaming_export_types():
+            raise ValueError(f"The format {format} does not support the streaming export.")
+        format = format.lower()
+        if format not in STREAM_WRITERS:
+            raise ValueError(f"The format {format} is declared as streaming but no streaming writer is registered.")
+        if chunk_size is None or chunk_size <= 0:
+            raise ValueError("The chunk size must be a strictly positive integer.")
+
+        # Gathering the details concerning the specified format
+        _, _, filename = self.get_conversion_details(format, build_frame=False)
+        filename += str(extension)
+        try:
+            STREAM_WRITERS[format](lambda channels=None: self.iter_chunks(chunk_size, channels=channels),
+                                   self.columns, filename, **kwargs)
+            return True
+        except:
+            return False
+
+    def text_export(self, format: str = "csv", chunk_size: int = None, extension: str = "", precision: int = None,
+                    workers: int = None, **kwargs) -> bool:
+        """
+        Function converting the record to a text format with the vectorized text engine (see write_text()):
+        the blocks of samples are formatted by a pool of threads and written in order, without building the
+        DataFrame
+        :param format: Format type (conversion output): "text", "csv" or "ndjson"
+        :param chunk_size: Number of samples per block (DEFAULT_CHUNK_SIZE if None)
+        :param extension: Additional extension appended to the filename
+        :param precision: Number of decimals of the floating-point values (shortest representation if None)
+        :param workers: Number of formatting threads (DEFAULT_TEXT_WORKERS if None)
+        :rtype: bool
+        :return: Boolean set to True if conversion has been successfully performed
+        """
+        if format not in ["text", "csv", "ndjson"]:
+            raise ValueError(f"The format {format} is not supported by the text engine.")
+        # Gathering the details concerning the specified format
+        _, _, filename = self.get_conversion_details(format, build_frame=False)
+        filename += str(extension)
+        try:
+            write_text(self.iter_chunks(chunk_size or DEFAULT_CHUNK_SIZE), self.columns, filename,
+                       "ndjson" if format == "ndjson" else "csv", precision=precision, workers=workers, **kwargs)
+            return True
+        except:
+            return False
 
     # ----------------------------------------------------------------
     #                    EXPORT METHODS (FORMAT METHODS)
 
-    def t_txt(self, extension: str = "", separator: str = ",", **kwargs) -> bool:
+    @measure_export("text")
+    def t_txt(self, extension: str = "", separator: str = ",", chunk_size: int = None, precision: int = None,
+              workers: int = None, engine: str = "numpy", **kwargs) -> bool:
         """
         Function converting the record to the textfile format (custom extension
         :param separator: Separator of the different columns items
         :param extension: Extension parameter
+        :param chunk_size: If specified, the record is written block by block (see stream_export())
+        :param precision: If specified, number of decimals of the floating-point values
+        :param workers: Number of formatting threads of the text engine (see text_export())
+        :param engine: "numpy" (vectorized text engine, see text_export()) or "pandas" (DataFrame.to_csv(),
+        also used when other keyword arguments of to_csv() are given)
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
+        if engine not in ["numpy", "pandas"]:
+            raise ValueError("The engine must be either 'numpy' or 'pandas'.")
+        if engine == "numpy" and set(kwargs) <= set(TEXT_ENGINE_OPTIONS) - {"sep", "index_label"}:
+            return self.text_export("text", chunk_size, extension, precision, workers, sep=separator,
+                                    index_label='id', **kwargs)
+        if precision is not None:
+            kwargs.setdefault("float_format", f"%.{precision}f")
+        kwargs.setdefault("sep", separator)
+        kwargs.setdefault("index_label", "id")
+        if chunk_size is not None:
+            return self.stream_export("text", chunk_size, extension, **kwargs)
         # Gathering the details concerning the specified format
         df, _, filename = self.get_conversion_details("text")
         filename += str(extension)
         try:
-            df.to_csv(filename, sep=separator, index_label='id')
+            df.to_csv(filename, **kwargs)
             return True
         except:
             return False
 
-    def t_xlsx(self, **kwargs) -> bool:
+    @measure_export("xlsx")
+    def t_xlsx(self, chunk_size: int = None, rows_per_sheet: int = EXCEL_ROW_LIMIT, sheets_per_workbook: int = None,
+               precision: int = None, engine: str = "numpy", **kwargs) -> bool:
         """
         Function converting the record to the XSLX format
+        The rows are streamed block by block into the workbook (see write_xlsx()): a record longer than
+        rows_per_sheet spills into the next worksheets (Sheet1, Sheet2, ...) and, if sheets_per_workbook is
+        specified, into the next workbooks (out_<...>.xlsx, out_<...>_2.xlsx, ..., see get_xlsx_filenames()).
+        The "id" column holds the index of the sample in the record on every worksheet
+        :param chunk_size: Number of samples per block (DEFAULT_CHUNK_SIZE if None, not used by the pandas engine
+        which writes the whole DataFrame)
+        :param rows_per_sheet: Maximum number of samples per worksheet
+        :param sheets_per_workbook: Maximum number of worksheets per workbook (unbounded if None)
+        :param precision: If specified, number of decimals of the floating-point values
+        :param engine: "numpy" (streaming writer) or "pandas" (DataFrame.to_excel(), limited to EXCEL_ROW_LIMIT
+        samples, also used when keyword arguments of to_excel() are given)
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
+        if engine not in ["numpy", "pandas"]:
+            raise ValueError("The engine must be either 'numpy' or 'pandas'.")
+        if engine == "numpy" and not kwargs:
+            # Gathering the details concerning the specified format
+            _, _, filename = self.get_conversion_details("xlsx", build_frame=False)
+            try:
+                write_xlsx(filename, lambda start, stop: self.iter_chunks(chunk_size or DEFAULT_CHUNK_SIZE, start, stop),
+                           self.columns, self.nb_observations, "id", rows_per_sheet, sheets_per_workbook, precision)
+                return True
+            except:
+                return False
         if self.nb_observations > EXCEL_ROW_LIMIT:
             raise Exception("The record is too long for an .xlsx conversion.")
+        if precision is not None:
+            kwargs.setdefault("float_format", f"%.{precision}f")
         # Gathering the details concerning the specified format
         df, method, filename = self.get_conversion_details("xlsx")
         cl_m = eval(f"df.{method}")
@@ -429,12 +1134,30 @@ class HDView:
         except:
             return False
 
-    def t_csv(self, **kwargs) -> bool:
+    @measure_export("csv")
+    def t_csv(self, chunk_size: int = None, precision: int = None, workers: int = None, engine: str = "numpy",
+              **kwargs) -> bool:
         """
         Function converting the record to the CSV format
+        With the default options, the vectorized text engine writes the same file as DataFrame.to_csv()
+        :param chunk_size: If specified, the record is written block by block (see stream_export())
+        :param precision: If specified, number of decimals of the floating-point values
+        :param workers: Number of formatting threads of the text engine (see text_export())
+        :param engine: "numpy" (vectorized text engine, see text_export()) or "pandas" (DataFrame.to_csv(),
+        also used when other keyword arguments of to_csv() are given)
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
+        if engine not in ["numpy", "pandas"]:
+            raise ValueError("The engine must be either 'numpy' or 'pandas'.")
+        if engine == "numpy" and set(kwargs) <= set(TEXT_ENGINE_OPTIONS):
+            kwargs.setdefault("index_label", "id")
+            return self.text_export("csv", chunk_size, precision=precision, workers=workers, **kwargs)
+        if precision is not None:
+            kwargs.setdefault("float_format", f"%.{precision}f")
+        if chunk_size is not None:
+            kwargs.setdefault("index_label", "id")
+            return self.stream_export("csv", chunk_size, **kwargs)
         # Gathering the details concerning the specified format
         df, method, filename = self.get_conversion_details("csv")
         cl_m = eval(f"df.{method}")
@@ -444,12 +1167,16 @@ class HDView:
         except:
             return False
 
-    def t_json(self, **kwargs) -> bool:
+    @measure_export("json")
+    def t_json(self, chunk_size: int = None, **kwargs) -> bool:
         """
         Function converting the record to the JSON format
+        :param chunk_size: If specified, the record is written block by block (see stream_export())
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
+        if chunk_size is not None:
+            return self.stream_export("json", chunk_size, **kwargs)
         # Gathering the details concerning the specified format
         df, method, filename = self.get_conversion_details("json")
         cl_m = eval(f"df.{method}")
@@ -459,12 +1186,33 @@ class HDView:
         except:
             return False
 
-    def t_xml(self, **kwargs) -> bool:
+    @measure_export("ndjson")
+    def t_ndjson(self, chunk_size: int = None, precision: int = None, workers: int = None,
+                 index_label: str = None, **kwargs) -> bool:
+        """
+        Function converting the record to the NDJSON format (1 JSON object per sample and per line, as
+        DataFrame.to_json(orient="records", lines=True) does) with the vectorized text engine
+        The missing and infinite values are written as null
+        :param chunk_size: Number of samples per block (see text_export())
+        :param precision: If specified, number of decimals of the floating-point values
+        :param workers: Number of formatting threads (see text_export())
+        :param index_label: If specified, key of the sample index added to every object
+        :rtype: bool
+        :return: Boolean set to True if conversion has been successfully performed
+        """
+        return self.text_export("ndjson", chunk_size, precision=precision, workers=workers, index_label=index_label,
+                                **kwargs)
+
+    @measure_export("xml")
+    def t_xml(self, chunk_size: int = None, **kwargs) -> bool:
         """
         Function converting the record to the XML format
+        :param chunk_size: If specified, the record is written block by block (see stream_export())
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
+        if chunk_size is not None:
+            return self.stream_export("xml", chunk_size, **kwargs)
         # Gathering the details concerning the specified format
         df, method, filename = self.get_conversion_details("xml")
         cl_m = eval(f"df.{method}")
@@ -474,6 +1222,7 @@ class HDView:
         except:
             return False
 
+    @measure_export("markdown")
     def t_md(self, **kwargs) -> bool:
         """
         Function converting the record to the MD (Markdown) format
@@ -489,6 +1238,7 @@ class HDView:
         except:
             return False
 
+    @measure_export("html")
     def t_html(self, **kwargs) -> bool:
         """
         Function converting the record to the HTML format
@@ -504,6 +1254,7 @@ class HDView:
         except:
             return False
 
+    @measure_export("latex")
     def t_tex(self, **kwargs) -> bool:
         """
         Function converting the record to the .tex (TeX) format
@@ -519,12 +1270,16 @@ class HDView:
         except:
             return False
 
-    def t_parquet(self, **kwargs) -> bool:
+    @measure_export("parquet")
+    def t_parquet(self, chunk_size: int = None, **kwargs) -> bool:
         """
         Function converting the record to the Apache Parquet format
+        :param chunk_size: If specified, the record is written block by block (see stream_export())
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
+        if chunk_size is not None:
+            return self.stream_export("parquet", chunk_size, **kwargs)
         # Gathering the details concerning the specified format
         df, method, filename = self.get_conversion_details("parquet")
         cl_m = eval(f"df.{method}")
@@ -534,6 +1289,7 @@ class HDView:
         except:
             return False
 
+    @measure_export("pickle")
     def t_pickle(self, **kwargs) -> bool:
         """
         Function converting the record to the Pickle (standard serialization) format
@@ -549,34 +1305,123 @@ class HDView:
         except:
             return False
 
-    def t_sql(self, **kwargs) -> bool:
-        """
-        Function converting the record to a database format supported by SQLAlchemy
+    @measure_export("sql")
+    def t_sql(self, url=None, if_exists: str = "append", chunk_size: int = None, prefix: str = DEFAULT_SQL_PREFIX,
+              method: str = "multi", batch_size: int = DEFAULT_SQL_BATCH_SIZE, **kwargs) -> bool:
+        """
+        Function loading the record into a SQL database supported by SQLAlchemy
+        The samples are inserted block by block in a single transaction, into a time-indexed samples table
+        (record_id, sample, time, 1 column per signal) shared by every loaded record, along with the record
+        information (records and channels tables, see write_record_sql()). Several records can be appended to
+        the same database:
+            v.t_sql("sqlite:///ecg.db"); w.t_sql("sqlite:///ecg.db")
+        :param url: SQLAlchemy database URL or sqlalchemy.Engine (SQLite file of the view folder if None)
+        :param if_exists: Behavior if the tables already exist: "append", "replace" or "fail"
+        :param chunk_size: Number of samples read per block (DEFAULT_CHUNK_SIZE if None)
+        :param prefix: Prefix of the table names
+        :param method: Insertion method: "multi" (multi-row INSERT statements) or "executemany" (DB-API cursor)
+        :param batch_size: Number of rows per insertion call
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
-        # TODO To be implemented
-        pass
+        # Gathering the details concerning the specified format
+        _, _, filename = self.get_conversion_details("sql", build_frame=False)
+        try:
+            import sqlalchemy as sa
+
+            engine = sa.create_engine(url or f"sqlite:///{os.path.abspath(filename)}") \
+                if url is None or isinstance(url, str) else url
+            try:
+                with engine.begin() as connection:
+                    write_record_sql(connection, self.iter_chunks(chunk_size or DEFAULT_CHUNK_SIZE), self.columns,
+                                     self.get_info(), self.get_signals().dtype, self.record, self.title, prefix,
+                                     if_exists, method, batch_size)
+            finally:
+                if engine is not url:
+                    engine.dispose()
+            return True
+        except:
+            return False
 
-    def t_matlab(self, **kwargs) -> bool:
+    @measure_export("matlab")
+    def t_matlab(self, version: str = None, compression: bool = False, chunk_size: int = None, **kwargs) -> bool:
         """
         Function converting the record to a MATLAB file
+        The signals are written from the NumPy arrays as a struct of per-signal vectors (HEADAT) along with
+        a struct of the record information (HEADAT_info: fs, sig_name, units, base_date, ...)
+        :param version: MAT-file version: "5" (scipy.io), "7.3" (HDF5-based, requires h5py) or None to use
+        the v7.3 format only when the samples exceed the 2 GB limit of the v5 format (see MATLAB_V5_MAX_BYTES)
+        :param compression: If set to True, the vectors are compressed
+        :param chunk_size: Number of samples read per block and per HDF5 chunk (v7.3 format, DEFAULT_CHUNK_SIZE if None)
+        :rtype: bool
+        :return: Boolean set to True if conversion has been successfully performed
+        """
+        if version not in [None, "5", "7.3"]:
+            raise ValueError("The MAT-file version must be either '5' or '7.3'.")
+        # Gathering the details concerning the specified format
+        _, _, filename = self.get_conversion_details("matlab", build_frame=False)
+        signals = self.get_signals()
+        if version is None:
+            version = "7.3" if exceeds_mat_v5(self.nb_observations, len(self.columns), signals.dtype) else "5"
+
+        try:
+            if version == "5":
+                write_mat_v5(filename, np.asarray(signals), self.columns, self.get_info(), compression)
+            else:
+                # The v7.3 vectors are written block by block (the record is never fully loaded)
+                chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+                write_mat_v73(filename, self.iter_chunks(chunk_size), self.nb_observations, self.columns,
+                              signals.dtype, self.get_info(), compression, chunk_size)
+            return True
+        except:
+            return False
+
+    @measure_export("store")
+    def t_store(self, chunk_size: int = None, compression: str = "zlib", level: int = None, shuffle: bool = True,
+                **kwargs) -> bool:
+        """
+        Function converting the record to a HEADAT store (.hds file)
+        Every signal is stored as compressed chunks of chunk_size samples: a time range of a few
+        signals can then be read back by only decompressing the chunks it overlaps (see StoreSignals).
+        The store can be added back to a view: HDView("out_<...>.hds", lazy=True)
+        :param chunk_size: Number of samples per chunk (DEFAULT_STORE_CHUNK_SIZE if None)
+        :param compression: Compression codec ("zlib", "bz2", "lzma" or "none")
+        :param level: Compression level (default level of the codec if None)
+        :param shuffle: If set to True, the bytes of the samples are shuffled before the compression
+        (better compression ratio)
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
         # Gathering the details concerning the specified format
-        df, _, filename = self.get_conversion_details("matlab")
+        _, _, filename = self.get_conversion_details("store", build_frame=False)
+        try:
+            write_store(filename, self.iter_chunks(chunk_size or DEFAULT_STORE_CHUNK_SIZE), self.columns,
+                        infos=self.get_info(), compression=compression, level=level, shuffle=shuffle)
+            return True
+        except:
+            return False
 
-        df.rename(columns=lambda x: x.replace(' ', '_'), inplace=True)
+    @measure_export("pyramid")
+    def t_pyramid(self, chunk_size: int = None, base: int = PYRAMID_BASE_BIN, factor: int = PYRAMID_FACTOR,
+                  **kwargs) -> bool:
+        """
+        Function saving the min/max/mean pyramid of the signals next to the exports (.pyr.npz file)
+        The saved pyramid can be re-loaded by SignalPyramid.load() to serve overviews without the record
+        :param chunk_size: Number of samples read per block (DEFAULT_CHUNK_SIZE if None)
+        :param base: Number of samples per bin of the finest level
+        :param factor: Number of bins of a level merged into 1 bin of the next level
+        :rtype: bool
+        :return: Boolean set to True if conversion has been successfully performed
+        """
+        # Gathering the details concerning the specified format
+        _, _, filename = self.get_conversion_details("pyramid", build_frame=False)
         try:
-            scipy.io.savemat(file_name=filename,
-                             mdict={
-                                 'HEADAT': df.to_dict("list")
-                             })
+            self.get_pyramid(chunk_size or DEFAULT_CHUNK_SIZE, base, factor).save(filename)
             return True
         except:
             return False
 
+    @measure_export("wav")
     def t_wav(self, **kwargs) -> bool:
         """
         Function converting the record to a .wav file
@@ -585,14 +1430,21 @@ class HDView:
         """
         # Gathering the details concerning the specified format
         df, _, filename = self.get_conversion_details("wav")
+        if self.pipeline is not None:
+            print("The WAV export reads the record files: it is not available for processed views")
+            return False
 
         try:
+            from wfdb.io.convert import wfdb_to_wav
+
             wfdb_to_wav(record_name=self.record,
-                        output_filename=filename)
+                        output_filename=filename,
+                        **self.get_record_window())
             return True
         except:
             return False
 
+    @measure_export("edf")
     def t_edf(self, **kwargs) -> bool:
         """
         Function converting the record to a .edf file
@@ -601,20 +1453,30 @@ class HDView:
         """
         # Gathering the details concerning the specified format
         df, _, filename = self.get_conversion_details("edf")
+        if self.pipeline is not None:
+            print("The EDF export reads the record files: it is not available for processed views")
+            return False
 
         try:
+            from wfdb.io.convert import wfdb_to_edf
+
             wfdb_to_edf(record_name=self.record,
-                        output_filename=filename)
+                        output_filename=filename,
+                        **self.get_record_window())
             return True
         except:
             return False
 
-    def t_feather(self, **kwargs) -> bool:
+    @measure_export("feather")
+    def t_feather(self, chunk_size: int = None, **kwargs) -> bool:
         """
         Function converting the record to a .fea/.feather file
+        :param chunk_size: If specified, the record is written block by block (see stream_export())
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
+        if chunk_size is not None:
+            return self.stream_export("feather", chunk_size, **kwargs)
         # Gathering the details concerning the specified format
         df, method, filename = self.get_conversion_details("feather")
         cl_m = eval(f"df.{method}")
@@ -624,6 +1486,7 @@ class HDView:
         except:
             return False
 
+    @measure_export("stata")
     def t_stata(self, **kwargs) -> bool:
         """
         Function converting the record to a .dta file (STATA)
@@ -639,12 +1502,17 @@ class HDView:
         except:
             return False
 
-    def t_hdf5(self, **kwargs) -> bool:
+    @measure_export("hdf5")
+    def t_hdf5(self, chunk_size: int = None, **kwargs) -> bool:
         """
         Function converting the record to a .hdf file (HDF5)
+        :param chunk_size: If specified, the record is written block by block (see stream_export())
         :rtype: bool
         :return: Boolean set to True if conversion has been successfully performed
         """
+        if chunk_size is not None:
+            kwargs.setdefault("key", "df")
+            return self.stream_export("hdf5", chunk_size, **kwargs)
         # Gathering the details concerning the specified format
         df, method, filename = self.get_conversion_details("hdf5")
         cl_m = eval(f"df.{method}")
@@ -0,0 +1,728 @@
+"""
+
+          _   _ _____    _    ____    _  _____
+         | | | | ____|  / \  |  _ \  / \|_   _|
+         | |_| |  _|   / _ \ | | | |/ _ \ | |
+         |  _  | |___ / ___ \| |_| / ___ \| |
+         |_| |_|_____/_/   \_\____/_/   \_\_|
+
+            Developer           :   Lucas RODRIGUEZ
+            Maintainer          :   Lucas RODRIGUEZ
+            Development date    :   June 2022 - ...
+            File description    :   Conversion server (warm worker processes and result cache)
+            Official Git repo   :   https://github.com/lcsrodriguez/headat-signals
+
+"""
+import argparse
+import collections
+import hashlib
+import http.client
+import http.server
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlparse, parse_qs
+
+from .main import *
+from .batch import FORMAT_BACKENDS, check_formats, init_worker
+from .lib.results import ResultCache, get_content_digest, get_result_key
+
+
+class ServerBusy(Exception):
+    """
+    Exception raised when the queue of the server is full (the job has to be submitted again later)
+    """
+
+
+def normalize_record(record: str) -> str:
+    """
+    Function returning the absolute record name (path without extension) of a local record (URLs are kept as is)
+    :param record: Record name, with or without the .hea/.dat extension
+    :return: String
+    """
+    if not isinstance(record, str) or not record:
+        raise ValueError("A record name has to be specified.")
+    if is_url(record):
+        return record
+    if record.endswith((".hea", ".dat")):
+        record = record[: -len(".hea")]
+    return os.path.abspath(record)
+
+
+def get_record_digest(record: str) -> str:
+    """
+    Function returning the digest of the content of a record (header and signal files, segments included)
+    The remote records are identified by their URL only (their files are not downloaded to be hashed): a
+    conversion of a remote record is served from the cache even if the remote files have changed since
+    :param record: Record name (see normalize_record())
+    :return: SHA-256 hexadecimal digest
+    """
+    if is_url(record):
+        return hashlib.sha256(record.encode("utf-8")).hexdigest()
+    if not os.path.isfile(record + ".hea"):
+        raise FileNotFoundError(f"No header file found for the record {record}")
+    folder = os.path.dirname(record)
+    return get_content_digest([record + ".hea"] + [os.path.join(folder, k) for k in HDView.list_record_files(record)])
+
+
+def list_output_files(view: HDView) -> list:
+    """
+    Function listing the files written by the exporters in the folder of a view (the samples/ sub-folder excluded)
+    :param view: HDView
+    :return: List of paths
+    """
+    files = []
+    for folder, folders, names in os.walk(view.folder_name):
+        if folder == view.folder_name and "samples" in folders:
+            folders.remove("samples")
+        files += [os.path.join(folder, k) for k in names]
+    return sorted(files)
+
+
+def run_job(job: dict, views: collections.OrderedDict, cache: ResultCache, max_views: int) -> dict:
+    """
+    Function converting a record to the requested formats inside a worker process and storing the converted
+    files in the result cache
+    :param job: Job dictionary {id, record, digest, lazy, formats, options, keys}
+    :param views: Decoded views of the worker ((record, lazy, digest) --> HDView), least recently used first
+    :param cache: ResultCache
+    :param max_views: Maximum number of decoded views kept by the worker
+    :return: Dictionary {formats: format --> report, warm, error, views}
+    """
+    result = {"formats": {}, "warm": False, "error": None, "views": []}
+    try:
+        key = (job["record"], job["lazy"], job["digest"])
+        # Views of a previous content of the record
+        for old in [k for k in views if k[0] == job["record"] and k != key]:
+            shutil.rmtree(views.pop(old).folder_name, ignore_errors=True)
+        view = views.pop(key, None)
+        result["warm"] = view is not None
+        if view is None:
+            view = HDView(job["record"], lazy=job["lazy"])
+        views[key] = view
+        while len(views) > max_views:
+            shutil.rmtree(views.popitem(last=False)[1].folder_name, ignore_errors=True)
+
+        for format in job["formats"]:
+            report = {"success": False, "files": [], "cached": False, "duration": None, "error": None}
+            start = time.perf_counter()
+            try:
+                report["success"] = bool(getattr(view, formats[format]["callback"])(**job["options"].get(format, {})))
+            except Exception as e:
+                report["error"] = f"{type(e).__name__}: {e}"
+            report["duration"] = time.perf_counter() - start
+            report["metrics"] = view.metrics.get_last(f"export:{format}")
+            files = list_output_files(view)
+            if report["success"] and files:
+                report["files"] = cache.store(job["keys"][format], files, {
+                    "record": job["record"], "format": format, "options": job["options"].get(format, {})})
+            else:
+                # Partially written files of a failed conversion
+                for path in files:
+                    os.remove(path)
+                report["success"] = False
+                report["error"] = report["error"] or "The conversion has failed."
+            result["formats"][format] = report
+        # The phases of the long-lived views are not accumulated
+        view.metrics.clear()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["views"] = list(dict.fromkeys(k[0] for k in views))
+    return result
+
+
+def run_worker(index: int, jobs, results, cache_folder: str, cache_size: int, work_folder: str,
+               max_views: int = DEFAULT_SERVER_VIEWS) -> None:
+    """
+    Function executed by a worker process of the server
+    The optional backends are imported once and the records of the last jobs are kept decoded, so that the
+    next conversions of the same records neither pay the imports nor the decoding again
+    :param index: Index of the worker
+    :param jobs: Queue of the jobs sent to this worker (None to stop the worker)
+    :param results: Queue of the (index of the worker, job id, result) tuples shared by the workers
+    :param cache_folder: Folder of the result cache
+    :param cache_size: Maximum size of the result cache
+    :param work_folder: Folder holding the view folders of the worker
+    :param max_views: Maximum number of decoded views kept by the worker
+    """
+    os.makedirs(work_folder, exist_ok=True)
+    os.chdir(work_folder)
+    init_worker(list(FORMAT_BACKENDS))
+    cache = ResultCache(cache_folder, cache_size)
+    views = collections.OrderedDict()
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            results.put((index, job["id"], run_job(job, views, cache, max_views)))
+    finally:
+        for view in views.values():
+            shutil.rmtree(view.folder_name, ignore_errors=True)
+
+
+class ConversionServer:
+    """
+    Long-running conversion service backed by a pool of warm worker processes
+        - the jobs wait in a bounded queue (ServerBusy is raised beyond max_pending queued jobs)
+        - a job is preferably sent to an idle worker which already holds the record decoded
+        - the converted files are kept in a ResultCache keyed by the content of the record, the format and
+        the options of the exporter: a repeated conversion is served without running the exporter
+        - identical jobs submitted while the first one is queued or running share the same job
+    The jobs are dictionaries {id, record, formats, options, status, results, ...} where status is "queued",
+    "running", "done", "failed" or "cancelled" and results maps each format to {success, files, cached,
+    duration, error}. The files are the paths of the converted files inside the result cache
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = DEFAULT_SERVER_MAX_PENDING,
+                 max_views: int = DEFAULT_SERVER_VIEWS, cache: ResultCache = None, work_folder: str = None,
+                 job_history: int = DEFAULT_SERVER_JOB_HISTORY) -> None:
+        """
+        Constructor function initializing the server (the workers are started by start())
+        :param workers: Number of worker processes (number of CPUs if None)
+        :param max_pending: Maximum number of queued jobs
+        :param max_views: Maximum number of decoded records kept by each worker
+        :param cache: ResultCache of the converted files (default folder if None)
+        :param work_folder: Folder of the views of the workers (work/ sub-folder of the cache if None)
+        :param job_history: Number of finished jobs kept available
+        """
+        workers = (os.cpu_count() or 1) if workers is None else workers
+        if workers < 1:
+            raise ValueError("The number of workers must be a strictly positive integer.")
+        if max_pending is None or max_pending < 1:
+            raise ValueError("The maximum number of queued jobs must be a strictly positive integer.")
+        if max_views is None or max_views < 1:
+            raise ValueError("The maximum number of decoded records must be a strictly positive integer.")
+        self.nb_workers = workers
+        self.max_pending = max_pending
+        self.max_views = max_views
+        self.cache = ResultCache() if cache is None else cache
+        self.work_folder = work_folder or os.path.join(self.cache.folder, "work")
+        self.job_history = job_history
+        self.context = multiprocessing.get_context("spawn")
+        self.lock = threading.RLock()
+        self.workers = []
+        self.results = None
+        self.collector = None
+        self.running = False
+        self.jobs = collections.OrderedDict()
+        self.payloads = {}
+        self.events = {}
+        self.inflight = {}
+        self.pending = collections.deque()
+        self.stats = collections.Counter()
+        self.started_at = None
+
+    def __repr__(self) -> str:
+        return f"ConversionServer(workers={self.nb_workers}, max_pending={self.max_pending}, cache={self.cache})"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _spawn(self, index: int) -> dict:
+        """
+        Function starting a worker process
+        """
+        jobs = self.context.Queue()
+        process = self.context.Process(
+            target=run_worker, name=f"headat-worker-{index}", daemon=True,
+            args=(index, jobs, self.results, self.cache.folder, self.cache.max_size,
+                  os.path.join(self.work_folder, str(index)), self.max_views))
+        process.start()
+        return {"process": process, "queue": jobs, "job": None, "views": set()}
+
+    def start(self) -> None:
+        """
+        Function starting the worker processes
+        """
+        with self.lock:
+            if self.running:
+                return
+            self.results = self.context.Queue()
+            self.workers = [self._spawn(k) for k in range(self.nb_workers)]
+            self.running = True
+            self.started_at = time.time()
+        self.collector = threading.Thread(target=self._collect, name="headat-collector", daemon=True)
+        self.collector.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """
+        Function stopping the worker processes (the queued jobs are cancelled, the running jobs are waited
+        for at most timeout seconds)
+        :param timeout: Maximum duration to wait for each worker (in seconds)
+        """
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            while self.pending:
+                self._finish(self.pending.popleft(), status="cancelled", error="The server has been stopped.")
+            for worker in self.workers:
+                worker["queue"].put(None)
+        for worker in self.workers:
+            worker["process"].join(timeout)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+        self.collector.join()
+        with self.lock:
+            for worker in self.workers:
+                if worker["job"] is not None:
+                    self._finish(worker["job"], status="failed", error="The server has been stopped.")
+            self.workers = []
+
+    def submit(self, record: str, formats_list: list, options: dict = None, lazy: bool = True) -> dict:
+        """
+        Function submitting a conversion job
+        :param record: Record name (path of a local record or URL)
+        :param formats_list: List of format names (see get_export_types())
+        :param options: Dictionary format --> dictionary of keyword arguments passed to the exporter
+        (JSON-serializable, e.g. {"csv": {"chunk_size": 100000}})
+        :param lazy: If set to True, the record is memory-mapped (see HDView.add_record())
+        :return: Job dictionary (already done if every format has been served by the result cache)
+        """
+        if not self.running:
+            raise RuntimeError("The server is not running. Please call the .start() method before")
+        formats_list = list(dict.fromkeys(check_formats(formats_list)))
+        options = {k.lower(): v for k, v in (options or {}).items()}
+        if any(k not in formats_list or not isinstance(v, dict) for k, v in options.items()):
+            raise ValueError("The options must map requested formats to dictionaries of keyword arguments.")
+        try:
+            json.dumps(options)
+        except TypeError:
+            raise ValueError("The options must be JSON-serializable.")
+        record = normalize_record(record)
+        digest = get_record_digest(record)
+        keys = {k: get_result_key(digest, k, options.get(k)) for k in formats_list}
+
+        job = {"id": uuid.uuid4().hex, "record": record, "formats": formats_list, "options": options,
+               "lazy": bool(lazy), "status": "queued", "submitted_at": time.time(), "started_at": None,
+               "finished_at": None, "worker": None, "warm": None, "success": None, "error": None, "results": {}}
+        for format in formats_list:
+            files = self.cache.lookup(keys[format])
+            if files is not None:
+                job["results"][format] = {"success": True, "files": files, "cached": True, "duration": 0.0,
+                                          "error": None}
+        missing = [k for k in formats_list if k not in job["results"]]
+
+        with self.lock:
+            self.stats["submitted"] += 1
+            self.stats["cache_hits"] += len(formats_list) - len(missing)
+            if not missing:
+                self.jobs[job["id"]] = job
+                self.events[job["id"]] = threading.Event()
+                self._finish(job["id"], status="done")
+                return self.get_job(job["id"])
+            # Identical job already queued or running
+            signature = tuple(sorted(keys.values()))
+            if signature in self.inflight:
+                self.stats["coalesced"] += 1
+                return self.get_job(self.inflight[signature])
+            if len(self.pending) >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise ServerBusy(f"The queue of the server is full ({self.max_pending} queued jobs).")
+            self.stats["cache_misses"] += len(missing)
+            self.jobs[job["id"]] = job
+            self.events[job["id"]] = threading.Event()
+            self.inflight[signature] = job["id"]
+            self.payloads[job["id"]] = {"id": job["id"], "record": record, "digest": digest, "lazy": bool(lazy),
+                                        "formats": missing, "options": options, "keys": keys,
+                                        "signature": signature}
+            self.pending.append(job["id"])
+            self._dispatch()
+            return self.get_job(job["id"])
+
+    def get_job(self, job_id: str, wait: float = None) -> dict:
+        """
+        Function returning a job
+        :param job_id: Identifier of the job
+        :param wait: If specified, maximum duration to wait for the end of the job (in seconds)
+        :return: Job dictionary (copy)
+        """
+        with self.lock:
+            if job_id not in self.jobs:
+                raise KeyError(f"Unknown job {job_id}")
+            event = self.events[job_id]
+        if wait:
+            event.wait(wait)
+        with self.lock:
+            return json.loads(json.dumps(self.jobs[job_id]))
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Function cancelling a queued job (the running jobs cannot be cancelled)
+        :param job_id: Identifier of the job
+        :rtype: bool
+        :return: Boolean set to True if the job has been cancelled
+        """
+        with self.lock:
+            if job_id not in self.jobs:
+                raise KeyError(f"Unknown job {job_id}")
+            if job_id not in self.pending:
+                return False
+            self.pending.remove(job_id)
+            self._finish(job_id, status="cancelled", error="The job has been cancelled.")
+            return True
+
+    def get_stats(self) -> dict:
+        """
+        Function returning the state and the counters of the server
+        :return: Dictionary
+        """
+        with self.lock:
+            return {
+                "running": self.running,
+                "uptime": time.time() - self.started_at if self.started_at else None,
+                "workers": len(self.workers),
+                "busy_workers": sum(k["job"] is not None for k in self.workers),
+                "queued": len(self.pending),
+                "max_pending": self.max_pending,
+                **{k: self.stats[k] for k in ["submitted", "done", "failed", "cancelled", "rejected", "coalesced",
+                                              "cache_hits", "cache_misses", "warm", "cold", "respawned"]},
+                "cache": self.cache.get_info(),
+            }
+
+    def _dispatch(self) -> None:
+        """
+        Function sending the queued jobs to the idle workers (the caller must hold the lock)
+        """
+        while self.pending and self.running:
+            idle = [k for k in self.workers if k["job"] is None and k["process"].is_alive()]
+            if not idle:
+                return
+            job_id = self.pending.popleft()
+            job = self.jobs[job_id]
+            # Worker holding the record decoded (if idle)
+            index = next((k for k, w in enumerate(self.workers) if w in idle and job["record"] in w["views"]),
+                         self.workers.index(idle[0]))
+            self.workers[index]["job"] = job_id
+            job.update(status="running", started_at=time.time(), worker=index)
+            self.workers[index]["queue"].put(self.payloads[job_id])
+
+    def _finish(self, job_id: str, status: str, error: str = None, result: dict = None) -> None:
+        """
+        Function recording the end of a job (the caller must hold the lock)
+        """
+        job = self.jobs[job_id]
+        if result is not None:
+            job["results"].update(result["formats"])
+            job["warm"] = result["warm"]
+            error = error or result["error"]
+            self.stats["warm" if result["warm"] else "cold"] += 1
+        if status == "done" and (error or not all(job["results"].get(k, {}).get("success") for k in job["formats"])):
+            status = "failed"
+        job.update(status=status, error=error, success=status == "done", finished_at=time.time())
+        self.stats[status] += 1
+        payload = self.payloads.pop(job_id, None)
+        if payload is not None and self.inflight.get(payload["signature"]) == job_id:
+            del self.inflight[payload["signature"]]
+        self.events[job_id].set()
+
+        # Oldest finished jobs
+        finished = [k for k, v in self.jobs.items() if v["finished_at"] is not None]
+        for old in finished[: max(0, len(finished) - self.job_history)]:
+            del self.jobs[old]
+            del self.events[old]
+
+    def _collect(self) -> None:
+        """
+        Function gathering the results of the workers and replacing the dead workers (collector thread)
+        """
+        while self.running or any(k["job"] is not None and k["process"].is_alive() for k in self.workers):
+            try:
+                index, job_id, result = self.results.get(timeout=0.5)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            with self.lock:
+                worker = self.workers[index]
+                worker["job"] = None
+                worker["views"] = set(result["views"])
+                self._finish(job_id, status="done", result=result)
+                self._dispatch()
+
+    def _check_workers(self) -> None:
+        """
+        Function replacing the worker processes which have exited (the job they were running fails)
+        """
+        with self.lock:
+            if not self.running:
+                return
+            for index, worker in enumerate(self.workers):
+                if worker["process"].is_alive():
+                    continue
+                if worker["job"] is not None:
+                    self._finish(worker["job"], status="failed",
+                                 error=f"The worker process has exited (exit code {worker['process'].exitcode}).")
+                self.workers[index] = self._spawn(index)
+                self.stats["respawned"] += 1
+            self._dispatch()
+
+
+class ConversionRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    HTTP interface of a ConversionServer (JSON requests and responses):
+        - POST /jobs {record, formats, options, lazy, wait}: 200 (done), 202 (queued or running), 503 (queue full)
+        - GET /jobs/<id>?wait=<seconds>: job
+        - DELETE /jobs/<id>: cancellation of a queued job
+        - GET /stats: state and counters of the server
+    """
+    server_version = "HEADAT"
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self) -> str:
+        # Unix sockets have no client address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self) -> tuple:
+        url = urlparse(self.path)
+        parts = [k for k in url.path.split("/") if k]
+        query = parse_qs(url.query)
+        try:
+            wait = float(query["wait"][0]) if "wait" in query else None
+        except ValueError:
+            wait = None
+        return parts, wait
+
+    def do_GET(self) -> None:
+        parts, wait = self.route()
+        conversions = self.server.conversions
+        if parts == ["stats"]:
+            return self.send_json(200, conversions.get_stats())
+        if len(parts) == 2 and parts[0] == "jobs":
+            try:
+                return self.send_json(200, conversions.get_job(parts[1], wait))
+            except KeyError as e:
+                return self.send_json(404, {"error": str(e)})
+        self.send_json(404, {"error": f"Unknown resource {self.path}"})
+
+    def do_POST(self) -> None:
+        parts, _ = self.route()
+        if parts != ["jobs"]:
+            return self.send_json(404, {"error": f"Unknown resource {self.path}"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            job = self.server.conversions.submit(request.get("record"), request.get("formats"),
+                                                 request.get("options"), request.get("lazy", True))
+        except ServerBusy as e:
+            return self.send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+        except (ValueError, TypeError, FileNotFoundError, AttributeError) as e:
+            return self.send_json(400, {"error": f"{type(e).__name__}: {e}"})
+        if request.get("wait"):
+            job = self.server.conversions.get_job(job["id"], float(request["wait"]))
+        finished = job["finished_at"] is not None
+        self.send_json(200 if finished else 202, job, {"Location": f"/jobs/{job['id']}"})
+
+    def do_DELETE(self) -> None:
+        parts, _ = self.route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self.send_json(404, {"error": f"Unknown resource {self.path}"})
+        try:
+            cancelled = self.server.conversions.cancel(parts[1])
+        except KeyError as e:
+            return self.send_json(404, {"error": str(e)})
+        self.send_json(200 if cancelled else 409, self.server.conversions.get_job(parts[1]))
+
+
+class ConversionHTTPServer(http.server.ThreadingHTTPServer):
+    """
+    Threaded HTTP server (TCP) exposing a ConversionServer
+    """
+    daemon_threads = True
+
+    def __init__(self, conversions: ConversionServer, host: str = DEFAULT_SERVER_HOST,
+                 port: int = DEFAULT_SERVER_PORT, verbose: bool = False) -> None:
+        self.conversions = conversions
+        self.verbose = verbose
+        super().__init__((host, port), ConversionRequestHandler)
+
+
+class UnixConversionHTTPServer(ConversionHTTPServer):
+    """
+    Threaded HTTP server (Unix socket) exposing a ConversionServer
+    """
+    address_family = socket.AF_UNIX
+
+    def __init__(self, conversions: ConversionServer, path: str, verbose: bool = False) -> None:
+        if os.path.exists(path):
+            os.remove(path)
+        self.conversions = conversions
+        self.verbose = verbose
+        http.server.ThreadingHTTPServer.__init__(self, path, ConversionRequestHandler)
+
+    def server_bind(self) -> None:
+        # The host/port fields of HTTPServer do not apply to Unix sockets
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix socket
+    """
+
+    def __init__(self, path: str, timeout: float = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class ConversionClient:
+    """
+    Client of a conversion server (see ConversionHTTPServer)
+    """
+
+    def __init__(self, host: str = DEFAULT_SERVER_HOST, port: int = DEFAULT_SERVER_PORT, unix_socket: str = None,
+                 timeout: float = None) -> None:
+        """
+        Constructor function
+        :param host: Host of the server
+        :param port: Port of the server
+        :param unix_socket: If specified, path of the Unix socket of the server (host and port are ignored)
+        :param timeout: Timeout of the requests (in seconds)
+        """
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, payload: dict = None) -> tuple:
+        """
+        Function sending a request to the server
+        :return: (HTTP status, decoded JSON response) tuple
+        """
+        if self.unix_socket is not None:
+            connection = _UnixHTTPConnection(self.unix_socket, self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = None if payload is None else json.dumps(payload)
+            connection.request(method, path, body, {"Content-Type": "application/json"} if body else {})
+            response = connection.getresponse()
+            return response.status, json.loads(response.read() or b"{}")
+        finally:
+            connection.close()
+
+    def submit(self, record: str, formats_list: list, options: dict = None, lazy: bool = True,
+               wait: float = None) -> dict:
+        """
+        Function submitting a conversion job (see ConversionServer.submit())
+        :param record: Record name (local records are resolved from the current directory)
+        :param formats_list: List of format names
+        :param options: Dictionary format --> dictionary of keyword arguments passed to the exporter
+        :param lazy: If set to True, the record is memory-mapped
+        :param wait: If specified, maximum duration to wait for the end of the job (in seconds)
+        :return: Job dictionary
+        """
+        status, job = self.request("POST", "/jobs", {
+            "record": normalize_record(record), "formats": formats_list, "options": options or {}, "lazy": lazy,
+            "wait": wait})
+        if status == 503:
+            raise ServerBusy(job["error"])
+        if status >= 400:
+            raise ValueError(job["error"])
+        return job
+
+    def get_job(self, job_id: str, wait: float = None) -> dict:
+        """
+        Function returning a job
+        :param job_id: Identifier of the job
+        :param wait: If specified, maximum duration to wait for the end of the job (in seconds)
+        :return: Job dictionary
+        """
+        status, job = self.request("GET", f"/jobs/{job_id}" + (f"?wait={wait}" if wait else ""))
+        if status == 404:
+            raise KeyError(job["error"])
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Function cancelling a queued job
+        :param job_id: Identifier of the job
+        :rtype: bool
+        :return: Boolean set to True if the job has been cancelled
+        """
+        status, job = self.request("DELETE", f"/jobs/{job_id}")
+        if status == 404:
+            raise KeyError(job["error"])
+        return status == 200
+
+    def get_stats(self) -> dict:
+        """
+        Function returning the state and the counters of the server
+        :return: Dictionary
+        """
+        return self.request("GET", "/stats")[1]
+
+
+def main(argv: list = None) -> int:
+    """
+    Command-line entry point: python -m headat.server [--port <port> | --socket <path>] [-w <workers>]
+    :param argv: List of command-line arguments (sys.argv if None)
+    :return: Exit code
+    """
+    parser = argparse.ArgumentParser(prog="python -m headat.server",
+                                     description="HEADAT - Conversion server of WFDB records")
+    parser.add_argument("--host", default=DEFAULT_SERVER_HOST, help="Listening address")
+    parser.add_argument("-p", "--port", type=int, default=DEFAULT_SERVER_PORT, help="Listening port")
+    parser.add_argument("-s", "--socket", default=None, help="Listen on a Unix socket instead of a TCP port")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("-q", "--max-pending", type=int, default=DEFAULT_SERVER_MAX_PENDING, help="Maximum number of queued jobs")
+    parser.add_argument("--views", type=int, default=DEFAULT_SERVER_VIEWS, help="Decoded records kept per worker")
+    parser.add_argument("--cache-dir", default=DEFAULT_RESULT_CACHE_FOLDER, help="Folder of the result cache")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_RESULT_CACHE_SIZE, help="Maximum size of the result cache (bytes)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log the requests")
+    args = parser.parse_args(argv)
+
+    with ConversionServer(args.workers, args.max_pending, args.views, ResultCache(args.cache_dir, args.cache_size)) as conversions:
+        if args.socket is not None:
+            httpd = UnixConversionHTTPServer(conversions, args.socket, args.verbose)
+            print(f"Serving on {args.socket}")
+        else:
+            httpd = ConversionHTTPServer(conversions, args.host, args.port, args.verbose)
+            print(f"Serving on http://{args.host}:{args.port}/")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+from benchmarks.import_time import check_import_time
+
+
+def test_import_time():
+    # Importing headat.main only loads the core dependencies and creates no file
+    result = check_import_time(repeat=3)
+    assert result["loaded_backends"] == []
+    assert result["side_effects"] == []
+    assert result["success"], f"Import overhead {result['overhead']:.3f} s (budget {result['budget']:.3f} s)"
@@ -0,0 +1,11 @@
+from headat.lib.functions import get_streaming_export_types, get_chunked_export_types
+from headat.lib.streaming import STREAM_WRITERS
+
+
+def test_streaming_formats_have_a_writer():
+    # stream_export() accepts exactly the formats having a registered streaming writer
+    assert set(STREAM_WRITERS) == set(get_streaming_export_types())
+
+
+def test_streaming_formats_are_chunked():
+    assert set(get_streaming_export_types()) <= set(get_chunked_export_types())